@@ -0,0 +1,386 @@
+"""
+Stroke Prediction System - Cohort Analytics
+관리자용 인구 집단(코호트) 분석 및 환자 점수 백분위
+
+- CohortAnalytics: 환자별 최신 위험도 평가를 기준으로 위험도 분포, 점수 히스토그램,
+  위험 요인 유병률(고혈압, 흡연, BMI>30)을 연령대/성별/직업 유형/거주 지역별로 집계.
+  전체 집계는 NumPy로 벡터화하여 계산하고, 이후 새 평가는 증분 갱신
+- PercentileService: 연령대/성별 동료 집단 내 점수 백분위 (O(log n) 조회)
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import Patient, HealthData, RiskAssessment, RiskLevel
+from services import PolicyService
+
+
+# 연령대 구간 (하한, 라벨)
+AGE_BANDS: Tuple[Tuple[int, str], ...] = (
+    (0, '0-17'),
+    (18, '18-39'),
+    (40, '40-59'),
+    (60, '60-79'),
+    (80, '80+')
+)
+_AGE_BAND_EDGES = np.array([lower for lower, _ in AGE_BANDS[1:]], dtype=np.float64)
+
+
+def age_band(age) -> str:
+    """나이의 연령대 라벨 (미입력은 Unknown)"""
+    if age is None:
+        return 'Unknown'
+    return AGE_BANDS[int(np.searchsorted(_AGE_BAND_EDGES, age, side='right'))][1]
+
+
+# 집계 차원: 차원 이름 -> 건강 데이터에서 값을 꺼내는 함수
+DIMENSIONS: Dict[str, Callable[[HealthData], str]] = {
+    'age_band': lambda health_data: age_band(health_data.age),
+    'gender': lambda health_data: health_data.gender or 'Unknown',
+    'work_type': lambda health_data: health_data.work_type or 'Unknown',
+    'residence_type': lambda health_data: health_data.residence_type or 'Unknown'
+}
+
+LEVELS = (RiskLevel.LOW, RiskLevel.MEDIUM, RiskLevel.HIGH)
+HISTOGRAM_BINS = 10  # 10점 단위
+FACTORS = ('hypertension', 'smoker', 'obese')
+
+# 통계 벡터 열: [인원, Low, Medium, High, 히스토그램 x10, 고혈압, 흡연, 비만]
+_COUNT = 0
+_LEVEL = 1
+_HIST = _LEVEL + len(LEVELS)
+_FACTOR = _HIST + HISTOGRAM_BINS
+_WIDTH = _FACTOR + len(FACTORS)
+
+
+def _stats_row(health_data: HealthData, assessment: RiskAssessment) -> np.ndarray:
+    row = np.zeros(_WIDTH, dtype=np.int64)
+    row[_COUNT] = 1
+    row[_LEVEL + LEVELS.index(assessment.risk_level)] = 1
+    row[_HIST + min(int(assessment.score // 10), HISTOGRAM_BINS - 1)] = 1
+    row[_FACTOR] = health_data.hypertension == 1
+    row[_FACTOR + 1] = health_data.smoking_status == 'smokes'
+    row[_FACTOR + 2] = bool(health_data.bmi and health_data.bmi > 30)
+    return row
+
+
+def aggregate_cohorts(keys: Dict[str, List[str]], scores: np.ndarray, levels: np.ndarray,
+                      factors: np.ndarray) -> Tuple[np.ndarray, Dict[str, Dict[str, np.ndarray]]]:
+    """
+    환자별 (차원 값, 점수, 위험도 코드, 위험 요인) -> (환자별 통계 행렬, 차원별 통계 벡터)
+    """
+    n = len(scores)
+    stats = np.zeros((n, _WIDTH), dtype=np.int64)
+    if n:
+        rows = np.arange(n)
+        stats[:, _COUNT] = 1
+        stats[rows, _LEVEL + levels] = 1
+        bins = np.minimum((scores // 10).astype(np.int64), HISTOGRAM_BINS - 1)
+        stats[rows, _HIST + bins] = 1
+        stats[:, _FACTOR:] = factors
+
+    slices: Dict[str, Dict[str, np.ndarray]] = {}
+    for name, column in keys.items():
+        values, codes = np.unique(np.asarray(column, dtype=object), return_inverse=True) \
+            if n else (np.array([], dtype=object), np.array([], dtype=np.int64))
+        matrix = np.column_stack([
+            np.bincount(codes, weights=stats[:, col], minlength=len(values))
+            for col in range(_WIDTH)
+        ]).astype(np.int64) if n else np.zeros((0, _WIDTH), dtype=np.int64)
+        slices[name] = {value: matrix[i] for i, value in enumerate(values.tolist())}
+    return stats, slices
+
+
+class CohortAnalytics:
+    """
+    코호트 분석 엔진
+    population: 집계 대상 사용자 목록을 반환하는 함수 (첫 조회 시 전체 집계)
+    재집계는 락 밖에서 인구를 순회하므로, 그동안 들어온 update()는 기록해 두었다가
+    결과를 교체할 때 락 안에서 다시 적용 (재집계가 보지 못한 최신 평가가 유실되지 않음)
+    """
+
+    def __init__(self, population: Callable[[], Iterable]):
+        self._population = population
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._built = False
+        # 재집계 중 들어온 환자별 최신 (차원 값 튜플, 통계 벡터), 재집계 중이 아니면 None
+        self._journal: Optional[Dict[str, Tuple[Tuple[str, ...], np.ndarray]]] = None
+        self._policy_version = 0
+        # 환자별 현재 집계에 반영된 (차원 값 튜플, 통계 벡터)
+        self._rows: Dict[str, Tuple[Tuple[str, ...], np.ndarray]] = {}
+        self._totals = np.zeros(_WIDTH, dtype=np.int64)
+        self._slices: Dict[str, Dict[str, np.ndarray]] = {name: {} for name in DIMENSIONS}
+
+    def rebuild(self):
+        """전체 인구 재집계 (벡터화, 동시에 하나만 실행)"""
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._journal = {}
+        try:
+            rows, totals, slices, policy_version = self._scan()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._rows, self._totals, self._slices = rows, totals, slices
+            # 순회 중 들어온 평가는 순회 결과보다 같거나 새로우므로 해당 환자 행을 교체
+            for patient_id, (keys, row) in journal.items():
+                self._replace(patient_id, keys, row)
+            self._policy_version = policy_version
+            self._built = True
+
+    def _scan(self):
+        """인구 순회 후 (환자별 (차원 값 튜플, 통계 벡터), 전체 통계, 차원별 통계, 집계 기준 정책 버전)"""
+        policy_version = PolicyService.current().version
+        keys: Dict[str, List[str]] = {name: [] for name in DIMENSIONS}
+        patient_ids: List[str] = []
+        scores, levels, factors = [], [], []
+        level_index = {level: i for i, level in enumerate(LEVELS)}
+
+        for user in self._population():
+            if not isinstance(user, Patient):
+                continue
+            # 지연 로딩 히스토리는 실체화하지 않고 저장된 최신 기록만 사용
+            health_data, assessment = user.latest_records()
+            if assessment is None:
+                continue
+            patient_ids.append(user.user_id)
+            for name, key in DIMENSIONS.items():
+                keys[name].append(key(health_data))
+            scores.append(assessment.score)
+            levels.append(level_index[assessment.risk_level])
+            factors.append((health_data.hypertension == 1,
+                            health_data.smoking_status == 'smokes',
+                            bool(health_data.bmi and health_data.bmi > 30)))
+
+        stats, slices = aggregate_cohorts(
+            keys,
+            np.asarray(scores, dtype=np.float64).reshape(-1),
+            np.asarray(levels, dtype=np.int64).reshape(-1),
+            np.asarray(factors, dtype=np.int64).reshape(-1, len(FACTORS))
+        )
+        rows = {
+            patient_id: (tuple(keys[name][i] for name in DIMENSIONS), stats[i])
+            for i, patient_id in enumerate(patient_ids)
+        }
+        return rows, stats.sum(axis=0), slices, policy_version
+
+    def update(self, patient: Patient, health_data: HealthData, assessment: RiskAssessment):
+        """새 평가 증분 반영 (환자의 이전 평가는 집계에서 제외)"""
+        if not self._built and self._journal is None:
+            return  # 첫 조회 시 전체 집계에 포함됨
+        keys = tuple(key(health_data) for key in DIMENSIONS.values())
+        row = _stats_row(health_data, assessment)
+        with self._lock:
+            if self._journal is not None:
+                self._journal[patient.user_id] = (keys, row)
+            if self._built:
+                self._replace(patient.user_id, keys, row)
+
+    def _replace(self, patient_id: str, keys: Tuple[str, ...], row: np.ndarray):
+        """환자 행 교체 (이전 행은 집계에서 제외, 호출자가 락 보유)"""
+        previous = self._rows.get(patient_id)
+        if previous:
+            self._apply(previous[0], -previous[1])
+        self._apply(keys, row)
+        self._rows[patient_id] = (keys, row)
+
+    def _apply(self, keys: Tuple[str, ...], row: np.ndarray):
+        self._totals += row
+        for name, value in zip(DIMENSIONS, keys):
+            stats = self._slices[name].get(value)
+            if stats is None:
+                stats = self._slices[name][value] = np.zeros(_WIDTH, dtype=np.int64)
+            stats += row
+
+    def _ensure_current(self):
+        # 임계치 변경 재분류가 끝났으면 위험도 분포가 바뀌었으므로 재집계
+        job = PolicyService.latest_job()
+        stale = (self._policy_version != PolicyService.current().version
+                 and (job is None or job.status != 'running'))
+        if not self._built or stale:
+            with self._rebuild_lock:
+                # 기다리는 동안 다른 요청이 재집계했으면 생략
+                if not self._built or self._policy_version != PolicyService.current().version:
+                    self._rebuild()
+
+    def get_report(self, dimension: Optional[str] = None) -> Dict:
+        """
+        코호트 리포트
+        dimension을 지정하면 해당 차원만, 아니면 모든 차원 반환
+        """
+        if dimension is not None and dimension not in DIMENSIONS:
+            raise ValueError(f"알 수 없는 차원: {dimension}")
+        self._ensure_current()
+        names = [dimension] if dimension else list(DIMENSIONS)
+        with self._lock:
+            return {
+                'population': _format_stats(self._totals),
+                'slices': {
+                    name: {value: _format_stats(stats)
+                           for value, stats in sorted(self._slices[name].items()) if stats[_COUNT]}
+                    for name in names
+                },
+                'policy_version': self._policy_version
+            }
+
+
+def _format_stats(stats: np.ndarray) -> Dict:
+    count = int(stats[_COUNT])
+    return {
+        'count': count,
+        'risk_distribution': {
+            level.value: int(stats[_LEVEL + i]) for i, level in enumerate(LEVELS)
+        },
+        'score_histogram': [
+            {'range': f"{i * 10}-{i * 10 + 10}", 'count': int(stats[_HIST + i])}
+            for i in range(HISTOGRAM_BINS)
+        ],
+        'factor_prevalence': {
+            factor: round(int(stats[_FACTOR + i]) / count, 4) if count else 0.0
+            for i, factor in enumerate(FACTORS)
+        }
+    }
+
+
+class _SortedScores:
+    """
+    정렬된 점수 집합
+    큰 정렬 배열(NumPy) + 작은 정렬 추가/삭제 버퍼로 구성, 버퍼가 커지면 병합
+    순위 조회는 이진 탐색 3회 (O(log n))
+    """
+
+    def __init__(self, scores: Optional[np.ndarray] = None, merge_threshold: int = 1024):
+        self._main = np.sort(scores) if scores is not None else np.empty(0, dtype=np.float64)
+        self._added: List[float] = []
+        self._removed: List[float] = []
+        self.merge_threshold = merge_threshold
+
+    def __len__(self) -> int:
+        return len(self._main) + len(self._added) - len(self._removed)
+
+    def add(self, score: float):
+        bisect.insort(self._added, score)
+        self._maybe_merge()
+
+    def remove(self, score: float):
+        i = bisect.bisect_left(self._added, score)
+        if i < len(self._added) and self._added[i] == score:
+            del self._added[i]
+        else:
+            bisect.insort(self._removed, score)
+            self._maybe_merge()
+
+    def count_below(self, score: float) -> int:
+        """score보다 작은 점수 개수"""
+        return (int(np.searchsorted(self._main, score, side='left'))
+                + bisect.bisect_left(self._added, score)
+                - bisect.bisect_left(self._removed, score))
+
+    def _maybe_merge(self):
+        if len(self._added) + len(self._removed) < max(self.merge_threshold, int(len(self._main) ** 0.5)):
+            return
+        main = self._main
+        if self._removed:
+            removed = np.asarray(self._removed)
+            values, counts = np.unique(removed, return_counts=True)
+            # 같은 값이 여러 개면 앞에서부터 해당 개수만큼 제거
+            starts = np.searchsorted(main, values, side='left')
+            keep = np.ones(len(main), dtype=bool)
+            for start, count in zip(starts.tolist(), counts.tolist()):
+                keep[start:start + count] = False
+            main = main[keep]
+        if self._added:
+            added = np.asarray(self._added)
+            main = np.insert(main, np.searchsorted(main, added), added)
+        self._main = main
+        self._added = []
+        self._removed = []
+
+
+class PercentileService:
+    """
+    점수 백분위 서비스
+    연령대/성별 동료 집단별 최신 점수 분포를 유지하고
+    "동료 환자의 X%보다 점수가 높습니다"를 계산
+    population: 대상 사용자 목록을 반환하는 함수 (첫 조회 시 전체 구축,
+                서버는 시작 시 작업 풀에서 미리 구축해 요청 처리 중 전체 순회가 없도록 함)
+    """
+
+    def __init__(self, population: Callable[[], Iterable]):
+        self._population = population
+        self._lock = threading.Lock()
+        self._built = False
+        self._cohorts: Dict[Tuple[str, str], _SortedScores] = {}
+        # 환자별 현재 반영된 (동료 집단, 점수)
+        self._latest: Dict[str, Tuple[Tuple[str, str], float]] = {}
+
+    @staticmethod
+    def cohort_key(health_data: HealthData) -> Tuple[str, str]:
+        """동료 집단 키 (연령대, 성별)"""
+        return age_band(health_data.age), health_data.gender or 'Unknown'
+
+    def rebuild(self):
+        """전체 인구의 최신 점수로 동료 집단 구축"""
+        grouped: Dict[Tuple[str, str], List[float]] = {}
+        latest: Dict[str, Tuple[Tuple[str, str], float]] = {}
+        for user in self._population():
+            if not isinstance(user, Patient):
+                continue
+            # 지연 로딩 히스토리는 실체화하지 않고 저장된 최신 기록만 사용
+            health_data, assessment = user.latest_records()
+            if assessment is None:
+                continue
+            key = self.cohort_key(health_data)
+            score = assessment.score
+            grouped.setdefault(key, []).append(score)
+            latest[user.user_id] = (key, score)
+        with self._lock:
+            self._cohorts = {
+                key: _SortedScores(np.asarray(scores, dtype=np.float64))
+                for key, scores in grouped.items()
+            }
+            self._latest = latest
+            self._built = True
+
+    def update(self, patient: Patient, health_data: HealthData, assessment: RiskAssessment):
+        """새 평가 반영 (환자의 이전 점수는 제거)"""
+        if not self._built:
+            return  # 첫 조회 시 전체 구축에 포함됨
+        key = self.cohort_key(health_data)
+        with self._lock:
+            previous = self._latest.get(patient.user_id)
+            if previous:
+                self._cohorts[previous[0]].remove(previous[1])
+            self._cohorts.setdefault(key, _SortedScores()).add(assessment.score)
+            self._latest[patient.user_id] = (key, assessment.score)
+
+    def get_percentile(self, health_data: HealthData, score: float) -> Dict:
+        """
+        동료 집단 내 백분위
+        percentile: 본인을 제외한 동료 중 점수가 더 낮은 비율 (%), 동료가 없으면 None
+        """
+        if not self._built:
+            self.rebuild()
+        key = self.cohort_key(health_data)
+        with self._lock:
+            scores = self._cohorts.get(key)
+            size = len(scores) if scores else 0
+            below = scores.count_below(score) if scores else 0
+        # 본인 점수가 집단에 포함되어 있으면 동료 수에서 제외 (본인은 below에 포함되지 않음)
+        peers = size - 1 if size else 0
+        return {
+            'peer_group': {'age_band': key[0], 'gender': key[1]},
+            'peer_count': peers,
+            'percentile': round(below / peers * 100, 1) if peers > 0 else None
+        }
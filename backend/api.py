@@ -5,13 +5,14 @@ Stroke Prediction System - FastAPI Backend Server
 설계안의 클래스 구조를 기반으로 API 엔드포인트 제공
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 import sys
 import os
 
@@ -24,14 +25,65 @@ from models import (
 )
 from services import (
     RiskCalculator, DataAnalyzer,
-    NotificationService, SharingService, MessageService
+    NotificationService, NotificationDigest, SharingService, MessageService, PolicyService
 )
+from scoring import load_engine
+from snapshot import save_snapshot, load_snapshot, capture_state, write_snapshot
+from analytics import CohortAnalytics, PercentileService
+from similarity import SimilarityIndex, similar_patients_for_doctor
+from search import SearchIndex, DOCUMENT_KINDS
+from archive import HistoryArchive, ArchivePolicy
+from export import export_stream, doctor_patients, local_time, RECORD_TYPES, FORMATS, MEDIA_TYPES
+from scheduler import RetestScheduler
+from concurrency import StripedLock, AsyncStripedLock
+from workers import WorkerPool, PoolSaturatedError
+from idempotency import IdempotencyStore, IdempotencyConflictError, request_fingerprint, MAX_KEY_LENGTH
+from eventlog import (
+    EventLog, EventLogError, replay_events,
+    login_event, health_data_event, fast_test_event,
+    share_event, unshare_event, message_event, messages_read_event, doctor_note_event,
+    risk_threshold_event
+)
+
+# 상태 스냅샷 경로 (설정 시 시작할 때 복원, 종료할 때 저장)
+SNAPSHOT_PATH = os.environ.get("STROKE_SNAPSHOT_PATH")
+
+# 이벤트 로그 경로 (설정 시 모든 상태 변경을 기록하고 시작할 때 재생)
+EVENT_LOG_PATH = os.environ.get("STROKE_EVENT_LOG_PATH")
+event_log: Optional[EventLog] = None
+
+# 히스토리 아카이브 디렉터리 (설정 시 환자별 최근 기록만 메모리에 두고 오래된 기록은 압축 세그먼트로 이동)
+ARCHIVE_PATH = os.environ.get("STROKE_ARCHIVE_DIR")
+history_archive: Optional[HistoryArchive] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    retest_scheduler.start()
+    notification_digest.start()
+    if history_archive:
+        history_archive.start()
+    # 요청 처리 중 이벤트 루프에서 전체 순회하지 않도록 인덱스를 작업 풀에서 미리 구축
+    await worker_pool.run(percentile_service.rebuild)
+    await worker_pool.run(similarity_index.rebuild)
+    await worker_pool.run(search_index.rebuild)
+    yield
+    retest_scheduler.stop()
+    notification_digest.stop()
+    if history_archive:
+        history_archive.stop()
+    worker_pool.shutdown()
+    if event_log:
+        event_log.close()
+    if SNAPSHOT_PATH:
+        save_snapshot(list(users_db.values()), SNAPSHOT_PATH,
+                      event_log.last_seq if event_log else 0, MessageService.store.messages())
 
 # FastAPI 앱 생성
 app = FastAPI(
     title="Stroke Prediction System API",
     description="뇌졸중 예방 시스템 백엔드 API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS 설정 (프론트엔드와 통신을 위해)
@@ -47,9 +99,17 @@ app.add_middleware(
 dist_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vite-latest", "dist"))
 assets_path = os.path.join(dist_path, "assets")
 
+# 위험도 계산기 (STROKE_MODEL_PATH에 학습된 모델이 있으면 로지스틱 엔진 사용)
+# STROKE_SCORE_CACHE_SIZE: 동일 입력 재제출 평가 캐시 크기 (0이면 비활성화)
+risk_calculator = RiskCalculator(
+    load_engine(os.environ.get("STROKE_MODEL_PATH")),
+    cache_size=int(os.environ.get("STROKE_SCORE_CACHE_SIZE", "4096"))
+)
+
 # ===== 메모리 기반 데이터 저장소 (실제로는 DB 사용) =====
 users_db: Dict[str, Patient | Caregiver | Doctor | Administrator] = {}
 sessions_db: Dict[str, str] = {}  # session_id -> user_id
+users_by_id: Dict[str, Patient | Caregiver | Doctor | Administrator] = {}  # user_id -> 사용자
 
 # 초기 테스트 사용자 생성
 def init_test_users():
@@ -71,7 +131,103 @@ def init_test_users():
         admin = Administrator("A001", "admin@test.com", "관리자", "admin")
         users_db["admin@test.com"] = admin
 
-init_test_users()
+def init_state():
+    """스냅샷이 있으면 복원(없으면 테스트 사용자 생성) 후 이벤트 로그 재생"""
+    global event_log, history_archive
+    log_seq = 0
+    if SNAPSHOT_PATH and os.path.exists(SNAPSHOT_PATH):
+        snapshot = load_snapshot(SNAPSHOT_PATH)
+        log_seq = snapshot.log_seq
+        if snapshot.policy:
+            PolicyService.restore(snapshot.policy)
+        for user in snapshot.users:
+            users_db[user.email] = user
+        MessageService.store.load(snapshot.messages)
+    init_test_users()
+    users_by_id.update((user.user_id, user) for user in users_db.values())
+    SharingService.graph.load(users_db.values())
+    
+    if EVENT_LOG_PATH:
+        replay_events(list(users_db.values()), EVENT_LOG_PATH, log_seq)
+        event_log = EventLog(EVENT_LOG_PATH)
+    
+    if ARCHIVE_PATH:
+        retention = os.environ.get("STROKE_ARCHIVE_RETENTION_DAYS")
+        history_archive = HistoryArchive(ARCHIVE_PATH, ArchivePolicy(
+            hot_records=int(os.environ.get("STROKE_ARCHIVE_HOT_RECORDS", "200")),
+            segment_records=int(os.environ.get("STROKE_ARCHIVE_SEGMENT_RECORDS", "500")),
+            retention_days=int(retention) if retention else None
+        ), locks=patient_thread_locks)
+        history_archive.reconcile(users_db.values())
+        DataAnalyzer.archive = history_archive
+    
+    # 관리자 임계치 변경 시 정책 스냅샷 게시 및 최신 평가 재분류
+    for user in list(users_db.values()):
+        if isinstance(user, Administrator):
+            PolicyService.attach(user, lambda: list(users_db.values()))
+
+# 환자별 분할 락 (같은 환자의 기록 변경 직렬화, STROKE_PATIENT_LOCK_STRIPES개로 분할)
+# 요청 처리는 asyncio 락, 백그라운드 스레드는 같은 분할의 스레드 락을 사용
+PATIENT_LOCK_STRIPES = int(os.environ.get("STROKE_PATIENT_LOCK_STRIPES", "64"))
+patient_thread_locks = StripedLock(PATIENT_LOCK_STRIPES)
+patient_locks = AsyncStripedLock(PATIENT_LOCK_STRIPES, patient_thread_locks)
+
+# spawn으로 시작한 프로세스(reload 서버)가 이 파일을 __mp_main__으로 다시 실행할 때는
+# 스냅샷/이벤트 로그를 다시 열지 않음 (이벤트 로그 끝부분 정리가 실행 중인 서버의 기록과 겹치지 않도록)
+if __name__ != "__mp_main__":
+    init_state()
+
+# CPU 작업 풀 (점수 계산/리포트/코호트 집계는 스레드 풀)
+# STROKE_WORKER_THREADS로 크기 지정, 대기 작업이 STROKE_WORKER_MAX_QUEUE개를 넘으면 503
+worker_pool = WorkerPool(
+    threads=int(os.environ.get("STROKE_WORKER_THREADS", "0")) or None,
+    max_queue=int(os.environ.get("STROKE_WORKER_MAX_QUEUE", "256"))
+)
+
+# 관리자 코호트 분석 (첫 조회 시 전체 집계, 이후 새 평가 증분 반영)
+cohort_analytics = CohortAnalytics(lambda: list(users_db.values()))
+
+# 연령대/성별 동료 집단 점수 백분위
+percentile_service = PercentileService(lambda: list(users_db.values()))
+
+# 유사 환자 검색 인덱스
+similarity_index = SimilarityIndex(lambda: list(users_db.values()))
+
+# 메시지 / 의사 메모 전문 검색 인덱스 (첫 검색 시 전체 색인, 이후 작성 시 증분 색인)
+search_index = SearchIndex(lambda: list(users_db.values()), MessageService.store.messages)
+
+# 정기 재검사 알림 스케줄러 (관리자 정책의 재검사 주기 사용, 서버 시작 시 스레드 시작)
+retest_scheduler = RetestScheduler(
+    lambda: list(users_db.values()),
+    locks=patient_thread_locks,
+    interval_days=next(
+        (user.alert_policies['retest_interval_days'] for user in users_db.values()
+         if isinstance(user, Administrator)),
+        90
+    )
+)
+for user in list(users_db.values()):
+    if isinstance(user, Administrator):
+        user.add_policy_listener(
+            lambda admin: retest_scheduler.set_interval_days(admin.alert_policies['retest_interval_days'])
+        )
+
+# 보호자/의사 알림 요약 발송 (STROKE_DIGEST_MAX_ITEMS건 또는 STROKE_DIGEST_INTERVAL_SECONDS마다)
+# 이벤트 로그 재생(init_state) 이후에 설정하므로 재생된 알림은 개별로 복원됨
+notification_digest = NotificationDigest(
+    max_items=int(os.environ.get("STROKE_DIGEST_MAX_ITEMS", "50")),
+    interval_seconds=float(os.environ.get("STROKE_DIGEST_INTERVAL_SECONDS", "3600"))
+)
+NotificationService.digest = notification_digest
+
+# 반복 경고 병합 기간 (STROKE_ALERT_COALESCE_SECONDS)
+if os.environ.get("STROKE_ALERT_COALESCE_SECONDS"):
+    NotificationService.ALERT_COALESCE_WINDOW = timedelta(
+        seconds=float(os.environ["STROKE_ALERT_COALESCE_SECONDS"])
+    )
+
+# 재시도 요청 중복 처리 방지 (Idempotency-Key 헤더, STROKE_IDEMPOTENCY_TTL초 동안 응답 보관)
+idempotency_store = IdempotencyStore(float(os.environ.get("STROKE_IDEMPOTENCY_TTL", str(24 * 3600))))
 
 # ===== Pydantic 모델 (Request/Response) =====
 
@@ -106,6 +262,11 @@ class RiskAssessmentResponse(BaseModel):
     risk_level: str
     risk_color: str
     recommendations: List[str]
+    contributions: Dict[str, float]
+    contribution_unit: str
+    percentile: Optional[float]  # 동료 집단 중 점수가 더 낮은 비율 (%)
+    peer_group: Dict[str, str]
+    peer_count: int
     timestamp: str
 
 class FASTTestRequest(BaseModel):
@@ -128,6 +289,56 @@ class MessageRequest(BaseModel):
     subject: str
     content: str
 
+class DoctorNoteRequest(BaseModel):
+    kind: str  # "consultation_note" or "prescription"
+    content: str
+
+class RiskThresholdRequest(BaseModel):
+    level: str  # "high" or "medium"
+    threshold: int
+
+# ===== 이벤트 기록 =====
+
+async def record_event(event_type: str, data: Dict):
+    """상태 변경 이벤트 기록 (디스크 기록 완료 후 반환)"""
+    if event_log:
+        try:
+            await event_log.wait_durable_async(event_log.append(event_type, data))
+        except EventLogError as e:
+            raise HTTPException(status_code=500, detail=f"변경 사항을 기록하지 못했습니다: {e}")
+
+def check_event_log():
+    """
+    이벤트 로그가 기록 실패 상태면 상태를 바꾸기 전에 거절
+    (기록되지 않는 변경이 메모리에 남거나, 같은 Idempotency-Key 재시도가 변경을 중복 적용하지 않도록)
+    """
+    if event_log and event_log.error:
+        raise HTTPException(status_code=503, detail=f"변경 사항을 기록할 수 없습니다: {event_log.error}")
+
+async def run_idempotent(user_id: str, endpoint: str, idempotency_key: Optional[str],
+                         body: Dict, response: Response, operation):
+    """
+    Idempotency-Key가 있으면 같은 키의 재시도에 저장된 응답 반환
+    (재사용된 응답에는 Idempotent-Replayed 헤더 추가)
+    """
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+    key = (user_id, endpoint, idempotency_key) if idempotency_key is not None else None
+    try:
+        result, replayed = await idempotency_store.execute(key, request_fingerprint(body), operation)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def offload(fn, *args, **kwargs):
+    """CPU 작업을 스레드 풀에서 실행 (풀이 포화 상태면 503 + Retry-After)"""
+    try:
+        return await worker_pool.run(fn, *args, **kwargs)
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 # ===== API 엔드포인트 =====
 
 @app.post("/api/auth/login", response_model=LoginResponse)
@@ -138,12 +349,15 @@ async def login(request: LoginRequest):
     if not user or user.password != request.password:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    check_event_log()
+    
     # 세션 생성
     session_id = f"session_{user.user_id}_{datetime.now().timestamp()}"
     sessions_db[session_id] = user.user_id
     
     # 로그인 처리
     user.login()
+    await record_event("login", login_event(user))
     
     return LoginResponse(
         success=True,
@@ -157,7 +371,9 @@ async def login(request: LoginRequest):
 @app.post("/api/health-data", response_model=RiskAssessmentResponse)
 async def submit_health_data(
     data: HealthDataRequest,
-    session_id: str
+    session_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
 ):
     """건강 데이터 제출 및 위험도 평가"""
     # 세션 확인
@@ -175,28 +391,52 @@ async def submit_health_data(
     if not patient:
         raise HTTPException(status_code=403, detail="Only patients can submit health data")
     
-    # 건강 데이터 생성
-    health_data = HealthData(patient.user_id, data.dict())
-    patient.add_health_data(health_data)
-    
-    # 위험도 평가
-    calculator = RiskCalculator()
-    assessment = calculator.assess_risk(patient, health_data)
-    
-    return RiskAssessmentResponse(
-        assessment_id=assessment.assessment_id,
-        patient_id=assessment.patient_id,
-        score=assessment.score,
-        risk_level=assessment.risk_level.value,
-        risk_color=assessment.get_risk_color(),
-        recommendations=assessment.recommendations,
-        timestamp=assessment.timestamp.isoformat()
-    )
+    async def process():
+        async with patient_locks.hold(patient.user_id):
+            # 건강 데이터 생성
+            health_data = HealthData(patient.user_id, data.dict())
+            
+            # 위험도 평가 (점수 계산은 스레드 풀, 풀이 포화 상태면 기록을 바꾸기 전에 503)
+            assessment = await offload(risk_calculator.build_assessment, patient.user_id, health_data)
+            
+            check_event_log()
+            # 건강 데이터와 위험도 평가를 함께 게시 (읽는 쪽은 평가 없는 건강 데이터를 보지 않음)
+            with patient.deferred_history_view():
+                patient.add_health_data(health_data)
+                patient.add_risk_assessment(assessment)
+            cohort_analytics.update(patient, health_data, assessment)
+            percentile_service.update(patient, health_data, assessment)
+            similarity_index.update(patient, health_data)
+            retest_scheduler.schedule(patient, health_data.timestamp.timestamp())
+            percentile = percentile_service.get_percentile(health_data, assessment.score)
+            await record_event("health_data", health_data_event(patient, health_data, assessment))
+            if history_archive:
+                history_archive.schedule(patient)
+        
+        return RiskAssessmentResponse(
+            assessment_id=assessment.assessment_id,
+            patient_id=assessment.patient_id,
+            score=assessment.score,
+            risk_level=assessment.risk_level.value,
+            risk_color=assessment.get_risk_color(),
+            recommendations=assessment.recommendations,
+            contributions=assessment.get_contributions(),
+            contribution_unit=assessment.contribution_unit,
+            percentile=percentile['percentile'],
+            peer_group=percentile['peer_group'],
+            peer_count=percentile['peer_count'],
+            timestamp=assessment.timestamp.isoformat()
+        )
+    
+    return await run_idempotent(patient.user_id, "health-data", idempotency_key,
+                                data.dict(), response, process)
 
 @app.post("/api/fast-test", response_model=FASTTestResponse)
 async def perform_fast_test(
     test_data: FASTTestRequest,
-    session_id: str
+    session_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
 ):
     """FAST 검사 수행"""
     user_id = sessions_db.get(session_id)
@@ -212,34 +452,49 @@ async def perform_fast_test(
     if not patient:
         raise HTTPException(status_code=403, detail="Only patients can perform FAST test")
     
-    # FAST 검사 수행
-    fast_test = FASTTest(patient.user_id)
-    is_emergency = fast_test.perform_test(
-        test_data.face_asymmetry,
-        test_data.arm_weakness,
-        test_data.speech_difficulty
-    )
-    patient.perform_fast_test(fast_test)
-    
-    # 응급 상황 시 알림 전송
-    if is_emergency:
-        # 공유된 보호자/의사에게 알림
-        for shared_user_id in patient.shared_with:
-            for user in users_db.values():
-                if user.user_id == shared_user_id:
+    async def process():
+        # 환자와 경고를 받을 보호자의 기록을 함께 잠금
+        caregiver_ids = SharingService.get_recipient_ids(patient, UserRole.CAREGIVER)
+        async with patient_locks.hold(patient.user_id, *caregiver_ids):
+            check_event_log()
+            # FAST 검사 수행
+            fast_test = FASTTest(patient.user_id)
+            is_emergency = fast_test.perform_test(
+                test_data.face_asymmetry,
+                test_data.arm_weakness,
+                test_data.speech_difficulty
+            )
+            patient.perform_fast_test(fast_test)
+            
+            # 응급 상황 시 알림 전송
+            alerts = []
+            if is_emergency:
+                # 공유된 보호자에게 알림
+                for recipient_id in caregiver_ids:
+                    user = users_by_id.get(recipient_id)
                     if isinstance(user, Caregiver):
-                        alert = NotificationService.send_fast_emergency_alert(
-                            patient, fast_test, user.user_id
+                        # 짧은 시간 내 반복 검사는 기존 경고에 병합
+                        alert, _ = NotificationService.deliver_alert(
+                            user,
+                            NotificationService.send_fast_emergency_alert(
+                                patient, fast_test, user.user_id
+                            )
                         )
-                        user.receive_alert(alert)
-    
-    result = fast_test.get_result()
-    return FASTTestResponse(
-        test_id=result['test_id'],
-        is_emergency=result['is_emergency'],
-        recommendation=result['recommendation'],
-        timestamp=result['timestamp']
-    )
+                        alerts.append(alert)
+            await record_event("fast_test", fast_test_event(patient, fast_test, alerts))
+            if history_archive:
+                history_archive.schedule(patient)
+        
+        result = fast_test.get_result()
+        return FASTTestResponse(
+            test_id=result['test_id'],
+            is_emergency=result['is_emergency'],
+            recommendation=result['recommendation'],
+            timestamp=result['timestamp']
+        )
+    
+    return await run_idempotent(patient.user_id, "fast-test", idempotency_key,
+                                test_data.dict(), response, process)
 
 @app.post("/api/share")
 async def share_data(
@@ -267,15 +522,36 @@ async def share_data(
         raise HTTPException(status_code=404, detail="Recipient not found")
     
     # 공유 처리
+    check_event_log()
     if request.recipient_role == "caregiver" and isinstance(recipient, Caregiver):
         SharingService.share_with_caregiver(patient, recipient)
     elif request.recipient_role == "doctor" and isinstance(recipient, Doctor):
         SharingService.share_with_doctor(patient, recipient)
     else:
         raise HTTPException(status_code=400, detail="Invalid recipient role")
+    await record_event("share", share_event(patient, recipient))
     
     return {"success": True, "message": f"Data shared with {recipient.name}"}
 
+@app.delete("/api/share/{recipient_id}")
+async def revoke_share(recipient_id: str, session_id: str):
+    """건강 데이터 공유 해제"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    patient = users_by_id.get(user_id)
+    if not isinstance(patient, Patient):
+        raise HTTPException(status_code=403, detail="Only patients can revoke sharing")
+    
+    check_event_log()
+    recipient = users_by_id.get(recipient_id)
+    if not recipient or not SharingService.revoke(patient, recipient):
+        raise HTTPException(status_code=404, detail="Sharing not found")
+    await record_event("unshare", unshare_event(patient, recipient))
+    
+    return {"success": True, "message": f"Sharing with {recipient.name} revoked"}
+
 @app.post("/api/messages")
 async def send_message(
     request: MessageRequest,
@@ -299,7 +575,9 @@ async def send_message(
         raise HTTPException(status_code=404, detail="Recipient not found")
     
     # 메시지 전송
-    if isinstance(sender, Caregiver) and isinstance(recipient, Patient):
+    check_event_log()
+    encouragement = isinstance(sender, Caregiver) and isinstance(recipient, Patient)
+    if encouragement:
         message = MessageService.send_encouragement(
             sender, recipient, request.subject, request.content
         )
@@ -308,6 +586,8 @@ async def send_message(
             sender.user_id, recipient.user_id,
             request.subject, request.content
         )
+    search_index.add_message(message)
+    await record_event("message", message_event(message, encouragement))
     
     return {
         "success": True,
@@ -315,6 +595,64 @@ async def send_message(
         "timestamp": message.timestamp.isoformat()
     }
 
+@app.get("/api/messages/inbox")
+async def get_inbox(session_id: str, limit: int = 20, before: Optional[int] = None):
+    """받은 편지함 (최신순, next_cursor를 before로 전달해 다음 페이지 조회)"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    return MessageService.store.inbox(user_id, max(1, min(limit, 100)), before)
+
+@app.get("/api/messages/conversations")
+async def get_conversations(session_id: str, limit: int = 50):
+    """대화 상대 목록 (마지막 메시지 최신순, 대화별 읽지 않은 수)"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    conversations = MessageService.store.conversations(user_id, max(1, min(limit, 200)))
+    for conversation in conversations:
+        other = users_by_id.get(conversation['user_id'])
+        conversation['name'] = other.name if other else None
+    return {"conversations": conversations, "unread_count": MessageService.store.unread_count(user_id)}
+
+@app.get("/api/messages/thread/{other_user_id}")
+async def get_message_thread(other_user_id: str, session_id: str, limit: int = 20,
+                             before: Optional[int] = None):
+    """상대와 주고받은 메시지 (최신순)"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    return MessageService.store.thread(user_id, other_user_id, max(1, min(limit, 100)), before)
+
+@app.post("/api/messages/thread/{other_user_id}/read")
+async def mark_thread_read(other_user_id: str, session_id: str):
+    """상대에게 받은 메시지 모두 읽음 처리"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    check_event_log()
+    marked = MessageService.store.mark_thread_read(user_id, other_user_id)
+    if marked:
+        await record_event("messages_read", messages_read_event(users_by_id[user_id], marked))
+    return {"success": True, "marked_count": len(marked)}
+
+@app.get("/api/search")
+async def search_documents(session_id: str, q: str, limit: int = 20, kind: Optional[str] = None):
+    """보낸/받은 메시지와 작성한 진단/처방 메모 전문 검색 (관련도 순)"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    if kind is not None and kind not in DOCUMENT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(DOCUMENT_KINDS)}")
+    
+    results = await offload(search_index.search, user_id, q, max(1, min(limit, 100)), [kind] if kind else None)
+    return {"query": q, "results": results}
+
 @app.get("/api/dashboard")
 async def get_dashboard(session_id: str):
     """대시보드 데이터 조회"""
@@ -349,9 +687,34 @@ async def get_patient_report(session_id: str):
     if not patient:
         raise HTTPException(status_code=403, detail="Only patients can view reports")
     
-    report = DataAnalyzer.generate_personal_report(patient)
+    report = await offload(DataAnalyzer.generate_personal_report, patient)
     return report
 
+@app.get("/api/patients/{patient_id}/series/{metric}")
+async def get_patient_series(patient_id: str, metric: str, session_id: str,
+                             start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             points: int = 200, method: str = "lttb"):
+    """
+    차트용 지표 시계열 (avg_glucose_level, bmi, risk_score)
+    환자 본인 또는 공유받은 보호자/의사만 조회, points개 이하로 다운샘플링
+    """
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    if user_id != patient_id and not SharingService.is_shared(patient_id, user_id):
+        raise HTTPException(status_code=403, detail="Patient is not shared with this user")
+    
+    patient = users_by_id.get(patient_id)
+    if not isinstance(patient, Patient):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    try:
+        return await offload(DataAnalyzer.get_series, patient, metric, start, end,
+                             max(3, min(points, 2000)), method)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/doctor/patients")
 async def get_doctor_patients(session_id: str):
     """의사의 담당 환자 목록 (위험도 순)"""
@@ -370,22 +733,85 @@ async def get_doctor_patients(session_id: str):
     
     # 담당 환자 정보 수집
     patients_data = []
-    for patient_id in doctor.assigned_patients:
-        for user in users_db.values():
-            if user.user_id == patient_id and isinstance(user, Patient):
-                risk_level = user.get_latest_risk_level()
-                patients_data.append({
-                    'patient_id': user.user_id,
-                    'name': user.name,
-                    'email': user.email,
-                    'risk_level': risk_level.value if risk_level else 'Unknown',
-                    'total_records': len(user.health_records)
-                })
+    for patient_id in SharingService.get_patient_ids(doctor, UserRole.DOCTOR):
+        user = users_by_id.get(patient_id)
+        if isinstance(user, Patient):
+            risk_level = user.get_latest_risk_level()
+            patients_data.append({
+                'patient_id': user.user_id,
+                'name': user.name,
+                'email': user.email,
+                'risk_level': risk_level.value if risk_level else 'Unknown',
+                'total_records': len(user.health_records)
+            })
     
     # 위험도 순 정렬
     sorted_patients = doctor.get_patient_panel(patients_data)
     return {"patients": sorted_patients}
 
+@app.get("/api/doctor/patients/{patient_id}/similar")
+async def get_similar_patients(patient_id: str, session_id: str, k: int = 10):
+    """담당 환자와 건강 프로필이 유사한 환자 조회"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    doctor = None
+    for user in users_db.values():
+        if user.user_id == user_id and isinstance(user, Doctor):
+            doctor = user
+            break
+    
+    if not doctor:
+        raise HTTPException(status_code=403, detail="Only doctors can search similar patients")
+    
+    if not SharingService.is_shared(patient_id, doctor.user_id):
+        raise HTTPException(status_code=403, detail="Patient is not shared with this doctor")
+    
+    patient = users_by_id.get(patient_id)
+    if not isinstance(patient, Patient) or not patient.health_records:
+        raise HTTPException(status_code=404, detail="Patient health data not found")
+    
+    k = max(1, min(k, 100))
+    return {
+        "patient_id": patient.user_id,
+        "similar_patients": await offload(similar_patients_for_doctor, similarity_index, doctor, patient, k)
+    }
+
+@app.post("/api/doctor/patients/{patient_id}/notes")
+async def add_doctor_note(patient_id: str, request: DoctorNoteRequest, session_id: str):
+    """담당 환자 진단/처방 메모 작성"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    doctor = None
+    for user in users_db.values():
+        if user.user_id == user_id and isinstance(user, Doctor):
+            doctor = user
+            break
+    
+    if not doctor:
+        raise HTTPException(status_code=403, detail="Only doctors can write notes")
+    
+    if not SharingService.is_shared(patient_id, doctor.user_id):
+        raise HTTPException(status_code=403, detail="Patient is not shared with this doctor")
+    
+    check_event_log()
+    if request.kind == "consultation_note":
+        doctor.add_consultation_note(patient_id, request.content)
+        entry = doctor.consultation_notes[patient_id][-1]
+    elif request.kind == "prescription":
+        doctor.add_prescription(patient_id, request.content)
+        entry = doctor.prescriptions[patient_id][-1]
+    else:
+        raise HTTPException(status_code=400, detail="kind must be 'consultation_note' or 'prescription'")
+    
+    search_index.add_note(doctor, request.kind, patient_id)
+    await record_event("doctor_note", doctor_note_event(doctor, request.kind, patient_id, entry))
+    
+    return {"success": True, "patient_id": patient_id, "kind": request.kind, "timestamp": entry['timestamp']}
+
 @app.get("/api/caregiver/monitored")
 async def get_monitored_patients(session_id: str):
     """보호자가 모니터링하는 환자 목록"""
@@ -404,22 +830,178 @@ async def get_monitored_patients(session_id: str):
     
     # 모니터링 중인 환자 정보 수집
     patients_data = []
-    for patient_id in caregiver.monitored_patients:
-        for user in users_db.values():
-            if user.user_id == patient_id and isinstance(user, Patient):
-                shared_data = SharingService.get_shared_data(user, UserRole.CAREGIVER)
-                patients_data.append(shared_data)
+    for patient_id in SharingService.get_patient_ids(caregiver, UserRole.CAREGIVER):
+        user = users_by_id.get(patient_id)
+        if isinstance(user, Patient):
+            shared_data = SharingService.get_shared_data(user, UserRole.CAREGIVER)
+            patients_data.append(shared_data)
     
     return {"patients": patients_data}
 
+@app.post("/api/admin/risk-threshold")
+async def set_risk_threshold(
+    request: RiskThresholdRequest,
+    session_id: str
+):
+    """위험 임계치 변경 (최신 평가 백그라운드 재분류)"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    admin = None
+    for user in users_db.values():
+        if user.user_id == user_id and isinstance(user, Administrator):
+            admin = user
+            break
+    
+    if not admin:
+        raise HTTPException(status_code=403, detail="Only administrators can change risk thresholds")
+    
+    check_event_log()
+    previous_version = PolicyService.current().version
+    if not admin.set_risk_threshold(request.level, request.threshold):
+        raise HTTPException(status_code=400, detail="Invalid risk threshold")
+    await record_event("risk_threshold", risk_threshold_event(admin, request.level, request.threshold))
+    
+    policy = PolicyService.current()
+    job = PolicyService.latest_job() if policy.version != previous_version else None
+    return {
+        "success": True,
+        "policy": policy.to_dict(),
+        "reclassification": job.get_progress() if job else None
+    }
+
+@app.get("/api/admin/reclassification/{job_id}")
+async def get_reclassification_progress(job_id: str, session_id: str):
+    """재분류 작업 진행 상황 조회"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    is_admin = any(
+        user.user_id == user_id and isinstance(user, Administrator)
+        for user in users_db.values()
+    )
+    if not is_admin:
+        raise HTTPException(status_code=403, detail="Only administrators can view reclassification jobs")
+    
+    job = PolicyService.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job.get_progress()
+
+@app.get("/api/admin/cohorts")
+async def get_cohort_analytics(session_id: str, dimension: Optional[str] = None):
+    """코호트 분석 (위험도 분포, 점수 히스토그램, 위험 요인 유병률)"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    is_admin = any(
+        user.user_id == user_id and isinstance(user, Administrator)
+        for user in users_db.values()
+    )
+    if not is_admin:
+        raise HTTPException(status_code=403, detail="Only administrators can view cohort analytics")
+    
+    try:
+        # 전체 재집계가 필요하면 스레드 풀에서 환자 목록을 순회해 집계
+        return await offload(cohort_analytics.get_report, dimension)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/export/{record_type}")
+async def export_records(record_type: str, session_id: str, format: str = "ndjson",
+                         start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         risk_level: Optional[str] = None, doctor_id: Optional[str] = None):
+    """
+    건강 데이터/위험도 평가/FAST 검사 일괄 내보내기 (NDJSON 또는 CSV 스트리밍)
+    관리자는 전체 환자(doctor_id로 의사 패널 제한), 의사는 공유받은 환자만
+    risk_level: 환자 최신 위험도 필터 (쉼표로 여러 개, 예: High,Medium)
+    """
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    user = users_by_id.get(user_id)
+    if isinstance(user, Doctor):
+        doctor_id = user.user_id
+    elif not isinstance(user, Administrator):
+        raise HTTPException(status_code=403, detail="Only doctors and administrators can export data")
+    
+    if record_type not in RECORD_TYPES:
+        raise HTTPException(status_code=404, detail=f"record_type must be one of {', '.join(RECORD_TYPES)}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    try:
+        risk_levels = [RiskLevel(level.strip()) for level in risk_level.split(',')] if risk_level else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="risk_level must be High, Medium or Low")
+    # 기록 시각은 시간대 없는 현지 시각이므로 스트리밍 시작 전에 같은 형식으로 맞춤
+    start, end = local_time(start), local_time(end)
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be later than end")
+    
+    if doctor_id:
+        doctor = users_by_id.get(doctor_id)
+        if not isinstance(doctor, Doctor):
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        patients = doctor_patients(doctor, users_by_id, SharingService.get_patient_ids)
+    else:
+        patients = [u for u in users_db.values() if isinstance(u, Patient)]
+    
+    filename = f"{record_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(
+        export_stream(patients, record_type, format, start, end, risk_levels),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.post("/api/admin/snapshot")
+async def create_snapshot(session_id: str):
+    """메모리 상태 스냅샷 저장"""
+    user_id = sessions_db.get(session_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    is_admin = any(
+        user.user_id == user_id and isinstance(user, Administrator)
+        for user in users_db.values()
+    )
+    if not is_admin:
+        raise HTTPException(status_code=403, detail="Only administrators can create snapshots")
+    
+    if not SNAPSHOT_PATH:
+        raise HTTPException(status_code=400, detail="STROKE_SNAPSHOT_PATH is not configured")
+    
+    # 이벤트 로그 순번과 일치하는 상태를 루프에서 캡처 (히스토리는 참조만), 인코딩/기록은 스레드 풀
+    state = capture_state(users_db.values(), event_log.last_seq if event_log else 0,
+                          MessageService.store.messages())
+    meta = await offload(write_snapshot, state, SNAPSHOT_PATH)
+    return {"success": True, "path": SNAPSHOT_PATH, "snapshot": meta}
+
 @app.get("/api/health")
 async def health_check():
     """헬스 체크"""
     return {
-        "status": "healthy",
+        "status": "degraded" if event_log and event_log.error else "healthy",
         "timestamp": datetime.now().isoformat(),
         "users_count": len(users_db),
-        "sessions_count": len(sessions_db)
+        "sessions_count": len(sessions_db),
+        "score_cache": risk_calculator.get_cache_stats(),
+        "idempotency": idempotency_store.get_stats(),
+        "retest_scheduler": retest_scheduler.get_stats(),
+        "notification_digest": notification_digest.get_stats(),
+        "search_index": search_index.get_stats(),
+        "history_archive": history_archive.get_stats() if history_archive else None,
+        "patient_locks": patient_locks.get_stats(),
+        "worker_pool": worker_pool.get_stats(),
+        "event_log": {
+            "last_seq": event_log.last_seq,
+            "durable_seq": event_log.durable_seq,
+            "error": str(event_log.error) if event_log.error else None
+        } if event_log else None
     }
 
 # ===== React 정적 파일 서빙 =====
@@ -0,0 +1,403 @@
+"""
+Stroke Prediction System - History Archive
+환자 히스토리 계층 저장 (최근 기록은 메모리, 오래된 기록은 압축 세그먼트)
+
+환자별 건강 데이터/위험도 평가/FAST 검사 목록이 hot_records + segment_records를 넘으면
+가장 오래된 segment_records개를 zlib 압축 JSON 세그먼트 파일로 옮기고 메모리 목록에서 제거.
+세그먼트는 한 번 쓰면 바뀌지 않으며(불변), 기간 조회/리포트에서 필요할 때만 읽어
+최근 사용 세그먼트 캐시(LRU)에 보관. 보존 기간(retention_days)이 지난 세그먼트는 압축 시 삭제
+압축은 요청 처리에서 schedule()로 예약하면 백그라운드 스레드가 환자 락을 잡고 실행하며,
+세그먼트 목록은 환자별 색인 파일에 기록하므로 압축 비용이 전체 환자 수와 무관함
+
+디렉터리 구조:
+    <directory>/<patient_id>/index.json          환자 세그먼트 목록 (원자적 교체)
+    <directory>/<patient_id>/<종류>-NNNNNN.seg   세그먼트 (zlib(JSON 레코드 배열))
+    (이전 형식의 전체 색인 <directory>/index.json은 열 때 환자별 색인으로 옮김)
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+from concurrency import StripedLock
+from models import Patient, HealthData, RiskAssessment, FASTTest, RiskLevel
+
+
+# 아카이브 대상 Patient 히스토리 목록 속성
+HISTORY_KINDS = ('health_records', 'risk_assessments', 'fast_tests')
+
+INDEX_FILE = 'index.json'
+
+
+class ArchivePolicy:
+    """
+    압축/보존 정책
+    hot_records: 메모리에 남길 종류별 최근 기록 수
+    segment_records: 세그먼트당 기록 수 (hot_records + segment_records를 넘으면 압축)
+    retention_days: 세그먼트 보존 기간 (None이면 무기한)
+    """
+
+    def __init__(self, hot_records: int = 200, segment_records: int = 500,
+                 retention_days: Optional[int] = None):
+        if hot_records < 1 or segment_records < 1:
+            raise ValueError("hot_records와 segment_records는 1 이상이어야 합니다")
+        self.hot_records = hot_records
+        self.segment_records = segment_records
+        self.retention_days = retention_days
+
+    def to_dict(self) -> Dict:
+        return {
+            'hot_records': self.hot_records,
+            'segment_records': self.segment_records,
+            'retention_days': self.retention_days
+        }
+
+
+# ===== 레코드 직렬화 =====
+
+def _encode(kind: str, record) -> Dict:
+    if kind == 'health_records':
+        return record.to_dict()
+    if kind == 'risk_assessments':
+        return {
+            'assessment_id': record.assessment_id,
+            'patient_id': record.patient_id,
+            'health_data_id': record.health_data_id,
+            'timestamp': record.timestamp.isoformat(),
+            'score': record.score,
+            'risk_level': record.risk_level.value,
+            'recommendations': list(record.recommendations),
+            'risk_factor_mask': record.risk_factor_mask,
+            'policy_version': record.policy_version,
+            'contributions': record.contributions.hex(),
+            'contribution_unit': record.contribution_unit
+        }
+    result = record.get_result()
+    del result['recommendation']
+    return result
+
+
+def _decode(kind: str, data: Dict):
+    if kind == 'health_records':
+        record = HealthData(data['patient_id'], {**data, 'Residence_type': data['residence_type']})
+        record.health_data_id = data['health_data_id']
+    elif kind == 'risk_assessments':
+        record = RiskAssessment(data['patient_id'], SimpleNamespace(health_data_id=data['health_data_id']),
+                                data['score'], RiskLevel(data['risk_level']))
+        record.assessment_id = data['assessment_id']
+        record.set_recommendations(tuple(data['recommendations']))
+        record.risk_factor_mask = data['risk_factor_mask']
+        record.policy_version = data['policy_version']
+        record.contributions = bytes.fromhex(data['contributions'])
+        record.contribution_unit = data['contribution_unit']
+    else:
+        record = FASTTest(data['patient_id'])
+        record.perform_test(data['face_asymmetry'], data['arm_weakness'], data['speech_difficulty'])
+        record.test_id = data['test_id']
+    record.timestamp = datetime.fromisoformat(data['timestamp'])
+    return record
+
+
+def _record_id(kind: str, record) -> str:
+    if kind == 'health_records':
+        return record.health_data_id
+    if kind == 'risk_assessments':
+        return record.assessment_id
+    return record.test_id
+
+
+class HistoryArchive:
+    """
+    환자 히스토리 아카이브
+    schedule(patient)는 기록 추가 후 호출 (start()한 백그라운드 스레드가 압축),
+    compact(patient)는 호출한 스레드에서 바로 압축, history()는 아카이브 + 메모리 기록을 시간순으로 반환
+    locks: 환자별 분할 락 (지정하면 백그라운드 압축 중 같은 환자의 기록 추가와 상호 배제)
+    """
+
+    def __init__(self, directory: str, policy: Optional[ArchivePolicy] = None, cache_segments: int = 64,
+                 locks: Optional[StripedLock] = None):
+        self.directory = directory
+        self.policy = policy or ArchivePolicy()
+        self.cache_segments = cache_segments
+        self.locks = locks
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, list]" = OrderedDict()
+        # 환자 ID -> 종류 -> {'next': 다음 세그먼트 번호, 'last_id': 마지막 아카이브 기록 ID, 'segments': [...]}
+        self._index: Dict[str, Dict[str, Dict]] = {}
+        self.segments_written = 0
+        self.segments_expired = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.compaction_failures = 0
+        # 백그라운드 압축: 예약된 환자 (환자 ID -> 환자, 예약 순서 유지)
+        self._pending: "OrderedDict[str, Patient]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name, INDEX_FILE)
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._index[name] = json.load(f)
+        legacy_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(legacy_path):
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)['patients']
+            for patient_id, kinds in legacy.items():
+                self._index.setdefault(patient_id, kinds)
+                self._save_index(patient_id)
+            os.remove(legacy_path)
+
+    # ===== 색인 =====
+
+    def _save_index(self, patient_id: str):
+        """환자 색인 파일 기록 (해당 환자 세그먼트 목록만, 원자적 교체)"""
+        with self._lock:
+            payload = json.dumps(self._index.get(patient_id, {}))
+        directory = os.path.join(self.directory, patient_id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, INDEX_FILE)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _entry(self, patient_id: str, kind: str) -> Dict:
+        kinds = self._index.setdefault(patient_id, {})
+        return kinds.setdefault(kind, {'next': 0, 'last_id': None, 'segments': []})
+
+    def archived_count(self, patient_id: str, kind: str) -> int:
+        """아카이브에 남아 있는 기록 수"""
+        entry = self._index.get(patient_id, {}).get(kind)
+        return sum(segment['count'] for segment in entry['segments']) if entry else 0
+
+    def _update_counts(self, patient: Patient):
+        patient.archived_counts = {kind: self.archived_count(patient.user_id, kind) for kind in HISTORY_KINDS}
+
+    def reconcile(self, users: Iterable):
+        """
+        시작 시 아카이브와 메모리 히스토리 맞춤 (스냅샷 복원/이벤트 재생 후 호출)
+        이벤트 로그를 처음부터 재생해 이미 아카이브한 기록이 다시 메모리에 들어왔으면 제거
+        """
+        with self._lock:
+            for user in users:
+                if not isinstance(user, Patient) or user.user_id not in self._index:
+                    continue
+                for kind, entry in self._index[user.user_id].items():
+                    records = getattr(user, kind)
+                    last_id = entry['last_id']
+                    for position, record in enumerate(records):
+                        if _record_id(kind, record) == last_id:
+                            setattr(user, kind, records[position + 1:])
+                            break
+                self._update_counts(user)
+
+    # ===== 압축 / 보존 =====
+
+    def needs_compaction(self, patient: Patient) -> bool:
+        """메모리 기록이 정책 한도를 넘은 종류가 있는지 (게시된 읽기 스냅샷 기준)"""
+        limit = self.policy.hot_records + self.policy.segment_records
+        view = patient.history_view()
+        return any(len(getattr(view, kind)) > limit for kind in HISTORY_KINDS)
+
+    def compact(self, patient: Patient) -> int:
+        """
+        메모리 기록이 정책 한도를 넘은 종류를 세그먼트로 압축, 보존 기간이 지난 세그먼트 삭제
+        새로 쓴 세그먼트 수 반환. 같은 환자의 기록 추가와 동시에 실행되지 않아야 함 (환자 락 보유)
+        세그먼트 파일 기록/fsync는 아카이브 락 밖에서 하고, 색인 반영과 메모리 목록 교체만 락 안에서 함께 처리
+        """
+        limit = self.policy.hot_records + self.policy.segment_records
+        if all(len(getattr(patient, kind)) <= limit for kind in HISTORY_KINDS):
+            return 0
+        patient_id = patient.user_id
+        with self._lock:
+            kinds = self._index.get(patient_id, {})
+            next_numbers = {kind: kinds[kind]['next'] if kind in kinds else 0 for kind in HISTORY_KINDS}
+        segments = []   # (종류, 색인 항목)
+        remaining = {}  # 종류 -> 메모리에 남길 기록
+        for kind in HISTORY_KINDS:
+            records = getattr(patient, kind)
+            moved = 0
+            while len(records) - moved > limit:
+                segments.append((kind, self._write_segment(
+                    patient_id, kind, next_numbers[kind] + moved // self.policy.segment_records,
+                    records[moved:moved + self.policy.segment_records]
+                )))
+                moved += self.policy.segment_records
+            if moved:
+                remaining[kind] = records[moved:]
+
+        with self._lock:
+            for kind, segment in segments:
+                entry = self._entry(patient_id, kind)
+                entry['last_id'] = segment.pop('last_id')
+                entry['segments'].append(segment)
+                entry['next'] += 1
+                self.segments_written += 1
+            for kind, records in remaining.items():
+                # 앞부분을 지우지 않고 새 목록으로 교체 (게시된 읽기 스냅샷 유지)
+                setattr(patient, kind, records)
+            expired = self._expire(patient_id)
+            self._update_counts(patient)
+        self._save_index(patient_id)
+        for path in expired:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(segments)
+
+    def _write_segment(self, patient_id: str, kind: str, number: int, records: List) -> Dict:
+        """세그먼트 파일 기록, 색인 항목 반환 (색인 반영은 호출자)"""
+        directory = os.path.join(self.directory, patient_id)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{kind}-{number:06d}.seg"
+        payload = json.dumps([_encode(kind, record) for record in records], ensure_ascii=False)
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(zlib.compress(payload.encode('utf-8'), 6))
+            f.flush()
+            os.fsync(f.fileno())
+        return {
+            'file': f"{patient_id}/{name}",
+            'count': len(records),
+            'start': records[0].timestamp.timestamp(),
+            'end': records[-1].timestamp.timestamp(),
+            'last_id': _record_id(kind, records[-1])
+        }
+
+    def _expire(self, patient_id: str) -> List[str]:
+        """보존 기간이 지난 세그먼트를 색인에서 제거, 삭제할 파일 경로 반환 (호출자가 락 보유)"""
+        if self.policy.retention_days is None:
+            return []
+        cutoff = time.time() - self.policy.retention_days * 86400
+        expired = []
+        for entry in self._index.get(patient_id, {}).values():
+            while entry['segments'] and entry['segments'][0]['end'] < cutoff:
+                segment = entry['segments'].pop(0)
+                self._cache.pop(segment['file'], None)
+                expired.append(os.path.join(self.directory, segment['file']))
+                self.segments_expired += 1
+        return expired
+
+    # ===== 백그라운드 압축 =====
+
+    def schedule(self, patient: Patient):
+        """압축이 필요하면 백그라운드 압축 예약 (이벤트 루프에서 호출, 파일 입출력 없음)"""
+        if not self.needs_compaction(patient):
+            return
+        with self._cond:
+            self._pending[patient.user_id] = patient
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopped)
+                if self._stopped:
+                    return
+                _, patient = self._pending.popitem(last=False)
+            try:
+                with self.locks.hold(patient.user_id) if self.locks else nullcontext():
+                    self.compact(patient)
+            except Exception:
+                # 기록은 메모리와 이벤트 로그에 남아 있으므로 다음 예약 때 다시 압축
+                with self._lock:
+                    self.compaction_failures += 1
+
+    def start(self) -> 'HistoryArchive':
+        """백그라운드 압축 스레드 시작"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="HistoryArchiveCompactor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """백그라운드 압축 중지 (예약된 압축은 버림, 기록은 메모리에 남음)"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ===== 조회 =====
+
+    def _read_segment(self, kind: str, segment: Dict) -> list:
+        key = segment['file']
+        records = self._cache.get(key)
+        if records is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return records
+        self.cache_misses += 1
+        with open(os.path.join(self.directory, key), 'rb') as f:
+            data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        records = [_decode(kind, item) for item in data]
+        self._cache[key] = records
+        while len(self._cache) > self.cache_segments:
+            self._cache.popitem(last=False)
+        return records
+
+    def load(self, patient_id: str, kind: str, start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> List:
+        """아카이브 기록 중 기간에 해당하는 것 (시간순, 기간과 겹치는 세그먼트만 읽음)"""
+        start_ts = start.timestamp() if start is not None else None
+        end_ts = end.timestamp() if end is not None else None
+        with self._lock:
+            entry = self._index.get(patient_id, {}).get(kind)
+            if not entry:
+                return []
+            result = []
+            for segment in entry['segments']:
+                if (start_ts is not None and segment['end'] < start_ts) or \
+                        (end_ts is not None and segment['start'] > end_ts):
+                    continue
+                result.extend(
+                    record for record in self._read_segment(kind, segment)
+                    if (start is None or record.timestamp >= start) and (end is None or record.timestamp <= end)
+                )
+            return result
+
+    def history(self, patient: Patient, kind: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> List:
+        """아카이브 + 메모리 기록 (시간순, 기간 필터, 메모리 기록은 게시된 읽기 스냅샷 기준)"""
+        if patient.user_id not in self._index:
+            view, archived = patient.history_view(), []
+        else:
+            # 압축 중에는 세그먼트 기록과 메모리 목록 교체가 함께 보이도록 같은 락에서 읽음
+            with self._lock:
+                view = patient.history_view()
+                archived = self.load(patient.user_id, kind, start, end)
+        hot = [
+            record for record in getattr(view, kind)
+            if (start is None or record.timestamp >= start) and (end is None or record.timestamp <= end)
+        ]
+        return archived + hot
+
+    def get_stats(self) -> Dict:
+        """세그먼트 수, 아카이브 기록 수, 캐시 적중"""
+        with self._lock:
+            entries = [entry for kinds in self._index.values() for entry in kinds.values()]
+            return {
+                'policy': self.policy.to_dict(),
+                'patients': len(self._index),
+                'segments': sum(len(entry['segments']) for entry in entries),
+                'archived_records': sum(s['count'] for entry in entries for s in entry['segments']),
+                'segments_written': self.segments_written,
+                'segments_expired': self.segments_expired,
+                'cached_segments': len(self._cache),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'pending_compactions': len(self._pending),
+                'compaction_failures': self.compaction_failures
+            }
@@ -0,0 +1,271 @@
+"""
+Stroke Prediction System - Columnar Export
+분석용 열(column) 형식 내보내기
+
+건강 데이터 / 위험도 평가 / FAST 검사를 기록 월별로 분할(month=YYYY-MM)한 열 형식 파일로 저장.
+pyarrow가 설치되어 있으면 Parquet(분할당 파일 하나, batch_rows 행마다 row group 하나),
+없으면 NumPy .npz(batch_rows 행마다 part 파일 하나)로 기록하므로 메모리는 분할별 배치 크기로 제한됨.
+범주형 열은 사전(dictionary) 인코딩: Parquet은 dictionary 열, .npz는 int32 코드(-1은 미입력)와
+'<열>.categories' 배열. 실수형 미입력은 NaN, 정수형 미입력은 -1
+
+실행:
+    python columnar.py state.snap --event-log events.log --type assessment -o exports/
+    python columnar.py state.snap --type health_data --format npz --batch-rows 100000 -o exports/
+"""
+
+import argparse
+import json
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from export import COLUMNS, RECORD_TYPES, iter_rows, select_patients
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 선택 의존성
+    pa = None
+    pq = None
+
+
+# 기본 배치(row group) 크기
+DEFAULT_BATCH_ROWS = 65536
+
+# 열 종류 (열 이름은 export.COLUMNS 순서)
+_CATEGORY = 'category'
+_STRING = 'string'
+_TIMESTAMP = 'timestamp'
+_FLOAT = 'float'
+_INT = 'int'
+_BOOL = 'bool'
+
+COLUMN_KINDS = {
+    'health_data': {
+        'health_data_id': _STRING, 'patient_id': _STRING, 'timestamp': _TIMESTAMP,
+        'age': _FLOAT, 'gender': _CATEGORY, 'hypertension': _INT, 'heart_disease': _INT,
+        'ever_married': _CATEGORY, 'work_type': _CATEGORY, 'residence_type': _CATEGORY,
+        'avg_glucose_level': _FLOAT, 'bmi': _FLOAT, 'smoking_status': _CATEGORY
+    },
+    'assessment': {
+        'assessment_id': _STRING, 'patient_id': _STRING, 'health_data_id': _STRING,
+        'timestamp': _TIMESTAMP, 'score': _FLOAT, 'risk_level': _CATEGORY,
+        'risk_factor_mask': _INT, 'policy_version': _INT, 'contribution_unit': _CATEGORY,
+        **{column: _FLOAT for column in COLUMNS['assessment'] if column.startswith('contribution_')
+           and column != 'contribution_unit'}
+    },
+    'fast_test': {
+        'test_id': _STRING, 'patient_id': _STRING, 'timestamp': _TIMESTAMP,
+        'face_asymmetry': _BOOL, 'arm_weakness': _BOOL, 'speech_difficulty': _BOOL, 'is_emergency': _BOOL
+    }
+}
+
+FORMATS = ('auto', 'parquet', 'npz')
+
+
+def encode_categories(values: List[Optional[str]]):
+    """범주형 값 -> (int32 코드, 범주 목록), 미입력은 -1"""
+    categories: Dict[str, int] = {}
+    codes = np.fromiter(
+        (-1 if value is None else categories.setdefault(value, len(categories)) for value in values),
+        dtype=np.int32, count=len(values)
+    )
+    return codes, list(categories)
+
+
+def to_columns(rows: List[Dict], record_type: str) -> Dict[str, object]:
+    """
+    평면 레코드 배치 -> 열 배열
+    범주형 열은 (코드, 범주 목록) 튜플
+    """
+    columns = {}
+    for column, kind in COLUMN_KINDS[record_type].items():
+        values = [row[column] for row in rows]
+        if kind == _CATEGORY:
+            columns[column] = encode_categories(values)
+        elif kind == _STRING:
+            columns[column] = np.array(values, dtype=str)
+        elif kind == _TIMESTAMP:
+            columns[column] = np.array(values, dtype='datetime64[us]')
+        elif kind == _FLOAT:
+            columns[column] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        elif kind == _INT:
+            columns[column] = np.array([-1 if v is None else v for v in values], dtype=np.int64)
+        else:
+            columns[column] = np.array(values, dtype=bool)
+    return columns
+
+
+class _NpzPartition:
+    """.npz 분할: 배치마다 part 파일 하나"""
+
+    def __init__(self, directory: str, record_type: str):
+        self.directory = directory
+        self.record_type = record_type
+        self.parts = 0
+
+    def write(self, rows: List[Dict]):
+        arrays = {}
+        for column, value in to_columns(rows, self.record_type).items():
+            if isinstance(value, tuple):
+                arrays[column], categories = value
+                arrays[f'{column}.categories'] = np.array(categories, dtype=str)
+            else:
+                arrays[column] = value
+        np.savez_compressed(os.path.join(self.directory, f'part-{self.parts:05d}.npz'), **arrays)
+        self.parts += 1
+
+    def close(self):
+        pass
+
+
+class _ParquetPartition:
+    """Parquet 분할: 파일 하나에 배치마다 row group 하나"""
+
+    def __init__(self, directory: str, record_type: str):
+        self.path = os.path.join(directory, 'part-00000.parquet')
+        self.record_type = record_type
+        self.parts = 1
+        self._writer = None
+
+    def write(self, rows: List[Dict]):
+        arrays, names = [], []
+        for column, value in to_columns(rows, self.record_type).items():
+            if isinstance(value, tuple):
+                codes, categories = value
+                indices = pa.array(codes, mask=codes < 0, type=pa.int32())
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(categories, type=pa.string())))
+            else:
+                arrays.append(pa.array(value))
+            names.append(column)
+        table = pa.Table.from_arrays(arrays, names=names)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def resolve_format(fmt: str) -> str:
+    """'auto'는 pyarrow가 있으면 parquet, 없으면 npz"""
+    if fmt == 'auto':
+        return 'parquet' if pa is not None else 'npz'
+    if fmt == 'parquet' and pa is None:
+        raise RuntimeError("Parquet 내보내기에는 pyarrow가 필요합니다 (pip install pyarrow)")
+    return fmt
+
+
+def export_columnar(patients: Iterable, record_type: str, out_dir: str, fmt: str = 'auto',
+                    batch_rows: int = DEFAULT_BATCH_ROWS, release_history: bool = False) -> Dict:
+    """
+    기록을 월별 분할 열 형식 파일로 저장, 매니페스트(분할별 행 수/파일 수) 반환
+    out_dir/<record_type>/month=YYYY-MM/part-*.{parquet|npz}, out_dir/<record_type>/_manifest.json
+    임시 디렉터리에 모두 쓴 뒤 기존 out_dir/<record_type>과 교체하므로 이전 내보내기의 파일이 남지 않고,
+    실패하면 기존 내보내기가 그대로 유지됨
+    """
+    if record_type not in RECORD_TYPES:
+        raise ValueError(f"지원하지 않는 기록 종류입니다: {record_type}")
+    fmt = resolve_format(fmt)
+    partition_class = _ParquetPartition if fmt == 'parquet' else _NpzPartition
+    target = os.path.join(out_dir, record_type)
+    base = os.path.join(out_dir, f'.{record_type}.tmp-{os.getpid()}')
+    shutil.rmtree(base, ignore_errors=True)
+
+    partitions: Dict[str, object] = {}
+    buffers: Dict[str, List[Dict]] = {}
+    counts: Dict[str, int] = {}
+
+    def flush(month: str):
+        if month not in partitions:
+            directory = os.path.join(base, f'month={month}')
+            os.makedirs(directory, exist_ok=True)
+            partitions[month] = partition_class(directory, record_type)
+        partitions[month].write(buffers[month])
+        counts[month] = counts.get(month, 0) + len(buffers[month])
+        buffers[month] = []
+
+    completed = False
+    try:
+        for row in iter_rows(select_patients(patients), record_type, release_history=release_history):
+            month = row['timestamp'][:7]
+            buffer = buffers.setdefault(month, [])
+            buffer.append(row)
+            if len(buffer) >= batch_rows:
+                flush(month)
+        for month, buffer in list(buffers.items()):
+            if buffer:
+                flush(month)
+        completed = True
+    finally:
+        for partition in partitions.values():
+            partition.close()
+        if not completed:
+            shutil.rmtree(base, ignore_errors=True)
+
+    manifest = {
+        'record_type': record_type,
+        'format': fmt,
+        'columns': COLUMN_KINDS[record_type],
+        'partitions': {
+            f'month={month}': {'rows': counts[month], 'files': partitions[month].parts}
+            for month in sorted(partitions)
+        },
+        'total_rows': sum(counts.values())
+    }
+    os.makedirs(base, exist_ok=True)
+    with open(os.path.join(base, '_manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    # 기존 내보내기를 옆으로 옮기고 새 디렉터리로 교체한 뒤 삭제
+    previous = None
+    if os.path.exists(target):
+        previous = os.path.join(out_dir, f'.{record_type}.old-{os.getpid()}')
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(target, previous)
+    os.replace(base, target)
+    if previous:
+        shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def main():
+    from archive import HistoryArchive
+    from eventlog import replay_events
+    from services import SharingService, DataAnalyzer
+    from snapshot import load_snapshot
+
+    parser = argparse.ArgumentParser(description="분석용 열 형식 내보내기 (Parquet / .npz)")
+    parser.add_argument('snapshot', help="상태 스냅샷 파일")
+    parser.add_argument('--event-log', default=None, help="스냅샷 이후 재생할 이벤트 로그")
+    parser.add_argument('--type', dest='record_types', action='append', choices=RECORD_TYPES, default=None,
+                        help="내보낼 기록 종류 (여러 번 지정 가능, 기본: 전체)")
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default='auto', help="파일 형식")
+    parser.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_ROWS, help="배치(row group) 행 수")
+    parser.add_argument('--archive-dir', default=None, help="히스토리 아카이브 디렉터리 (오래된 기록 포함)")
+    parser.add_argument('-o', '--output', required=True, help="출력 디렉터리")
+    args = parser.parse_args()
+
+    if args.archive_dir:
+        DataAnalyzer.archive = HistoryArchive(args.archive_dir)
+
+    record_types = args.record_types or list(RECORD_TYPES)
+    for record_type in record_types:
+        # 기록 종류마다 스냅샷을 다시 열어 이전 종류에서 해제한 히스토리를 다시 실체화
+        snapshot = load_snapshot(args.snapshot)
+        SharingService.graph.load(snapshot.users)
+        if args.event_log:
+            replay_events(snapshot.users, args.event_log, snapshot.log_seq)
+        if DataAnalyzer.archive is not None:
+            DataAnalyzer.archive.reconcile(snapshot.users)
+        manifest = export_columnar(snapshot.users, record_type, args.output, args.fmt,
+                                   args.batch_rows, release_history=True)
+        print(f"✓ {record_type}: {manifest['total_rows']}행, "
+              f"{len(manifest['partitions'])}개 분할 ({manifest['format']})")
+
+
+if __name__ == "__main__":
+    main()
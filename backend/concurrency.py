@@ -0,0 +1,128 @@
+"""
+Stroke Prediction System - Concurrency Control
+환자별 동시성 제어 (분할 락)
+
+환자 ID를 고정 개수의 락 중 하나에 대응시키는 분할(striped) 락으로, 같은 환자에 대한 변경은
+직렬화하고 다른 환자에 대한 변경은 병렬로 진행. 환자 수와 관계없이 락 개수는 일정함
+- StripedLock: 스레드용 (백그라운드 작업, 스레드 풀)
+- AsyncStripedLock: 이벤트 루프용 (await를 포함한 요청 처리), 스레드 락과 짝지으면
+  같은 환자를 변경하는 스레드와도 상호 배제
+여러 키를 함께 잠글 때는 분할 번호 순서로 획득해 교착 상태를 방지.
+읽기 쪽은 락 없이 Patient.history_view()의 불변 스냅샷을 사용
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Iterable, List, Optional
+
+
+def _stripe_indexes(keys: Iterable[str], stripes: int) -> List[int]:
+    """키들의 분할 번호 (중복 제거, 오름차순)"""
+    return sorted({hash(key) % stripes for key in keys})
+
+
+async def _acquire_in_thread(lock: threading.Lock):
+    """스레드 풀에서 락 획득 대기 (취소되면 나중에 획득되는 즉시 해제)"""
+    future = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(lambda _: lock.release())
+        raise
+
+
+class StripedLock:
+    """
+    스레드용 분할 락
+    """
+
+    def __init__(self, stripes: int = 64):
+        self.stripes = stripes
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._contended = 0
+
+    def lock_for(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % self.stripes]
+
+    @contextmanager
+    def hold(self, *keys: str):
+        """키(환자 ID 등)들의 락을 분할 번호 순서로 획득"""
+        locks = [self._locks[i] for i in _stripe_indexes(keys, self.stripes)]
+        acquired = []
+        try:
+            for lock in locks:
+                if not lock.acquire(blocking=False):
+                    self._contended += 1
+                    lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def get_stats(self) -> Dict:
+        return {
+            'stripes': self.stripes,
+            'held': sum(lock.locked() for lock in self._locks),
+            'contended': self._contended
+        }
+
+
+class AsyncStripedLock:
+    """
+    이벤트 루프용 분할 락
+    thread_locks: 짝지을 스레드 분할 락 (같은 분할 수), 지정하면 asyncio 락 획득 후 스레드 락도 획득
+    (다른 스레드가 보유 중이면 스레드 풀에서 대기하므로 이벤트 루프는 막히지 않음)
+    """
+
+    def __init__(self, stripes: int = 64, thread_locks: Optional[StripedLock] = None):
+        if thread_locks is not None and thread_locks.stripes != stripes:
+            raise ValueError("thread_locks의 분할 수가 같아야 합니다")
+        self.stripes = stripes
+        self.thread_locks = thread_locks
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+        self._waiting = 0
+        self._contended = 0
+
+    def lock_for(self, key: str) -> asyncio.Lock:
+        return self._locks[hash(key) % self.stripes]
+
+    @asynccontextmanager
+    async def hold(self, *keys: str):
+        """키(환자 ID 등)들의 락을 분할 번호 순서로 획득"""
+        indexes = _stripe_indexes(keys, self.stripes)
+        acquired: List[asyncio.Lock] = []
+        thread_acquired: List[threading.Lock] = []
+        try:
+            for i in indexes:
+                lock = self._locks[i]
+                if lock.locked():
+                    self._contended += 1
+                self._waiting += 1
+                try:
+                    await lock.acquire()
+                finally:
+                    self._waiting -= 1
+                acquired.append(lock)
+            if self.thread_locks is not None:
+                for i in indexes:
+                    lock = self.thread_locks._locks[i]
+                    if not lock.acquire(blocking=False):
+                        self.thread_locks._contended += 1
+                        await _acquire_in_thread(lock)
+                    thread_acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(thread_acquired):
+                lock.release()
+            for lock in reversed(acquired):
+                lock.release()
+
+    def get_stats(self) -> Dict:
+        return {
+            'stripes': self.stripes,
+            'held': sum(lock.locked() for lock in self._locks),
+            'waiting': self._waiting,
+            'contended': self._contended
+        }
@@ -0,0 +1,228 @@
+"""
+Stroke Prediction System - Model Evaluation
+위험도 점수 엔진 오프라인 평가
+
+라벨(stroke)이 있는 CSV로 k-fold 교차 검증을 프로세스 풀에서 병렬 수행하고
+AUC, 보정 곡선(calibration curve), 관리자 임계치 기준 혼동 행렬을 계산
+
+실행:
+    python evaluate.py ../healthcare-dataset-stroke-data.csv --engine heuristic --folds 5
+    python evaluate.py ../healthcare-dataset-stroke-data.csv --engine logistic --json report.json
+"""
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scoring import HeuristicScoringEngine, LogisticScoringEngine, load_dataset
+from services import PolicyService
+
+
+ENGINES = ('heuristic', 'logistic')
+
+# 워커 프로세스 전역 데이터 (initializer에서 한 번만 전달)
+_X: Optional[np.ndarray] = None
+_y: Optional[np.ndarray] = None
+
+
+# ===== 벡터화 지표 계산 =====
+
+def roc_auc(y: np.ndarray, scores: np.ndarray) -> Optional[float]:
+    """
+    순위 기반 AUC (Mann-Whitney U, 동점은 평균 순위)
+    양성 또는 음성이 없으면 None
+    """
+    y = np.asarray(y, dtype=bool)
+    n_pos = int(y.sum())
+    n_neg = len(y) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+
+    order = np.argsort(scores, kind='mergesort')
+    sorted_scores = scores[order]
+    # 동점 구간의 평균 순위 (1부터 시작)
+    _, first, counts = np.unique(sorted_scores, return_index=True, return_counts=True)
+    average_ranks = first + (counts + 1) / 2.0
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.repeat(average_ranks, counts)
+
+    u = ranks[y].sum() - n_pos * (n_pos + 1) / 2.0
+    return float(u / (n_pos * n_neg))
+
+
+def calibration_curve(y: np.ndarray, scores: np.ndarray, bins: int = 10) -> List[Dict]:
+    """
+    보정 곡선: 점수(0-100)를 확률로 보고 구간별 평균 예측값과 실제 발생률 비교
+    """
+    probabilities = np.clip(scores / 100.0, 0.0, 1.0)
+    bin_index = np.minimum((probabilities * bins).astype(np.int64), bins - 1)
+    counts = np.bincount(bin_index, minlength=bins)
+    predicted_sum = np.bincount(bin_index, weights=probabilities, minlength=bins)
+    observed_sum = np.bincount(bin_index, weights=y.astype(np.float64), minlength=bins)
+
+    curve = []
+    for i in np.flatnonzero(counts):
+        curve.append({
+            'bin': f"{i * 100 // bins}-{(i + 1) * 100 // bins}",
+            'count': int(counts[i]),
+            'mean_predicted': round(float(predicted_sum[i] / counts[i]), 4),
+            'observed_rate': round(float(observed_sum[i] / counts[i]), 4)
+        })
+    return curve
+
+
+def confusion_matrix(y: np.ndarray, scores: np.ndarray, threshold: float) -> Dict:
+    """
+    임계치 이상을 양성으로 예측한 혼동 행렬과 파생 지표
+    """
+    y = np.asarray(y, dtype=bool)
+    predicted = scores >= threshold
+    tp = int(np.count_nonzero(predicted & y))
+    fp = int(np.count_nonzero(predicted & ~y))
+    fn = int(np.count_nonzero(~predicted & y))
+    tn = int(np.count_nonzero(~predicted & ~y))
+    return {
+        'threshold': threshold,
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'sensitivity': round(tp / (tp + fn), 4) if tp + fn else None,
+        'specificity': round(tn / (tn + fp), 4) if tn + fp else None,
+        'precision': round(tp / (tp + fp), 4) if tp + fp else None
+    }
+
+
+def compute_metrics(y: np.ndarray, scores: np.ndarray, thresholds: Dict[str, float],
+                    bins: int = 10) -> Dict:
+    """AUC, 보정 곡선, 임계치별 혼동 행렬"""
+    auc = roc_auc(y, scores)
+    return {
+        'count': int(len(y)),
+        'positives': int(np.count_nonzero(y)),
+        'auc': round(auc, 4) if auc is not None else None,
+        'calibration': calibration_curve(y, scores, bins),
+        'confusion': {
+            level: confusion_matrix(y, scores, threshold)
+            for level, threshold in thresholds.items()
+        }
+    }
+
+
+# ===== 교차 검증 =====
+
+def make_folds(n: int, k: int, seed: int = 42) -> List[np.ndarray]:
+    """섞은 인덱스를 k개 폴드로 분할"""
+    permutation = np.random.default_rng(seed).permutation(n)
+    return np.array_split(permutation, k)
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray):
+    global _X, _y
+    _X, _y = X, y
+
+
+def _evaluate_fold(engine_name: str, test_index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    한 폴드 평가: 학습이 필요한 엔진은 나머지 폴드로 학습 후 테스트 폴드 점수 반환
+    """
+    if engine_name == 'logistic':
+        train_mask = np.ones(len(_y), dtype=bool)
+        train_mask[test_index] = False
+        engine = LogisticScoringEngine.train(_X[train_mask], _y[train_mask])
+    else:
+        engine = HeuristicScoringEngine()
+    return test_index, engine.score_batch(_X[test_index])
+
+
+def cross_validate(X: np.ndarray, y: np.ndarray, engine_name: str, folds: int = 5,
+                   thresholds: Optional[Dict[str, float]] = None, workers: Optional[int] = None,
+                   bins: int = 10, seed: int = 42) -> Dict:
+    """
+    k-fold 교차 검증
+    폴드별 지표와 전체 out-of-fold 점수 기준 지표 반환
+    """
+    if engine_name not in ENGINES:
+        raise ValueError(f"알 수 없는 엔진: {engine_name}")
+    if thresholds is None:
+        policy = PolicyService.current()
+        thresholds = {'high': policy.high, 'medium': policy.medium}
+
+    out_of_fold = np.empty(len(y), dtype=np.float64)
+    fold_metrics = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y)) as pool:
+        futures = [pool.submit(_evaluate_fold, engine_name, index)
+                   for index in make_folds(len(y), folds, seed)]
+        for fold, future in enumerate(futures):
+            test_index, scores = future.result()
+            out_of_fold[test_index] = scores
+            metrics = compute_metrics(y[test_index], scores, thresholds, bins)
+            metrics['fold'] = fold
+            fold_metrics.append(metrics)
+
+    aucs = [m['auc'] for m in fold_metrics if m['auc'] is not None]
+    return {
+        'engine': engine_name,
+        'folds': folds,
+        'thresholds': thresholds,
+        'auc_mean': round(float(np.mean(aucs)), 4) if aucs else None,
+        'auc_std': round(float(np.std(aucs)), 4) if aucs else None,
+        'overall': compute_metrics(y, out_of_fold, thresholds, bins),
+        'per_fold': fold_metrics
+    }
+
+
+def print_report(report: Dict):
+    """평가 결과 출력"""
+    overall = report['overall']
+    print("=" * 60)
+    print(f"엔진: {report['engine']} ({report['folds']}-fold 교차 검증)")
+    print("=" * 60)
+    print(f"✓ 데이터: {overall['count']}건 (양성 {overall['positives']}건)")
+    print(f"✓ AUC: {overall['auc']} (폴드 평균 {report['auc_mean']} ± {report['auc_std']})")
+
+    print("\n✓ 보정 곡선:")
+    for point in overall['calibration']:
+        print(f"  - {point['bin']:>7}점: {point['count']:>8}건, "
+              f"예측 {point['mean_predicted']:.4f} / 실제 {point['observed_rate']:.4f}")
+
+    print("\n✓ 관리자 임계치 기준 혼동 행렬:")
+    for level, matrix in overall['confusion'].items():
+        print(f"  - {level} (>= {matrix['threshold']}): "
+              f"TP {matrix['tp']}, FP {matrix['fp']}, FN {matrix['fn']}, TN {matrix['tn']}")
+        print(f"    민감도 {matrix['sensitivity']}, 특이도 {matrix['specificity']}, "
+              f"정밀도 {matrix['precision']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="위험도 점수 엔진 교차 검증 평가")
+    parser.add_argument('dataset', help="라벨(stroke)이 있는 CSV 파일")
+    parser.add_argument('--engine', choices=ENGINES, default='heuristic', help="평가할 점수 엔진")
+    parser.add_argument('--folds', type=int, default=5, help="폴드 수")
+    parser.add_argument('--workers', type=int, default=None, help="프로세스 수 (기본: CPU 수)")
+    parser.add_argument('--bins', type=int, default=10, help="보정 곡선 구간 수")
+    parser.add_argument('--high', type=float, default=None, help="High 임계치 (기본: 관리자 정책)")
+    parser.add_argument('--medium', type=float, default=None, help="Medium 임계치 (기본: 관리자 정책)")
+    parser.add_argument('--seed', type=int, default=42, help="폴드 분할 시드")
+    parser.add_argument('--json', dest='json_path', default=None, help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    policy = PolicyService.current()
+    thresholds = {
+        'high': args.high if args.high is not None else policy.high,
+        'medium': args.medium if args.medium is not None else policy.medium
+    }
+
+    X, y = load_dataset(args.dataset)
+    report = cross_validate(X, y, args.engine, args.folds, thresholds,
+                            args.workers, args.bins, args.seed)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 결과 저장: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""
+Stroke Prediction System - Event Log
+추가 전용(append-only) 이벤트 로그 및 재생
+
+API의 모든 상태 변경(로그인, 건강 데이터 제출, FAST 검사, 공유/해제, 메시지/읽음, 진단/처방 메모, 임계치 변경)을
+길이 접두 바이너리 레코드로 기록하고, 재시작 시 로그를 재생해 상태를 복원.
+여러 요청의 레코드를 한 번의 write + fsync로 묶는 그룹 커밋으로 처리량 확보
+
+파일 구조 (little-endian):
+    헤더: 매직(8) | 버전(u16)
+    레코드: 길이(u32) | CRC32(u32) | 페이로드(JSON, UTF-8)
+    페이로드: {"seq": 순번, "type": 이벤트 종류, "ts": 기록 시각, "data": {...}}
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import (
+    User, Patient, Caregiver, Doctor, Administrator,
+    HealthData, RiskAssessment, FASTTest,
+    Message, Alert, RiskLevel
+)
+from services import RiskCalculator, SharingService, MessageService, PolicyService
+
+
+MAGIC = b'SPWAL\x00\x00\x00'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sH')
+_FRAME = struct.Struct('<II')
+
+
+class EventLogError(Exception):
+    """이벤트 로그 형식 오류"""
+    pass
+
+
+# ===== 이벤트 직렬화 =====
+
+def health_data_event(patient: Patient, health_data: HealthData, assessment: RiskAssessment) -> Dict:
+    """건강 데이터 제출 이벤트 (평가 결과 포함, 재생 시 재계산하지 않음)"""
+    contributions = array('f')
+    contributions.frombytes(assessment.contributions)
+    return {
+        'patient_id': patient.user_id,
+        'health_data': health_data.to_dict(),
+        'assessment': {
+            'assessment_id': assessment.assessment_id,
+            'timestamp': assessment.timestamp.isoformat(),
+            'score': assessment.score,
+            'risk_level': assessment.risk_level.value,
+            'risk_factor_mask': assessment.risk_factor_mask,
+            'policy_version': assessment.policy_version,
+            'contributions': contributions.tolist(),
+            'contribution_unit': assessment.contribution_unit
+        }
+    }
+
+
+def fast_test_event(patient: Patient, fast_test: FASTTest, alerts: List[Alert]) -> Dict:
+    """FAST 검사 이벤트 (발송된 응급 알림 포함)"""
+    return {
+        'patient_id': patient.user_id,
+        'test': fast_test.get_result(),
+        'alerts': [alert.to_dict() for alert in alerts]
+    }
+
+
+def share_event(patient: Patient, recipient: User) -> Dict:
+    """데이터 공유 이벤트"""
+    return {'patient_id': patient.user_id, 'recipient_id': recipient.user_id, 'role': recipient.role.value}
+
+
+def unshare_event(patient: Patient, recipient: User) -> Dict:
+    """데이터 공유 해제 이벤트"""
+    return {'patient_id': patient.user_id, 'recipient_id': recipient.user_id}
+
+
+def message_event(message: Message, encouragement: bool) -> Dict:
+    """메시지 전송 이벤트"""
+    return {'message': message.to_dict(), 'encouragement': encouragement}
+
+
+def messages_read_event(user: User, message_ids: List[str]) -> Dict:
+    """메시지 읽음 처리 이벤트"""
+    return {'user_id': user.user_id, 'message_ids': message_ids}
+
+
+def doctor_note_event(doctor: Doctor, kind: str, patient_id: str, entry: Dict) -> Dict:
+    """의사 진단/처방 메모 추가 이벤트"""
+    return {'doctor_id': doctor.user_id, 'kind': kind, 'patient_id': patient_id, 'entry': entry}
+
+
+def login_event(user: User) -> Dict:
+    """로그인 이벤트"""
+    return {'user_id': user.user_id, 'last_login': user.last_login.isoformat()}
+
+
+def risk_threshold_event(admin: Administrator, level: str, threshold: int) -> Dict:
+    """위험 임계치 변경 이벤트 (변경으로 게시된 정책 포함)"""
+    return {'admin_id': admin.user_id, 'level': level, 'threshold': threshold,
+            'policy': PolicyService.current().to_dict()}
+
+
+# ===== 로그 기록 =====
+
+class EventLog:
+    """
+    추가 전용 이벤트 로그 (그룹 커밋)
+    append()는 레코드를 대기열에 넣고 순번을 반환하며, 기록 스레드가 대기 중인 레코드를
+    모아 한 번에 쓰고 fsync. wait_durable()로 해당 순번이 디스크에 기록될 때까지 대기
+    기록(write/fsync)이 실패하면 로그는 실패 상태가 되어 대기 중/이후의 append와 대기가
+    EventLogError를 발생시킴 (기록되지 않은 변경을 성공으로 응답하지 않도록)
+    """
+
+    def __init__(self, path: str, commit_interval: float = 0.002, max_batch: int = 4096):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+
+        # 기존 로그 검사: 마지막 순번 확인, 잘린 꼬리 레코드 제거
+        last_seq, valid_end = 0, _HEADER.size
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            for seq, _, _, _, end in _scan(path):
+                last_seq, valid_end = seq, end
+            with open(path, 'r+b') as f:
+                f.truncate(valid_end)
+        else:
+            with open(path, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._file = open(path, 'ab')
+        self._last_seq = last_seq
+        self._durable_seq = last_seq
+        self._pending: List[bytes] = []
+        self._pending_seq = last_seq
+        self._closed = False
+        self._error: Optional[EventLogError] = None
+        # 비동기 대기: (순번, 등록 번호, Future, 이벤트 루프) 최소 힙, 기록 스레드가 완료 처리
+        self._waiters: List[Tuple[int, int, asyncio.Future, asyncio.AbstractEventLoop]] = []
+        self._waiter_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._has_pending = threading.Condition(self._lock)
+        self._durable = threading.Condition(self._lock)
+        self.stats = {'records': 0, 'commits': 0, 'bytes': 0}
+        self._writer = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._writer.start()
+
+    @property
+    def last_seq(self) -> int:
+        """마지막으로 부여된 순번"""
+        return self._last_seq
+
+    @property
+    def durable_seq(self) -> int:
+        """디스크에 기록 완료된 마지막 순번"""
+        return self._durable_seq
+
+    @property
+    def error(self) -> Optional[EventLogError]:
+        """기록 실패 원인 (정상이면 None)"""
+        return self._error
+
+    def append(self, event_type: str, data: Dict) -> int:
+        """이벤트 추가 (대기열), 순번 반환"""
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            if self._closed:
+                raise EventLogError("닫힌 이벤트 로그입니다")
+            self._last_seq += 1
+            seq = self._last_seq
+            payload = json.dumps(
+                {'seq': seq, 'type': event_type, 'ts': datetime.now().isoformat(), 'data': data},
+                ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+            self._pending.append(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._pending_seq = seq
+            self._has_pending.notify()
+            return seq
+
+    def _check_durable(self, seq: int) -> bool:
+        """순번 seq의 기록 완료 여부 (기록 실패로 기록되지 못했으면 EventLogError, 호출자가 락 보유)"""
+        if self._durable_seq >= seq:
+            return True
+        if self._error is not None:
+            raise self._error
+        return self._closed
+
+    def wait_durable(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """순번 seq까지 fsync될 때까지 대기 (기록 실패 시 EventLogError)"""
+        with self._lock:
+            self._durable.wait_for(
+                lambda: self._durable_seq >= seq or self._closed or self._error is not None, timeout
+            )
+            return self._check_durable(seq)
+
+    async def wait_durable_async(self, seq: int):
+        """
+        이벤트 루프를 막지 않고 fsync 대기 (기록 실패 시 EventLogError)
+        대기마다 스레드를 쓰지 않고, 기록 스레드가 커밋 후 해당 Future를 완료
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._check_durable(seq):
+                return
+            future = loop.create_future()
+            heapq.heappush(self._waiters, (seq, next(self._waiter_ids), future, loop))
+        await future
+
+    def _wake_waiters(self):
+        """기록 완료(또는 실패/종료)된 비동기 대기 완료 (호출자가 락 보유)"""
+        finished = self._closed or self._error is not None
+        while self._waiters and (finished or self._waiters[0][0] <= self._durable_seq):
+            seq, _, future, loop = heapq.heappop(self._waiters)
+            error = self._error if seq > self._durable_seq else None
+            try:
+                loop.call_soon_threadsafe(_resolve_waiter, future, error)
+            except RuntimeError:
+                pass  # 이벤트 루프가 이미 닫힘
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._has_pending.wait_for(lambda: self._pending or self._closed)
+                if not self._pending and self._closed:
+                    return
+            # 짧게 기다려 동시 요청을 한 커밋으로 묶음
+            if self.commit_interval:
+                threading.Event().wait(self.commit_interval)
+            with self._lock:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:len(batch)]
+                batch_seq = self._pending_seq - len(self._pending)
+            data = b''.join(batch)
+            try:
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as e:
+                # 실패 상태로 전환하고 모든 대기자를 깨움 (이후 기록은 모두 거부)
+                with self._lock:
+                    self._error = EventLogError(f"이벤트 로그 기록에 실패했습니다: {e}")
+                    self._error.__cause__ = e
+                    self._pending.clear()
+                    self._durable.notify_all()
+                    self._wake_waiters()
+                return
+            with self._lock:
+                self._durable_seq = batch_seq
+                self.stats['records'] += len(batch)
+                self.stats['commits'] += 1
+                self.stats['bytes'] += len(data)
+                self._durable.notify_all()
+                self._wake_waiters()
+
+    def close(self):
+        """대기 중인 레코드를 모두 기록하고 닫기"""
+        with self._lock:
+            self._closed = True
+            self._has_pending.notify()
+        self._writer.join()
+        self._file.close()
+        with self._lock:
+            self._durable.notify_all()
+            self._wake_waiters()
+
+
+def _resolve_waiter(future: asyncio.Future, error: Optional[BaseException]):
+    """비동기 대기 Future 완료 (이벤트 루프 스레드에서 실행, 취소된 대기는 무시)"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(None)
+
+
+# ===== 로그 읽기 및 재생 =====
+
+def _scan(path: str) -> Iterator[Tuple[int, str, str, Dict, int]]:
+    """
+    로그 레코드 순회: (순번, 종류, 기록 시각, 데이터, 레코드 끝 오프셋)
+    길이/CRC가 맞지 않는 꼬리 레코드(기록 중 중단)에서 멈춤
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEADER.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version = _HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise EventLogError(f"이벤트 로그 파일이 아닙니다: {path}")
+            if version != FORMAT_VERSION:
+                raise EventLogError(f"지원하지 않는 이벤트 로그 버전입니다: {version}")
+            offset = _HEADER.size
+            while offset + _FRAME.size <= size:
+                length, crc = _FRAME.unpack_from(mm, offset)
+                end = offset + _FRAME.size + length
+                if end > size:
+                    return
+                payload = mm[offset + _FRAME.size:end]
+                if zlib.crc32(payload) != crc:
+                    return
+                event = json.loads(payload)
+                yield event['seq'], event['type'], event['ts'], event['data'], end
+                offset = end
+
+
+def read_events(path: str, after_seq: int = 0) -> Iterator[Tuple[int, str, Dict]]:
+    """순번 after_seq 이후 이벤트 순회: (순번, 종류, 데이터)"""
+    if not os.path.exists(path):
+        return
+    for seq, event_type, _, data, _ in _scan(path):
+        if seq > after_seq:
+            yield seq, event_type, data
+
+
+class EventReplayer:
+    """
+    이벤트 재생 엔진
+    로그 이벤트를 사용자 객체(Patient/Caregiver/Doctor/Administrator)에 적용
+    """
+
+    def __init__(self, users: Iterable[User]):
+        self.users_by_id: Dict[str, User] = {user.user_id: user for user in users}
+        self.applied = 0
+        self.skipped = 0
+        self.last_seq = 0
+        self._handlers = {
+            'login': self._apply_login,
+            'health_data': self._apply_health_data,
+            'fast_test': self._apply_fast_test,
+            'share': self._apply_share,
+            'unshare': self._apply_unshare,
+            'message': self._apply_message,
+            'messages_read': self._apply_messages_read,
+            'doctor_note': self._apply_doctor_note,
+            'risk_threshold': self._apply_risk_threshold
+        }
+
+    def replay(self, path: str, after_seq: int = 0) -> Dict:
+        """로그 파일 재생, 통계 반환"""
+        self.last_seq = after_seq
+        for seq, event_type, data in read_events(path, after_seq):
+            handler = self._handlers.get(event_type)
+            if handler is None or not handler(data):
+                self.skipped += 1
+            else:
+                self.applied += 1
+            self.last_seq = seq
+        return {'applied': self.applied, 'skipped': self.skipped, 'last_seq': self.last_seq}
+
+    def _apply_login(self, data: Dict) -> bool:
+        user = self.users_by_id.get(data['user_id'])
+        if not user:
+            return False
+        user.last_login = datetime.fromisoformat(data['last_login'])
+        return True
+
+    def _apply_health_data(self, data: Dict) -> bool:
+        patient = self.users_by_id.get(data['patient_id'])
+        if not isinstance(patient, Patient):
+            return False
+        record = data['health_data']
+        health_data = HealthData(patient.user_id, {**record, 'Residence_type': record['residence_type']})
+        health_data.health_data_id = record['health_data_id']
+        health_data.timestamp = datetime.fromisoformat(record['timestamp'])
+        patient.add_health_data(health_data)
+
+        result = data['assessment']
+        risk_level = RiskLevel(result['risk_level'])
+        assessment = RiskAssessment(patient.user_id, health_data, result['score'], risk_level)
+        assessment.assessment_id = result['assessment_id']
+        assessment.timestamp = datetime.fromisoformat(result['timestamp'])
+        assessment.risk_factor_mask = result['risk_factor_mask']
+        assessment.policy_version = result['policy_version']
+        assessment.set_recommendations(
+            RiskCalculator.lookup_recommendations(risk_level, result['risk_factor_mask'])
+        )
+        if result['contributions']:
+            assessment.set_contributions(result['contributions'], result['contribution_unit'])
+        patient.add_risk_assessment(assessment)
+        return True
+
+    def _apply_fast_test(self, data: Dict) -> bool:
+        patient = self.users_by_id.get(data['patient_id'])
+        if not isinstance(patient, Patient):
+            return False
+        result = data['test']
+        fast_test = FASTTest(patient.user_id)
+        fast_test.perform_test(result['face_asymmetry'], result['arm_weakness'], result['speech_difficulty'])
+        fast_test.test_id = result['test_id']
+        fast_test.timestamp = datetime.fromisoformat(result['timestamp'])
+        patient.perform_fast_test(fast_test)
+
+        for alert_data in data['alerts']:
+            recipient = self.users_by_id.get(alert_data['recipient_id'])
+            if isinstance(recipient, Caregiver):
+                self._upsert_alert(recipient, Alert.from_dict(alert_data))
+        return True
+
+    @staticmethod
+    def _upsert_alert(recipient: Caregiver, alert: Alert):
+        """병합된 경고는 기존 경고를 교체, 새 경고는 추가"""
+        for i in range(len(recipient.alerts_received) - 1, -1, -1):
+            existing = recipient.alerts_received[i]
+            if existing.timestamp < alert.timestamp:
+                break
+            if existing.alert_id == alert.alert_id:
+                recipient.alerts_received[i] = alert
+                return
+        recipient.receive_alert(alert)
+
+    def _apply_share(self, data: Dict) -> bool:
+        patient = self.users_by_id.get(data['patient_id'])
+        recipient = self.users_by_id.get(data['recipient_id'])
+        if not isinstance(patient, Patient):
+            return False
+        if isinstance(recipient, Caregiver):
+            return SharingService.share_with_caregiver(patient, recipient)
+        if isinstance(recipient, Doctor):
+            return SharingService.share_with_doctor(patient, recipient)
+        return False
+
+    def _apply_unshare(self, data: Dict) -> bool:
+        patient = self.users_by_id.get(data['patient_id'])
+        recipient = self.users_by_id.get(data['recipient_id'])
+        if not isinstance(patient, Patient) or recipient is None:
+            return False
+        return SharingService.revoke(patient, recipient)
+
+    def _apply_message(self, data: Dict) -> bool:
+        message = Message.from_dict(data['message'])
+        if data['encouragement']:
+            sender = self.users_by_id.get(message.from_user_id)
+            patient = self.users_by_id.get(message.to_user_id)
+            if not isinstance(sender, Caregiver) or not isinstance(patient, Patient):
+                return False
+            sender.send_encouragement_message(patient.user_id, message)
+            patient.messages_received.append(message)
+        MessageService.store.add(message)
+        return True
+
+    def _apply_messages_read(self, data: Dict) -> bool:
+        for message_id in data['message_ids']:
+            MessageService.store.mark_read(data['user_id'], message_id)
+        return True
+
+    def _apply_doctor_note(self, data: Dict) -> bool:
+        doctor = self.users_by_id.get(data['doctor_id'])
+        if not isinstance(doctor, Doctor):
+            return False
+        notes = doctor.consultation_notes if data['kind'] == 'consultation_note' else doctor.prescriptions
+        notes.setdefault(data['patient_id'], []).append(data['entry'])
+        return True
+
+    def _apply_risk_threshold(self, data: Dict) -> bool:
+        admin = self.users_by_id.get(data['admin_id'])
+        if not isinstance(admin, Administrator):
+            return False
+        if not admin.set_risk_threshold(data['level'], data['threshold']):
+            return False
+        if 'policy' in data:
+            PolicyService.restore(data['policy'])
+        return True
+
+
+def replay_events(users: Iterable[User], path: str, after_seq: int = 0) -> Dict:
+    """사용자 목록에 로그 이벤트 재생 (after_seq: 스냅샷에 반영된 마지막 순번)"""
+    return EventReplayer(users).replay(path, after_seq)
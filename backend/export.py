@@ -0,0 +1,243 @@
+"""
+Stroke Prediction System - Bulk Export
+건강 데이터 / 위험도 평가 / FAST 검사 일괄 내보내기 (NDJSON, CSV)
+
+환자를 한 명씩, 기록을 한 건씩 제너레이터로 변환해 일정 크기 청크로 묶어 내보내므로
+전체 데이터 크기와 관계없이 메모리 사용량이 일정함.
+API(StreamingResponse)와 스냅샷/이벤트 로그에서 읽는 CLI가 같은 제너레이터를 사용
+
+실행:
+    python export.py state.snap --event-log events.log --type assessment --format csv -o assessments.csv
+    python export.py state.snap --type health_data --doctor D001 --start 2025-01-01 --risk-level High
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from models import Patient, Doctor, RiskLevel, RISK_FACTORS
+from services import DataAnalyzer
+
+
+# 내보내기 대상 / 형식
+RECORD_TYPES = ('health_data', 'assessment', 'fast_test')
+FORMATS = ('ndjson', 'csv')
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+# 청크 크기 (바이트, 대략)
+CHUNK_SIZE = 64 * 1024
+
+# CSV 열 (NDJSON도 같은 평면 레코드 사용)
+COLUMNS = {
+    'health_data': (
+        'health_data_id', 'patient_id', 'timestamp', 'age', 'gender', 'hypertension',
+        'heart_disease', 'ever_married', 'work_type', 'residence_type',
+        'avg_glucose_level', 'bmi', 'smoking_status'
+    ),
+    'assessment': (
+        'assessment_id', 'patient_id', 'health_data_id', 'timestamp', 'score', 'risk_level',
+        'risk_factor_mask', 'policy_version', 'contribution_unit'
+    ) + tuple(f'contribution_{factor}' for factor in RISK_FACTORS),
+    'fast_test': (
+        'test_id', 'patient_id', 'timestamp', 'face_asymmetry', 'arm_weakness',
+        'speech_difficulty', 'is_emergency'
+    )
+}
+
+
+def _health_data_row(record) -> Dict:
+    return record.to_dict()
+
+
+def _assessment_row(assessment) -> Dict:
+    row = {
+        'assessment_id': assessment.assessment_id,
+        'patient_id': assessment.patient_id,
+        'health_data_id': assessment.health_data_id,
+        'timestamp': assessment.timestamp.isoformat(),
+        'score': assessment.score,
+        'risk_level': assessment.risk_level.value,
+        'risk_factor_mask': assessment.risk_factor_mask,
+        'policy_version': assessment.policy_version,
+        'contribution_unit': assessment.contribution_unit
+    }
+    contributions = assessment.get_contributions()
+    for factor in RISK_FACTORS:
+        row[f'contribution_{factor}'] = contributions.get(factor)
+    return row
+
+
+def _fast_test_row(test) -> Dict:
+    row = test.get_result()
+    del row['recommendation']
+    return row
+
+
+# 기록 종류 -> (환자 기록 목록 속성, 평면 레코드 변환)
+_SOURCES: Dict[str, tuple] = {
+    'health_data': ('health_records', _health_data_row),
+    'assessment': ('risk_assessments', _assessment_row),
+    'fast_test': ('fast_tests', _fast_test_row)
+}
+
+
+def local_time(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    조회 범위 시각을 기록 시각과 같은 형식(시간대 없는 현지 시각)으로 변환
+    시간대가 있는 값(예: 2025-01-01T00:00:00Z)은 현지 시각으로 바꾼 뒤 시간대 정보를 제거
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def parse_time(text: str) -> datetime:
+    """ISO 8601 시각 (시간대가 있으면 현지 시각으로 변환)"""
+    return local_time(datetime.fromisoformat(text))
+
+
+def select_patients(patients: Iterable, risk_levels: Optional[Iterable[RiskLevel]] = None) -> Iterator[Patient]:
+    """환자만, risk_levels가 있으면 최신 위험도가 해당하는 환자만"""
+    levels = set(risk_levels) if risk_levels else None
+    for patient in patients:
+        if not isinstance(patient, Patient):
+            continue
+        if levels is not None and patient.get_latest_risk_level() not in levels:
+            continue
+        yield patient
+
+
+def iter_rows(patients: Iterable[Patient], record_type: str, start: Optional[datetime] = None,
+              end: Optional[datetime] = None, release_history: bool = False) -> Iterator[Dict]:
+    """
+    환자별 기록을 평면 레코드로 순회 (start <= 기록 시각 <= end, 히스토리 아카이브 포함)
+    release_history: 환자 하나를 내보낸 뒤 히스토리 참조 해제 (CLI에서 일회성 스냅샷 객체 사용 시)
+    """
+    attribute, to_row = _SOURCES[record_type]
+    for patient in patients:
+        for record in DataAnalyzer.full_history(patient, attribute, start, end):
+            yield to_row(record)
+        if release_history:
+            patient.health_records = []
+            patient.risk_assessments = []
+            patient.fast_tests = []
+
+
+def ndjson_lines(rows: Iterable[Dict]) -> Iterator[str]:
+    """한 줄에 JSON 객체 하나"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows: Iterable[Dict], columns: Iterable[str]) -> Iterator[str]:
+    """헤더 + CSV 행 (같은 버퍼를 재사용)"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def chunked(lines: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """줄들을 약 chunk_size 바이트 단위 UTF-8 청크로 묶음"""
+    pending: List[str] = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def export_stream(patients: Iterable, record_type: str, fmt: str = 'ndjson',
+                  start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  risk_levels: Optional[Iterable[RiskLevel]] = None,
+                  release_history: bool = False) -> Iterator[bytes]:
+    """
+    기록 내보내기 청크 스트림
+    risk_levels는 환자의 최신 위험도 기준 필터
+    """
+    if record_type not in RECORD_TYPES:
+        raise ValueError(f"지원하지 않는 기록 종류입니다: {record_type}")
+    if fmt not in FORMATS:
+        raise ValueError(f"지원하지 않는 형식입니다: {fmt}")
+
+    rows = iter_rows(select_patients(patients, risk_levels), record_type, start, end, release_history)
+    lines = ndjson_lines(rows) if fmt == 'ndjson' else csv_lines(rows, COLUMNS[record_type])
+    return chunked(lines)
+
+
+def doctor_patients(doctor: Doctor, users_by_id: Dict, patient_ids: Callable[[Doctor], Iterable[str]]) -> List[Patient]:
+    """의사에게 공유된 환자 목록"""
+    patients = (users_by_id.get(patient_id) for patient_id in patient_ids(doctor))
+    return [patient for patient in patients if isinstance(patient, Patient)]
+
+
+# ===== CLI =====
+
+def main():
+    from archive import HistoryArchive
+    from eventlog import replay_events
+    from services import SharingService
+    from snapshot import load_snapshot
+
+    parser = argparse.ArgumentParser(description="건강 데이터 / 위험도 평가 / FAST 검사 일괄 내보내기")
+    parser.add_argument('snapshot', help="상태 스냅샷 파일")
+    parser.add_argument('--event-log', default=None, help="스냅샷 이후 재생할 이벤트 로그")
+    parser.add_argument('--type', dest='record_type', choices=RECORD_TYPES, default='assessment',
+                        help="내보낼 기록 종류")
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default='ndjson', help="출력 형식")
+    parser.add_argument('--doctor', default=None, help="이 의사에게 공유된 환자만 (의사 user_id)")
+    parser.add_argument('--start', type=parse_time, default=None, help="시작 시각 (ISO 8601)")
+    parser.add_argument('--end', type=parse_time, default=None, help="종료 시각 (ISO 8601)")
+    parser.add_argument('--risk-level', action='append', choices=[level.value for level in RiskLevel],
+                        default=None, help="최신 위험도 필터 (여러 번 지정 가능)")
+    parser.add_argument('--archive-dir', default=None, help="히스토리 아카이브 디렉터리 (오래된 기록 포함)")
+    parser.add_argument('-o', '--output', default=None, help="출력 파일 (기본: 표준 출력)")
+    args = parser.parse_args()
+
+    snapshot = load_snapshot(args.snapshot)
+    users = snapshot.users
+    SharingService.graph.load(users)
+    if args.event_log:
+        replay_events(users, args.event_log, snapshot.log_seq)
+    if args.archive_dir:
+        DataAnalyzer.archive = HistoryArchive(args.archive_dir)
+        DataAnalyzer.archive.reconcile(users)
+
+    patients: Iterable = users
+    if args.doctor:
+        users_by_id = {user.user_id: user for user in users}
+        doctor = users_by_id.get(args.doctor)
+        if not isinstance(doctor, Doctor):
+            parser.error(f"의사를 찾을 수 없습니다: {args.doctor}")
+        patients = doctor_patients(doctor, users_by_id, SharingService.get_patient_ids)
+
+    risk_levels = [RiskLevel(level) for level in args.risk_level] if args.risk_level else None
+    chunks = export_stream(patients, args.record_type, args.fmt, args.start, args.end,
+                           risk_levels, release_history=True)
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Stroke Prediction System - Idempotent Submissions
+재시도 요청 중복 처리 방지
+
+클라이언트가 Idempotency-Key 헤더와 함께 보낸 요청의 응답을 TTL 동안 보관하고,
+같은 키로 재시도하면 점수 계산/알림 전송을 다시 수행하지 않고 저장된 응답을 반환.
+처리 중인 요청과 같은 키의 재시도는 첫 요청이 끝날 때까지 기다렸다가 같은 응답을 받음
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+# 헤더 값 최대 길이
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflictError(Exception):
+    """같은 키를 다른 요청 본문에 재사용한 경우"""
+    pass
+
+
+def request_fingerprint(body: Dict) -> str:
+    """요청 본문 지문 (키 재사용 검증용)"""
+    canonical = json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'future', 'expires_at')
+
+    def __init__(self, fingerprint: str, future: asyncio.Future, expires_at: float):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """
+    멱등성 키 -> 응답 저장소 (TTL, 최대 항목 수 제한)
+    키는 호출자가 사용자/엔드포인트 범위를 포함해 구성 (예: (user_id, 'health-data', 헤더 값))
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_entries: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # 완료된 항목, 완료 시각 순서 (앞쪽이 먼저 만료)
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # 처리 중인 항목 (완료되면 _entries로 이동, 만료/개수 제한 대상이 아님)
+        self._pending: Dict[Hashable, _Entry] = {}
+        self._replays = 0
+        self._executions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._pending)
+
+    async def execute(self, key: Optional[Hashable], fingerprint: str,
+                      operation: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        operation을 키당 한 번만 실행하고 (응답, 재사용 여부) 반환
+        key가 None이면 항상 실행, 실패한 실행은 저장하지 않아 재시도 시 다시 실행
+        """
+        if key is None:
+            return await operation(), False
+
+        while True:
+            self._evict()
+            entry = self._pending.get(key) or self._entries.get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key was reused with a different request body")
+            if not entry.future.done():
+                # 처리 중인 첫 요청 완료 대기 (실패하면 항목이 제거되어 다시 실행)
+                await asyncio.wait([entry.future])
+                continue
+            self._replays += 1
+            return entry.future.result(), True
+
+        future = asyncio.get_running_loop().create_future()
+        entry = _Entry(fingerprint, future, time.monotonic() + self.ttl_seconds)
+        self._pending[key] = entry
+        try:
+            result = await operation()
+        except BaseException as e:
+            if self._pending.get(key) is entry:
+                del self._pending[key]
+            future.set_exception(e)
+            future.exception()  # 대기자가 없어도 미확인 예외 경고를 남기지 않음
+            raise
+
+        self._executions += 1
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        if self._pending.get(key) is entry:
+            del self._pending[key]
+            self._entries[key] = entry
+        future.set_result(result)
+        return result, False
+
+    def _evict(self):
+        """만료된 항목과 최대 개수를 넘는 오래된 완료 항목 제거 (처리 중인 항목은 대상 아님)"""
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def get_stats(self) -> Dict:
+        """저장 항목 수, 처리 중인 요청 수, 실행/재사용 횟수"""
+        return {
+            'entries': len(self._entries),
+            'in_flight': len(self._pending),
+            'executions': self._executions,
+            'replays': self._replays,
+            'ttl_seconds': self.ttl_seconds
+        }
@@ -0,0 +1,207 @@
+"""
+Stroke Prediction System - ID Generator
+엔티티 ID 생성기
+
+64비트 snowflake 방식 정수 ID: [41비트 밀리초 타임스탬프 | 10비트 워커 ID | 12비트 순번]
+- 같은 워커 안에서는 단조 증가 (시계가 되돌아가도 마지막 시각을 계속 사용)
+- 워커 ID가 다르면 여러 프로세스/서버에서 동시에 생성해도 충돌 없음
+  여러 서버에서 실행하면 서버마다 겹치지 않는 STROKE_WORKER_ID를 반드시 지정해야 함.
+  미설정 시 같은 서버의 프로세스끼리는 임대 디렉터리(STROKE_WORKER_ID_DIR, 기본: 임시 디렉터리)의
+  워커 ID별 파일 락으로 사용 중이지 않은 ID를 임대 (프로세스가 끝나면 락이 풀려 재사용).
+  fork된 자식 프로세스는 부모와 겹치지 않도록 첫 ID 생성 시 새로 임대
+- API/저장용 문자열은 '접두사_' + 고정 길이 11자리 base62 (문자열 정렬 = 생성 순서)
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: 파일 락 임대 불가
+    fcntl = None
+
+
+# 사용자 지정 기준 시각 (2024-01-01 00:00:00 UTC, 밀리초)
+EPOCH_MS = 1704067200000
+
+TIMESTAMP_BITS = 41
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+WORKER_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = SEQUENCE_BITS + WORKER_BITS
+
+# base62 문자 (ASCII 순서이므로 고정 길이 문자열의 정렬 = 정수 정렬)
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ENCODED_LENGTH = 11  # 62^11 > 2^64
+_DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+
+
+class IdGenerator:
+    """
+    snowflake ID 생성기 (스레드 안전)
+    """
+
+    def __init__(self, worker_id: int):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id는 0-{MAX_WORKER_ID} 범위여야 합니다: {worker_id}")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self) -> int:
+        """다음 ID"""
+        with self._lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # 같은 밀리초 또는 시계 역행: 마지막 시각 기준으로 순번 증가,
+                # 순번이 넘치면 논리 시각을 1ms 앞당김 (대기 없이 단조 증가 유지)
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return ((self._last_ms << TIMESTAMP_SHIFT)
+                    | (self.worker_id << WORKER_SHIFT)
+                    | self._sequence)
+
+
+def encode(value: int) -> str:
+    """정수 ID -> 고정 길이 base62 문자열"""
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, digit = divmod(value, 62)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(text: str) -> int:
+    """base62 문자열 -> 정수 ID"""
+    value = 0
+    for char in text:
+        value = value * 62 + _DIGITS[char]
+    return value
+
+
+def parse_id(entity_id: str) -> Optional[int]:
+    """
+    '접두사_base62' 형식 ID의 정수 값 (이전 형식 ID이면 None)
+    """
+    _, _, encoded = entity_id.rpartition('_')
+    if len(encoded) != ENCODED_LENGTH or any(char not in _DIGITS for char in encoded):
+        return None
+    return decode(encoded)
+
+
+def describe(value: int) -> Tuple[float, int, int]:
+    """정수 ID -> (생성 시각 epoch 초, 워커 ID, 순번)"""
+    return (
+        ((value >> TIMESTAMP_SHIFT) + EPOCH_MS) / 1000.0,
+        (value >> WORKER_SHIFT) & MAX_WORKER_ID,
+        value & MAX_SEQUENCE
+    )
+
+
+class WorkerIdError(RuntimeError):
+    """사용 가능한 워커 ID 없음"""
+    pass
+
+
+def lease_worker_id(directory: Optional[str] = None) -> Tuple[int, int]:
+    """
+    같은 서버의 다른 프로세스가 쓰지 않는 워커 ID 임대, (워커 ID, 락 파일 디스크립터) 반환
+    워커 ID별 락 파일에 배타적 파일 락을 걸고, 디스크립터를 닫거나 프로세스가 끝나면 해제됨.
+    탐색 시작 위치는 호스트 이름 + 프로세스 ID 해시 (모든 ID가 사용 중이면 WorkerIdError)
+    """
+    directory = directory or os.path.join(tempfile.gettempdir(), 'stroke-worker-ids')
+    os.makedirs(directory, exist_ok=True)
+    start = zlib.crc32(f"{socket.gethostname()}:{os.getpid()}".encode()) & MAX_WORKER_ID
+    for offset in range(MAX_WORKER_ID + 1):
+        worker_id = (start + offset) & MAX_WORKER_ID
+        fd = os.open(os.path.join(directory, f'worker-{worker_id:04d}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        return worker_id, fd
+    raise WorkerIdError(f"사용 가능한 워커 ID가 없습니다 ({directory})")
+
+
+_generator: Optional[IdGenerator] = None
+_generator_lock = threading.Lock()
+_lease_fd: Optional[int] = None
+_forked = False  # fork된 자식 프로세스 (부모에게 지정된 워커 ID를 물려받지 않음)
+
+
+def _default_generator() -> IdGenerator:
+    """
+    환경 설정에 따른 전역 생성기: STROKE_WORKER_ID가 있으면 그 값 (fork된 자식 프로세스 제외),
+    없으면 임대 (파일 락을 쓸 수 없는 환경이면 프로세스 ID에서 유도, 단일 프로세스 전용)
+    """
+    global _lease_fd
+    configured = os.environ.get("STROKE_WORKER_ID")
+    if configured is not None and not _forked:
+        return IdGenerator(int(configured))
+    if fcntl is None:
+        return IdGenerator(os.getpid() & MAX_WORKER_ID)
+    worker_id, _lease_fd = lease_worker_id(os.environ.get("STROKE_WORKER_ID_DIR"))
+    return IdGenerator(worker_id)
+
+
+def _get_generator() -> IdGenerator:
+    global _generator
+    generator = _generator
+    if generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = _default_generator()
+            generator = _generator
+    return generator
+
+
+def _reset_after_fork():
+    # fork된 자식 프로세스는 부모의 워커 ID/순번/임대를 쓰지 않고 첫 ID 생성 시 새로 임대
+    # (상속된 락 디스크립터를 닫아도 부모가 연 디스크립터가 있으므로 부모의 임대는 유지됨)
+    global _generator, _generator_lock, _lease_fd, _forked
+    _forked = True
+    if _lease_fd is not None:
+        os.close(_lease_fd)
+        _lease_fd = None
+    _generator = None
+    _generator_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def configure(worker_id: int):
+    """프로세스 전역 생성기의 워커 ID 설정 (여러 서버에 배포할 때 서버마다 다른 값)"""
+    global _generator
+    _generator = IdGenerator(worker_id)
+
+
+def worker_id() -> int:
+    """프로세스 전역 생성기의 워커 ID"""
+    return _get_generator().worker_id
+
+
+def next_id() -> int:
+    """프로세스 전역 생성기의 다음 정수 ID"""
+    return _get_generator().next_id()
+
+
+def new_id(prefix: str) -> str:
+    """엔티티 문자열 ID (예: 'HD_0K3xS9Lq2aB')"""
+    return f"{prefix}_{encode(_get_generator().next_id())}"
@@ -0,0 +1,183 @@
+"""
+Stroke Prediction System - Message Store
+메시지 저장소 (받은 편지함 / 대화 스레드 인덱스)
+
+모든 메시지를 ID로 보관하고, 수신자별 받은 편지함과 대화 상대 쌍별 스레드를
+고정 크기 세그먼트로 나눈 추가 전용 타임라인에 인덱싱.
+읽지 않은 메시지 수는 수신자별/대화별 카운터로 유지하므로 목록을 훑지 않고 조회하며,
+목록 조회는 최신순 페이지 단위(위치 커서)로 O(페이지 크기)
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import Message
+
+
+class MessageTimeline:
+    """
+    추가 전용 메시지 타임라인
+    고정 크기 세그먼트 목록으로 저장하여 위치로 O(1) 접근
+    """
+
+    SEGMENT_SIZE = 1024
+
+    def __init__(self):
+        self._segments: List[List[Message]] = []
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: int) -> Message:
+        if not 0 <= position < self._length:
+            raise IndexError(position)
+        segment, offset = divmod(position, self.SEGMENT_SIZE)
+        return self._segments[segment][offset]
+
+    def append(self, message: Message) -> int:
+        """메시지 추가, 위치 반환"""
+        if not self._segments or len(self._segments[-1]) == self.SEGMENT_SIZE:
+            self._segments.append([])
+        self._segments[-1].append(message)
+        self._length += 1
+        return self._length - 1
+
+    def iter_reverse(self, before: Optional[int] = None) -> Iterator[Tuple[int, Message]]:
+        """최신순 (위치, 메시지), before 위치 이전부터"""
+        position = self._length if before is None else min(before, self._length)
+        while position > 0:
+            position -= 1
+            yield position, self[position]
+
+    def page(self, limit: int, before: Optional[int] = None) -> Tuple[List[Message], Optional[int]]:
+        """
+        최신순 한 페이지 (메시지 목록, 다음 페이지 커서)
+        커서는 마지막으로 반환한 메시지 위치이며 더 없으면 None
+        """
+        end = self._length if before is None else max(0, min(before, self._length))
+        start = max(0, end - limit)
+        messages = [self[position] for position in range(end - 1, start - 1, -1)]
+        return messages, (start if start > 0 else None)
+
+
+def conversation_key(user_a: str, user_b: str) -> Tuple[str, str]:
+    """대화 상대 쌍 키 (순서 무관)"""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+class MessageStore:
+    """
+    메시지 저장소
+    읽음 처리는 카운터 유지를 위해 mark_read / mark_thread_read로 수행
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, Message] = {}
+        self._inboxes: Dict[str, MessageTimeline] = {}              # 수신자 -> 받은 메시지
+        self._threads: Dict[Tuple[str, str], MessageTimeline] = {}  # 대화 쌍 -> 메시지
+        self._partners: Dict[str, Dict[str, Message]] = {}          # 사용자 -> {상대: 마지막 메시지}
+        self._unread: Dict[str, int] = {}                           # 수신자 -> 읽지 않은 수
+        self._thread_unread: Dict[Tuple[str, str], int] = {}        # (수신자, 발신자) -> 읽지 않은 수
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, message: Message) -> bool:
+        """메시지 저장 및 인덱싱 (이미 저장된 ID면 False)"""
+        if message.message_id in self._by_id:
+            return False
+        self._by_id[message.message_id] = message
+        sender, recipient = message.from_user_id, message.to_user_id
+
+        self._inboxes.setdefault(recipient, MessageTimeline()).append(message)
+        self._threads.setdefault(conversation_key(sender, recipient), MessageTimeline()).append(message)
+        self._partners.setdefault(sender, {})[recipient] = message
+        self._partners.setdefault(recipient, {})[sender] = message
+
+        if not message.is_read:
+            self._unread[recipient] = self._unread.get(recipient, 0) + 1
+            key = (recipient, sender)
+            self._thread_unread[key] = self._thread_unread.get(key, 0) + 1
+        return True
+
+    def load(self, messages: Iterable[Message]):
+        """저장된 메시지 일괄 적재 (시간순 정렬 후 추가, 중복 ID는 무시)"""
+        for message in sorted(messages, key=lambda m: m.timestamp):
+            self.add(message)
+
+    def get(self, message_id: str) -> Optional[Message]:
+        return self._by_id.get(message_id)
+
+    def messages(self) -> Iterator[Message]:
+        """저장된 전체 메시지 (저장 순서)"""
+        return iter(self._by_id.values())
+
+    def unread_count(self, user_id: str, other_id: Optional[str] = None) -> int:
+        """읽지 않은 메시지 수 (other_id가 있으면 해당 상대와의 대화만)"""
+        if other_id is None:
+            return self._unread.get(user_id, 0)
+        return self._thread_unread.get((user_id, other_id), 0)
+
+    def inbox(self, user_id: str, limit: int = 20, before: Optional[int] = None) -> Dict:
+        """받은 편지함 한 페이지 (최신순)"""
+        timeline = self._inboxes.get(user_id) or MessageTimeline()
+        messages, cursor = timeline.page(limit, before)
+        return {
+            'messages': [message.to_dict() for message in messages],
+            'total': len(timeline),
+            'unread_count': self.unread_count(user_id),
+            'next_cursor': cursor
+        }
+
+    def thread(self, user_id: str, other_id: str, limit: int = 20, before: Optional[int] = None) -> Dict:
+        """대화 스레드 한 페이지 (최신순, 주고받은 메시지 모두)"""
+        timeline = self._threads.get(conversation_key(user_id, other_id)) or MessageTimeline()
+        messages, cursor = timeline.page(limit, before)
+        return {
+            'messages': [message.to_dict() for message in messages],
+            'total': len(timeline),
+            'unread_count': self.unread_count(user_id, other_id),
+            'next_cursor': cursor
+        }
+
+    def conversations(self, user_id: str, limit: int = 50) -> List[Dict]:
+        """대화 상대 목록 (마지막 메시지 최신순)"""
+        partners = self._partners.get(user_id, {})
+        latest = sorted(partners.items(), key=lambda item: item[1].timestamp, reverse=True)[:limit]
+        return [
+            {
+                'user_id': other_id,
+                'last_message': message.to_dict(),
+                'unread_count': self.unread_count(user_id, other_id)
+            }
+            for other_id, message in latest
+        ]
+
+    def mark_read(self, user_id: str, message_id: str) -> bool:
+        """수신자의 메시지 읽음 처리 (새로 읽은 경우 True)"""
+        message = self._by_id.get(message_id)
+        if message is None or message.to_user_id != user_id or message.is_read:
+            return False
+        message.mark_as_read()
+        self._unread[user_id] -= 1
+        self._thread_unread[(user_id, message.from_user_id)] -= 1
+        return True
+
+    def mark_thread_read(self, user_id: str, other_id: str) -> List[str]:
+        """
+        상대에게 받은 메시지 모두 읽음 처리, 읽음 처리한 메시지 ID 반환
+        최신 메시지부터 읽지 않은 수가 0이 될 때까지만 확인
+        """
+        remaining = self.unread_count(user_id, other_id)
+        timeline = self._threads.get(conversation_key(user_id, other_id))
+        marked = []
+        if not remaining or timeline is None:
+            return marked
+        for _, message in timeline.iter_reverse():
+            if message.to_user_id == user_id and not message.is_read:
+                self.mark_read(user_id, message.message_id)
+                marked.append(message.message_id)
+                remaining -= 1
+                if remaining == 0:
+                    break
+        return marked
@@ -9,11 +9,17 @@ Stroke Prediction System - Model Classes
 - Message, Notification, Alert
 """
 
+import math
+import threading
 from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Callable
 from enum import Enum
 
+from ids import new_id
+
 
 class UserRole(Enum):
     """사용자 역할 열거형"""
@@ -30,6 +36,10 @@ class RiskLevel(Enum):
     HIGH = "High"
 
 
+# 위험도 점수 요인 (요인별 기여도 순서)
+RISK_FACTORS = ('age', 'hypertension', 'heart_disease', 'glucose', 'bmi', 'smoking')
+
+
 class User(ABC):
     """
     사용자 추상 기본 클래스
@@ -71,6 +81,43 @@ class User(ABC):
         }
 
 
+class HistoryView:
+    """
+    환자 히스토리 읽기 전용 스냅샷 (copy-on-write)
+    목록 객체와 게시 시점의 길이만 보관: 목록은 뒤에 추가만 되고 앞부분을 지울 때는 새 목록으로
+    교체하므로, 게시된 길이까지의 내용은 이후 변경과 관계없이 그대로 유지됨
+    """
+    
+    __slots__ = ('_health_records', '_risk_assessments', '_fast_tests', '_lengths')
+    
+    def __init__(self, health_records: List['HealthData'], risk_assessments: List['RiskAssessment'],
+                 fast_tests: List['FASTTest']):
+        self._health_records = health_records
+        self._risk_assessments = risk_assessments
+        self._fast_tests = fast_tests
+        self._lengths = (len(health_records), len(risk_assessments), len(fast_tests))
+    
+    @property
+    def health_records(self) -> List['HealthData']:
+        return self._health_records[:self._lengths[0]]
+    
+    @property
+    def risk_assessments(self) -> List['RiskAssessment']:
+        return self._risk_assessments[:self._lengths[1]]
+    
+    @property
+    def fast_tests(self) -> List['FASTTest']:
+        return self._fast_tests[:self._lengths[2]]
+    
+    @property
+    def latest_health_data(self) -> Optional['HealthData']:
+        return self._health_records[self._lengths[0] - 1] if self._lengths[0] else None
+    
+    @property
+    def latest_assessment(self) -> Optional['RiskAssessment']:
+        return self._risk_assessments[self._lengths[1] - 1] if self._lengths[1] else None
+
+
 class Patient(User):
     """
     환자 클래스
@@ -79,16 +126,145 @@ class Patient(User):
     
     def __init__(self, user_id: str, email: str, name: str, password: str):
         super().__init__(user_id, email, name, password, UserRole.PATIENT)
-        self.health_records: List['HealthData'] = []
-        self.risk_assessments: List['RiskAssessment'] = []
-        self.fast_tests: List['FASTTest'] = []
+        self._health_records: List['HealthData'] = []
+        self._risk_assessments: List['RiskAssessment'] = []
+        self._fast_tests: List['FASTTest'] = []
+        self._history_loader: Optional[Callable[['Patient'], None]] = None
+        self._history_lock: Optional[threading.Lock] = None
+        self._view: Optional[HistoryView] = None
+        self._view_deferred = 0
+        self.archived_counts: Dict[str, int] = {}  # 히스토리 아카이브로 옮긴 기록 수 {목록 속성: 개수}
         self.shared_with: List[str] = []  # 공유 대상 user_id 리스트
         self.messages_received: List['Message'] = []
         self.notifications: List['Notification'] = []
     
+    def set_history_loader(self, loader: Callable[['Patient'], None]):
+        """
+        지연 로딩 히스토리 설정 (스냅샷 복원용)
+        건강 기록/평가/FAST 검사에 처음 접근할 때 loader(patient)가 한 번 호출됨
+        """
+        self._history_lock = threading.Lock()
+        self._history_loader = loader
+    
+    def _load_history(self):
+        """
+        지연 히스토리 실체화 (환자별 락으로 한 번만 실행)
+        로딩이 끝나 목록이 모두 교체된 뒤에 로더를 지우므로, 다른 스레드는 로딩 중에 빈 히스토리를
+        보지 않고 락에서 기다림 (로딩 중에는 추가도 같은 락에서 대기하므로 기록이 유실되지 않음)
+        """
+        if self._history_loader is None:
+            return
+        with self._history_lock:
+            loader = self._history_loader
+            if loader is None:
+                return  # 다른 스레드가 먼저 실체화
+            loader(self)
+            self._history_loader = None
+            self._publish_history()
+    
+    def _publish_history(self):
+        """현재 히스토리를 읽기 스냅샷으로 게시 (일괄 변경 중이면 끝날 때 게시)"""
+        if not self._view_deferred:
+            self._view = HistoryView(self._health_records, self._risk_assessments, self._fast_tests)
+    
+    @contextmanager
+    def deferred_history_view(self):
+        """
+        여러 단계 변경(건강 데이터 + 위험도 평가 등)을 마칠 때까지 스냅샷 게시를 미룸
+        읽는 쪽은 중간 상태를 보지 않음
+        """
+        self._view_deferred += 1
+        try:
+            yield self
+        finally:
+            self._view_deferred -= 1
+            self._publish_history()
+    
+    def history_source(self):
+        """
+        저장용 히스토리 참조: 아직 실체화하지 않았으면 지연 로더, 아니면 게시된 읽기 스냅샷
+        (스냅샷 저장 시 실체화하지 않은 히스토리는 기존 파일의 열을 그대로 복사)
+        """
+        loader = self._history_loader
+        return loader if loader is not None else self.history_view()
+    
+    def latest_health_timestamp(self) -> Optional[datetime]:
+        """
+        최신 건강 데이터 시각
+        지연 로딩 히스토리는 실체화하지 않고 로더가 제공하는 저장 시각 사용 (스케줄러 구축 등 일괄 조회용)
+        """
+        loader = self._history_loader
+        stored = getattr(loader, 'latest_health_timestamp', None)
+        if stored is not None:
+            timestamp = stored()
+            if self._history_loader is loader:
+                return timestamp
+        latest = self.history_view().latest_health_data
+        return latest.timestamp if latest else None
+    
+    def latest_records(self) -> Tuple[Optional['HealthData'], Optional['RiskAssessment']]:
+        """
+        최신 (건강 데이터, 위험도 평가)
+        지연 로딩 히스토리는 실체화하지 않고 로더가 저장된 마지막 기록만 복원 (인덱스 구축 등 일괄 조회용)
+        """
+        loader = self._history_loader
+        stored = getattr(loader, 'latest_records', None)
+        if stored is not None:
+            records = stored(self)
+            if self._history_loader is loader:
+                return records
+        view = self.history_view()
+        return view.latest_health_data, view.latest_assessment
+    
+    def history_view(self) -> HistoryView:
+        """마지막으로 게시된 히스토리 스냅샷 (락 없이 읽기)"""
+        if self._history_loader is not None:
+            self._load_history()
+        view = self._view
+        if view is None:
+            view = self._view = HistoryView(self._health_records, self._risk_assessments, self._fast_tests)
+        return view
+    
+    @property
+    def health_records(self) -> List['HealthData']:
+        if self._history_loader is not None:
+            self._load_history()
+        return self._health_records
+    
+    @health_records.setter
+    def health_records(self, records: List['HealthData']):
+        self._load_history()
+        self._health_records = records
+        self._publish_history()
+    
+    @property
+    def risk_assessments(self) -> List['RiskAssessment']:
+        if self._history_loader is not None:
+            self._load_history()
+        return self._risk_assessments
+    
+    @risk_assessments.setter
+    def risk_assessments(self, assessments: List['RiskAssessment']):
+        self._load_history()
+        self._risk_assessments = assessments
+        self._publish_history()
+    
+    @property
+    def fast_tests(self) -> List['FASTTest']:
+        if self._history_loader is not None:
+            self._load_history()
+        return self._fast_tests
+    
+    @fast_tests.setter
+    def fast_tests(self, tests: List['FASTTest']):
+        self._load_history()
+        self._fast_tests = tests
+        self._publish_history()
+    
     def add_health_data(self, health_data: 'HealthData'):
         """건강 데이터 추가"""
         self.health_records.append(health_data)
+        self._publish_history()
     
     def get_latest_health_data(self) -> Optional['HealthData']:
         """최신 건강 데이터 조회"""
@@ -97,6 +273,7 @@ class Patient(User):
     def add_risk_assessment(self, assessment: 'RiskAssessment'):
         """위험도 평가 추가"""
         self.risk_assessments.append(assessment)
+        self._publish_history()
     
     def get_latest_risk_level(self) -> Optional[RiskLevel]:
         """최신 위험도 조회"""
@@ -104,22 +281,33 @@ class Patient(User):
             return self.risk_assessments[-1].risk_level
         return None
     
+    def receive_notification(self, notification: 'Notification'):
+        """알림 수신"""
+        self.notifications.append(notification)
+    
     def share_data_with(self, recipient_id: str, recipient_role: UserRole):
         """데이터 공유"""
         if recipient_id not in self.shared_with:
             self.shared_with.append(recipient_id)
         return True
     
+    def revoke_share(self, recipient_id: str):
+        """데이터 공유 해제"""
+        if recipient_id in self.shared_with:
+            self.shared_with.remove(recipient_id)
+        return True
+    
     def perform_fast_test(self, fast_test: 'FASTTest'):
         """FAST 검사 수행"""
         self.fast_tests.append(fast_test)
+        self._publish_history()
         return fast_test
     
     def get_dashboard_data(self) -> Dict:
         """환자 대시보드 데이터"""
         return {
             'user_info': self.to_dict(),
-            'total_records': len(self.health_records),
+            'total_records': len(self.health_records) + self.archived_counts.get('health_records', 0),
             'latest_risk_level': self.get_latest_risk_level().value if self.get_latest_risk_level() else None,
             'unread_messages': len([m for m in self.messages_received if not m.is_read]),
             'shared_count': len(self.shared_with)
@@ -137,6 +325,7 @@ class Caregiver(User):
         self.monitored_patients: List[str] = []  # 모니터링 중인 환자 user_id
         self.alerts_received: List['Alert'] = []
         self.messages_sent: List['Message'] = []
+        self.notifications: List['Notification'] = []
     
     def add_monitored_patient(self, patient_id: str):
         """모니터링 환자 추가"""
@@ -144,6 +333,12 @@ class Caregiver(User):
             self.monitored_patients.append(patient_id)
         return True
     
+    def remove_monitored_patient(self, patient_id: str):
+        """모니터링 환자 제거"""
+        if patient_id in self.monitored_patients:
+            self.monitored_patients.remove(patient_id)
+        return True
+    
     def send_encouragement_message(self, patient_id: str, message: 'Message'):
         """응원 메시지 전송"""
         self.messages_sent.append(message)
@@ -153,12 +348,17 @@ class Caregiver(User):
         """위험 알림 수신"""
         self.alerts_received.append(alert)
     
+    def receive_notification(self, notification: 'Notification'):
+        """알림 수신"""
+        self.notifications.append(notification)
+    
     def get_dashboard_data(self) -> Dict:
         """보호자 대시보드 데이터"""
         return {
             'user_info': self.to_dict(),
             'monitored_patients_count': len(self.monitored_patients),
             'unread_alerts': len([a for a in self.alerts_received if not a.is_read]),
+            'unread_notifications': len([n for n in self.notifications if not n.is_read]),
             'messages_sent_count': len(self.messages_sent)
         }
 
@@ -175,6 +375,7 @@ class Doctor(User):
         self.assigned_patients: List[str] = []  # 담당 환자 user_id
         self.consultation_notes: Dict[str, List[str]] = {}  # {patient_id: [notes]}
         self.prescriptions: Dict[str, List[str]] = {}  # {patient_id: [prescriptions]}
+        self.notifications: List['Notification'] = []
     
     def add_patient(self, patient_id: str):
         """담당 환자 추가"""
@@ -182,6 +383,16 @@ class Doctor(User):
             self.assigned_patients.append(patient_id)
         return True
     
+    def remove_patient(self, patient_id: str):
+        """담당 환자 제거"""
+        if patient_id in self.assigned_patients:
+            self.assigned_patients.remove(patient_id)
+        return True
+    
+    def receive_notification(self, notification: 'Notification'):
+        """알림 수신"""
+        self.notifications.append(notification)
+    
     def add_consultation_note(self, patient_id: str, note: str):
         """진단 메모 추가"""
         if patient_id not in self.consultation_notes:
@@ -218,11 +429,21 @@ class Doctor(User):
             'user_info': self.to_dict(),
             'specialty': self.specialty,
             'total_patients': len(self.assigned_patients),
+            'unread_notifications': len([n for n in self.notifications if not n.is_read]),
             'consultation_notes_count': sum(len(notes) for notes in self.consultation_notes.values()),
             'prescriptions_count': sum(len(presc) for presc in self.prescriptions.values())
         }
 
 
+def valid_risk_thresholds(high, medium) -> bool:
+    """위험 임계치가 유한한 점수 범위 값이고 0 <= medium < high <= 100인지"""
+    try:
+        finite = math.isfinite(high) and math.isfinite(medium)
+    except TypeError:
+        return False
+    return finite and 0 <= medium < high <= 100
+
+
 class Administrator(User):
     """
     관리자 클래스
@@ -240,6 +461,16 @@ class Administrator(User):
             'retest_interval_days': 90,
             'warning_accumulation_threshold': 3
         }
+        self._policy_listeners: List[Callable[['Administrator'], None]] = []
+    
+    def add_policy_listener(self, listener: Callable[['Administrator'], None]):
+        """정책 변경 리스너 등록 (위험 임계치 등 알림 정책 변경 시 호출)"""
+        self._policy_listeners.append(listener)
+    
+    def _notify_policy_listeners(self):
+        """정책 변경 리스너 호출"""
+        for listener in self._policy_listeners:
+            listener(self)
     
     def update_content(self, content_type: str, content_data: Dict):
         """콘텐츠 업데이트 (생활습관 가이드, 체크리스트, 교육자료)"""
@@ -253,14 +484,32 @@ class Administrator(User):
     def update_alert_policy(self, policy_key: str, policy_value):
         """알림 정책 업데이트"""
         if policy_key in self.alert_policies:
+            if policy_key == 'risk_thresholds':
+                # 지정한 값만 현재 임계치에 병합하고, 검증에 실패하면 아무것도 바꾸지 않음
+                if not isinstance(policy_value, dict):
+                    return False
+                thresholds = {
+                    **self.alert_policies['risk_thresholds'],
+                    **{level: policy_value[level] for level in ('high', 'medium') if level in policy_value}
+                }
+                if not valid_risk_thresholds(thresholds['high'], thresholds['medium']):
+                    return False
+                self.alert_policies[policy_key] = thresholds
+                self._notify_policy_listeners()
+                return True
             self.alert_policies[policy_key] = policy_value
+            self._notify_policy_listeners()
             return True
         return False
     
     def set_risk_threshold(self, level: str, threshold: int):
-        """위험 임계치 설정"""
+        """위험 임계치 설정 (점수 범위 안에서 0 <= medium < high <= 100 유지)"""
         if level in ['high', 'medium']:
-            self.alert_policies['risk_thresholds'][level] = threshold
+            thresholds = {**self.alert_policies['risk_thresholds'], level: threshold}
+            if not valid_risk_thresholds(thresholds['high'], thresholds['medium']):
+                return False
+            self.alert_policies['risk_thresholds'] = thresholds
+            self._notify_policy_listeners()
             return True
         return False
     
@@ -282,7 +531,7 @@ class HealthData:
     """
     
     def __init__(self, patient_id: str, data: Dict):
-        self.health_data_id = f"HD_{patient_id}_{datetime.now().timestamp()}"
+        self.health_data_id = new_id("HD")
         self.patient_id = patient_id
         self.timestamp = datetime.now()
         
@@ -324,17 +573,38 @@ class RiskAssessment:
     """
     
     def __init__(self, patient_id: str, health_data: HealthData, score: float, risk_level: RiskLevel):
-        self.assessment_id = f"RA_{patient_id}_{datetime.now().timestamp()}"
+        self.assessment_id = new_id("RA")
         self.patient_id = patient_id
         self.health_data_id = health_data.health_data_id
         self.timestamp = datetime.now()
         self.score = score
         self.risk_level = risk_level
-        self.recommendations: List[str] = []
+        self.recommendations: Tuple[str, ...] = ()
+        self.risk_factor_mask = 0  # 맞춤 권장사항 위험 요인 비트마스크
+        self.policy_version = 0  # 분류에 사용된 임계치 정책 버전
+        self.contributions = b''  # RISK_FACTORS 순서 요인별 기여도 (float32 packed)
+        self.contribution_unit = 'points'  # points 또는 log_odds
     
     def add_recommendation(self, recommendation: str):
-        """권장사항 추가"""
-        self.recommendations.append(recommendation)
+        """권장사항 추가 (공유 튜플은 변경하지 않고 새 튜플로 교체)"""
+        self.recommendations = self.recommendations + (recommendation,)
+    
+    def set_recommendations(self, recommendations: Tuple[str, ...]):
+        """권장사항 일괄 설정 (RiskCalculator의 공유 튜플을 그대로 참조)"""
+        self.recommendations = recommendations
+    
+    def set_contributions(self, contributions, unit: str = 'points'):
+        """요인별 기여도 저장 (float32로 압축)"""
+        self.contributions = array('f', contributions).tobytes()
+        self.contribution_unit = unit
+    
+    def get_contributions(self) -> Dict[str, float]:
+        """요인별 기여도 반환 {요인: 기여도}"""
+        if not self.contributions:
+            return {}
+        values = array('f')
+        values.frombytes(self.contributions)
+        return {factor: round(value, 2) for factor, value in zip(RISK_FACTORS, values)}
     
     def get_risk_color(self) -> str:
         """위험도 색상 반환"""
@@ -355,7 +625,9 @@ class RiskAssessment:
             'score': self.score,
             'risk_level': self.risk_level.value,
             'risk_color': self.get_risk_color(),
-            'recommendations': self.recommendations
+            'recommendations': self.recommendations,
+            'contributions': self.get_contributions(),
+            'contribution_unit': self.contribution_unit
         }
 
 
@@ -366,7 +638,7 @@ class FASTTest:
     """
     
     def __init__(self, patient_id: str):
-        self.test_id = f"FAST_{patient_id}_{datetime.now().timestamp()}"
+        self.test_id = new_id("FAST")
         self.patient_id = patient_id
         self.timestamp = datetime.now()
         self.face_asymmetry = False  # 얼굴 비대칭
@@ -408,7 +680,7 @@ class Message:
     
     def __init__(self, from_user_id: str, to_user_id: str, subject: str, content: str, 
                  message_type: str = "encouragement"):
-        self.message_id = f"MSG_{datetime.now().timestamp()}"
+        self.message_id = new_id("MSG")
         self.from_user_id = from_user_id
         self.to_user_id = to_user_id
         self.subject = subject
@@ -433,6 +705,15 @@ class Message:
             'timestamp': self.timestamp.isoformat(),
             'is_read': self.is_read
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Message':
+        """to_dict() 결과로부터 복원"""
+        message = cls(data['from'], data['to'], data['subject'], data['content'], data['type'])
+        message.message_id = data['message_id']
+        message.timestamp = datetime.fromisoformat(data['timestamp'])
+        message.is_read = data['is_read']
+        return message
 
 
 class Notification:
@@ -442,11 +723,11 @@ class Notification:
     """
     
     def __init__(self, user_id: str, title: str, message: str, notification_type: str = "reminder"):
-        self.notification_id = f"NOTIF_{datetime.now().timestamp()}"
+        self.notification_id = new_id("NOTIF")
         self.user_id = user_id
         self.title = title
         self.message = message
-        self.notification_type = notification_type  # reminder, info, system
+        self.notification_type = notification_type  # reminder, info, system, digest
         self.timestamp = datetime.now()
         self.is_read = False
     
@@ -465,6 +746,15 @@ class Notification:
             'timestamp': self.timestamp.isoformat(),
             'is_read': self.is_read
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Notification':
+        """to_dict() 결과로부터 복원"""
+        notification = cls(data['user_id'], data['title'], data['message'], data['type'])
+        notification.notification_id = data['notification_id']
+        notification.timestamp = datetime.fromisoformat(data['timestamp'])
+        notification.is_read = data['is_read']
+        return notification
 
 
 class Alert:
@@ -474,7 +764,7 @@ class Alert:
     """
     
     def __init__(self, patient_id: str, recipient_id: str, alert_type: str, severity: str, message: str):
-        self.alert_id = f"ALERT_{datetime.now().timestamp()}"
+        self.alert_id = new_id("ALERT")
         self.patient_id = patient_id
         self.recipient_id = recipient_id
         self.alert_type = alert_type  # high_risk, emergency, abnormal_indicator
@@ -483,12 +773,21 @@ class Alert:
         self.timestamp = datetime.now()
         self.is_read = False
         self.is_acknowledged = False
+        # 같은 상황이 반복되면 새 경고 대신 발생 횟수/마지막 발생 시각 갱신
+        self.occurrence_count = 1
+        self.last_occurred_at = self.timestamp
     
     def acknowledge(self):
         """경고 확인 처리"""
         self.is_acknowledged = True
         self.is_read = True
     
+    def record_occurrence(self, occurred_at: Optional[datetime] = None):
+        """같은 경고 재발생 반영 (다시 읽지 않음 상태로)"""
+        self.occurrence_count += 1
+        self.last_occurred_at = occurred_at or datetime.now()
+        self.is_read = False
+    
     def to_dict(self) -> Dict:
         """딕셔너리로 변환"""
         return {
@@ -500,5 +799,23 @@ class Alert:
             'message': self.message,
             'timestamp': self.timestamp.isoformat(),
             'is_read': self.is_read,
-            'is_acknowledged': self.is_acknowledged
+            'is_acknowledged': self.is_acknowledged,
+            'occurrence_count': self.occurrence_count,
+            'last_occurred_at': self.last_occurred_at.isoformat()
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Alert':
+        """to_dict() 결과로부터 복원"""
+        alert = cls(data['patient_id'], data['recipient_id'], data['alert_type'],
+                    data['severity'], data['message'])
+        alert.alert_id = data['alert_id']
+        alert.timestamp = datetime.fromisoformat(data['timestamp'])
+        alert.is_read = data['is_read']
+        alert.is_acknowledged = data['is_acknowledged']
+        alert.occurrence_count = data.get('occurrence_count', 1)
+        alert.last_occurred_at = (
+            datetime.fromisoformat(data['last_occurred_at']) if data.get('last_occurred_at')
+            else alert.timestamp
+        )
+        return alert
@@ -0,0 +1,214 @@
+"""
+Stroke Prediction System - Retest Reminder Scheduler
+정기 재검사 알림 스케줄러
+
+환자별 다음 재검사 예정 시각을 최소 힙(우선순위 큐)에 보관하고, 가장 가까운 예정 시각까지만
+대기했다가 예정 시각이 지난 환자들에게 재검사 알림을 배치 단위로 전송.
+건강 데이터가 추가되면 해당 환자의 예정 시각만 갱신하므로 전체 환자를 주기적으로 확인하지 않음
+(갱신 전 힙 항목은 꺼낼 때 버리는 지연 삭제 방식)
+"""
+
+import heapq
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from concurrency import StripedLock
+from models import Patient, Notification
+from services import NotificationService
+
+
+REMINDER_TYPE = "정기 재검사"
+REMINDER_TITLE = f"{REMINDER_TYPE} 알림"
+
+# 최대 대기 시간 (시스템 시계 변경 대비)
+MAX_WAIT_SECONDS = 3600.0
+
+
+class RetestScheduler:
+    """
+    재검사 알림 스케줄러
+    population: 대상 사용자 목록을 반환하는 함수 (스케줄러 스레드 시작 시 전체 구축)
+    on_batch: 알림 배치 전송 후 호출되는 함수 (알림 목록 전달)
+    locks: 환자별 분할 락 (지정하면 환자마다 락을 잡고 기준 시각 확인/알림 전송)
+
+    다음 알림 기준 시각은 마지막 건강 데이터, 마지막 재검사 알림, 가입 시각 중 가장 늦은 시각
+    """
+
+    def __init__(self, population: Callable[[], Iterable], interval_days: int = 90,
+                 batch_size: int = 1000,
+                 on_batch: Optional[Callable[[List[Notification]], None]] = None,
+                 clock: Callable[[], float] = time.time,
+                 locks: Optional[StripedLock] = None):
+        self._population = population
+        self.interval_days = interval_days
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self._clock = clock
+        self.locks = locks
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, str]] = []  # (예정 시각, 환자 ID)
+        self._due: Dict[str, float] = {}          # 환자 ID -> 유효한 예정 시각
+        self._patients: Dict[str, Patient] = {}
+        self._built = False
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.batches = 0
+
+    @property
+    def _interval_seconds(self) -> float:
+        return self.interval_days * 86400.0
+
+    @staticmethod
+    def _anchor(patient: Patient) -> float:
+        """
+        재검사 주기 기준 시각 (epoch 초)
+        지연 로딩 히스토리는 스냅샷에 저장된 최신 시각을 사용하므로 실체화하지 않음
+        """
+        latest = patient.latest_health_timestamp()
+        anchor = (latest or patient.created_at).timestamp()
+        for notification in reversed(patient.notifications):
+            if notification.notification_type == 'reminder' and notification.title == REMINDER_TITLE:
+                anchor = max(anchor, notification.timestamp.timestamp())
+                break
+        return anchor
+
+    def rebuild(self):
+        """전체 환자 예정 시각 계산 후 힙 구성 (O(n) heapify)"""
+        patients = [user for user in self._population() if isinstance(user, Patient)]
+        interval = self._interval_seconds
+        due = {patient.user_id: self._anchor(patient) + interval for patient in patients}
+        heap = [(due_at, patient_id) for patient_id, due_at in due.items()]
+        heapq.heapify(heap)
+        with self._cond:
+            self._patients = {patient.user_id: patient for patient in patients}
+            self._due = due
+            self._heap = heap
+            self._built = True
+            self._cond.notify()
+
+    def schedule(self, patient: Patient, anchor: Optional[float] = None):
+        """
+        환자 예정 시각 갱신 (건강 데이터 추가 또는 알림 전송 후)
+        anchor: 주기 기준 시각 (기본: 현재)
+        """
+        if not self._built:
+            return  # 스레드 시작 시 전체 구축에 포함됨
+        due_at = (anchor if anchor is not None else self._clock()) + self._interval_seconds
+        with self._cond:
+            self._patients[patient.user_id] = patient
+            self._due[patient.user_id] = due_at
+            heapq.heappush(self._heap, (due_at, patient.user_id))
+            # 버려진 항목이 쌓이면 유효한 항목만으로 재구성
+            if len(self._heap) > 2 * len(self._due) + 1024:
+                self._heap = [(t, patient_id) for patient_id, t in self._due.items()]
+                heapq.heapify(self._heap)
+            if self._heap[0][1] == patient.user_id:
+                self._cond.notify()
+
+    def set_interval_days(self, interval_days: int) -> bool:
+        """재검사 주기 변경 (모든 예정 시각을 기준 시각은 유지한 채 이동)"""
+        if interval_days <= 0:
+            return False
+        with self._cond:
+            shift = (interval_days - self.interval_days) * 86400.0
+            self.interval_days = interval_days
+            if not self._built or shift == 0:
+                return True
+            self._due = {patient_id: t + shift for patient_id, t in self._due.items()}
+            self._heap = [(t, patient_id) for patient_id, t in self._due.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        return True
+
+    def _pop_due(self, now: float) -> List[Patient]:
+        """예정 시각이 지난 환자를 최대 batch_size명 꺼냄 (호출자가 락 보유)"""
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            due_at, patient_id = heapq.heappop(self._heap)
+            if self._due.get(patient_id) != due_at:
+                continue  # 이후 갱신된 항목
+            del self._due[patient_id]
+            batch.append(self._patients[patient_id])
+        return batch
+
+    def _emit(self, batch: List[Patient], now: float) -> List[Notification]:
+        """배치 알림 전송 (그 사이 건강 데이터가 들어온 환자는 재예약만)"""
+        notifications = []
+        interval = self._interval_seconds
+        for patient in batch:
+            with self.locks.hold(patient.user_id) if self.locks else nullcontext():
+                anchor = self._anchor(patient)
+                if anchor + interval > now:
+                    self.schedule(patient, anchor)
+                    continue
+                days = int((now - anchor) // 86400)
+                notifications.append(NotificationService.send_reminder(
+                    patient, REMINDER_TYPE,
+                    f"마지막 건강 검사 후 {days}일이 지났습니다. 위험도 재평가를 위해 건강 데이터를 입력하세요."
+                ))
+                self.schedule(patient, now)
+
+        if notifications:
+            self.sent += len(notifications)
+            self.batches += 1
+            if self.on_batch:
+                self.on_batch(notifications)
+        return notifications
+
+    def run_pending(self) -> List[Notification]:
+        """현재 예정된 알림을 모두 즉시 전송 (스레드 없이 사용할 때)"""
+        if not self._built:
+            self.rebuild()
+        notifications = []
+        while True:
+            now = self._clock()
+            with self._cond:
+                batch = self._pop_due(now)
+            if not batch:
+                return notifications
+            notifications.extend(self._emit(batch, now))
+
+    def _run(self):
+        self.rebuild()
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = self._clock()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else MAX_WAIT_SECONDS
+                    self._cond.wait(min(timeout, MAX_WAIT_SECONDS))
+                if self._stopped:
+                    return
+                batch = self._pop_due(now)
+            self._emit(batch, now)
+
+    def start(self) -> 'RetestScheduler':
+        """백그라운드 스레드에서 스케줄러 시작"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="RetestScheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """스케줄러 중지"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict:
+        """예약 환자 수, 다음 예정 시각, 전송 통계"""
+        with self._cond:
+            next_due = self._heap[0][0] if self._heap else None
+            return {
+                'scheduled': len(self._due),
+                'next_due_at': next_due,
+                'interval_days': self.interval_days,
+                'sent': self.sent,
+                'batches': self.batches
+            }
@@ -0,0 +1,380 @@
+"""
+Stroke Prediction System - Scoring Engines
+위험도 점수 계산 엔진
+
+RiskCalculator가 사용하는 점수 엔진 인터페이스와 구현:
+- ScoringEngine (추상 기본 클래스)
+- HeuristicScoringEngine: 기존 가중치 기반 점수
+- LogisticScoringEngine: 뇌졸중 데이터셋으로 학습한 로지스틱 회귀 모델 (NumPy)
+
+모델 학습:
+    python scoring.py train ../healthcare-dataset-stroke-data.csv stroke_model.bin
+"""
+
+import argparse
+import csv
+from array import array
+import math
+import os
+import struct
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from models import HealthData, RISK_FACTORS
+
+
+# 모든 엔진이 공유하는 위험 요인 순서 (특성 행렬의 열 순서 = 기여도 순서)
+FACTORS: Tuple[str, ...] = RISK_FACTORS
+
+# 흡연 상태 인코딩 (0: 비흡연/미상, 0.5: 과거 흡연, 1: 현재 흡연)
+SMOKING_CODES: Dict[str, float] = {
+    'never smoked': 0.0,
+    'formerly smoked': 0.5,
+    'smokes': 1.0
+}
+
+
+def encode_health_data(health_data: HealthData) -> Tuple[float, ...]:
+    """
+    건강 데이터를 FACTORS 순서의 특성 벡터로 변환
+    혈당/BMI 미입력은 NaN
+    """
+    glucose = health_data.avg_glucose_level
+    bmi = health_data.bmi
+    return (
+        float(health_data.age),
+        float(health_data.hypertension == 1),
+        float(health_data.heart_disease == 1),
+        float(glucose) if glucose else math.nan,
+        float(bmi) if bmi else math.nan,
+        SMOKING_CODES.get(health_data.smoking_status, 0.0)
+    )
+
+
+def feature_matrix(records: Iterable[HealthData]) -> np.ndarray:
+    """건강 데이터 목록을 (n, len(FACTORS)) 특성 행렬로 변환"""
+    rows = [encode_health_data(record) for record in records]
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(FACTORS))
+
+
+def round_score(score: float) -> float:
+    """
+    점수를 소수점 둘째 자리로 반올림
+    np.round(x, 2)와 같은 방식 (x*100을 짝수 반올림)으로 단건/일괄 결과를 일치시킴
+    """
+    return round(score * 100) / 100
+
+
+def _parse_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def dataset_from_rows(rows: Iterable[Dict[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    뇌졸중 데이터셋 행(CSV 딕셔너리)을 특성 행렬과 라벨로 변환
+    """
+    columns = tuple(array('d') for _ in FACTORS)
+    labels = array('b')
+    for row in rows:
+        _append_row(columns, labels, row.get('age'), row.get('hypertension'),
+                    row.get('heart_disease'), row.get('avg_glucose_level'),
+                    row.get('bmi'), row.get('smoking_status'), row.get('stroke'))
+    return _to_arrays(columns, labels)
+
+
+def load_dataset(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    라벨이 있는 뇌졸중 데이터셋 CSV 로드
+    행 딕셔너리를 만들지 않고 열 단위 배열에 바로 적재 (수백만 행 대응)
+    """
+    columns = tuple(array('d') for _ in FACTORS)
+    labels = array('b')
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        index = [header.index(name) for name in (
+            'age', 'hypertension', 'heart_disease', 'avg_glucose_level',
+            'bmi', 'smoking_status', 'stroke'
+        )]
+        for row in reader:
+            _append_row(columns, labels, *(row[i] for i in index))
+    return _to_arrays(columns, labels)
+
+
+def _append_row(columns: Tuple[array, ...], labels: array, age, hypertension, heart_disease,
+                glucose, bmi, smoking_status, stroke):
+    glucose = _parse_float(glucose)
+    bmi = _parse_float(bmi)
+    columns[0].append(_parse_float(age))
+    columns[1].append(float(hypertension == '1'))
+    columns[2].append(float(heart_disease == '1'))
+    columns[3].append(glucose if glucose else math.nan)
+    columns[4].append(bmi if bmi else math.nan)
+    columns[5].append(SMOKING_CODES.get(smoking_status, 0.0))
+    labels.append(int(stroke or 0))
+
+
+def _to_arrays(columns: Tuple[array, ...], labels: array) -> Tuple[np.ndarray, np.ndarray]:
+    X = np.column_stack([np.frombuffer(column, dtype=np.float64) for column in columns]) \
+        if len(labels) else np.empty((0, len(FACTORS)))
+    return X, np.frombuffer(labels, dtype=np.int8).copy()
+
+
+class ScoringEngine(ABC):
+    """
+    점수 엔진 추상 기본 클래스
+    단건 점수와 특성 행렬 기반 일괄 점수 (0-100) 계산
+    """
+
+    name = 'abstract'
+    # 요인별 기여도 단위 ('points': 점수 가산점, 'log_odds': 로그 오즈)
+    contribution_unit = 'points'
+
+    @abstractmethod
+    def score_with_contributions(self, health_data: HealthData) -> Tuple[float, Tuple[float, ...]]:
+        """단건 위험도 점수 (0-100)와 FACTORS 순서의 요인별 기여도"""
+        pass
+
+    @abstractmethod
+    def score_batch_with_contributions(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """특성 행렬(FACTORS 순서) 일괄 점수 (0-100)와 (n, len(FACTORS)) 기여도 행렬"""
+        pass
+
+    def score(self, health_data: HealthData) -> float:
+        """단건 위험도 점수 계산 (0-100)"""
+        return self.score_with_contributions(health_data)[0]
+
+    def score_batch(self, X: np.ndarray) -> np.ndarray:
+        """특성 행렬(FACTORS 순서) 일괄 점수 계산 (0-100)"""
+        return self.score_batch_with_contributions(X)[0]
+
+
+class HeuristicScoringEngine(ScoringEngine):
+    """
+    가중치 기반 점수 엔진
+    위험 요인별 0-100 점수에 가중치를 곱해 합산 (기여도 = 요인별 가산점)
+    """
+
+    name = 'heuristic'
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        # 위험 요인별 가중치
+        self.weights = weights or {
+            'age': 0.15,
+            'hypertension': 0.20,
+            'heart_disease': 0.20,
+            'glucose': 0.15,
+            'bmi': 0.15,
+            'smoking': 0.15
+        }
+
+    def score_with_contributions(self, health_data: HealthData) -> Tuple[float, Tuple[float, ...]]:
+        # 나이 점수 (나이가 높을수록 위험)
+        age_score = min((health_data.age / 100) * 100, 100)
+
+        # 고혈압 점수
+        hypertension_score = 100 if health_data.hypertension == 1 else 0
+
+        # 심장질환 점수
+        heart_disease_score = 100 if health_data.heart_disease == 1 else 0
+
+        # 혈당 점수 (정상 범위: 70-100 mg/dL)
+        glucose_score = 0
+        if health_data.avg_glucose_level:
+            if health_data.avg_glucose_level > 125:
+                glucose_score = min(((health_data.avg_glucose_level - 125) / 175) * 100, 100)
+            elif health_data.avg_glucose_level < 70:
+                glucose_score = min(((70 - health_data.avg_glucose_level) / 70) * 100, 100)
+
+        # BMI 점수 (정상 범위: 18.5-24.9)
+        bmi_score = 0
+        if health_data.bmi:
+            if health_data.bmi > 30:
+                bmi_score = min(((health_data.bmi - 30) / 20) * 100, 100)
+            elif health_data.bmi < 18.5:
+                bmi_score = min(((18.5 - health_data.bmi) / 18.5) * 100, 100)
+
+        # 흡연 점수
+        smoking_score = SMOKING_CODES.get(health_data.smoking_status, 0) * 100
+
+        contributions = (
+            age_score * self.weights['age'],
+            hypertension_score * self.weights['hypertension'],
+            heart_disease_score * self.weights['heart_disease'],
+            glucose_score * self.weights['glucose'],
+            bmi_score * self.weights['bmi'],
+            smoking_score * self.weights['smoking']
+        )
+        score = 0.0
+        for contribution in contributions:
+            score += contribution
+        return round_score(score), contributions
+
+    def score_batch_with_contributions(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        age, hypertension, heart_disease, glucose, bmi, smoking = X.T
+
+        # 미입력(NaN) 혈당/BMI는 0점
+        glucose = np.nan_to_num(glucose, nan=100.0)
+        bmi = np.nan_to_num(bmi, nan=20.0)
+        glucose_score = np.where(
+            glucose > 125, np.minimum((glucose - 125) / 175 * 100, 100),
+            np.where(glucose < 70, np.minimum((70 - glucose) / 70 * 100, 100), 0.0)
+        )
+        bmi_score = np.where(
+            bmi > 30, np.minimum((bmi - 30) / 20 * 100, 100),
+            np.where(bmi < 18.5, np.minimum((18.5 - bmi) / 18.5 * 100, 100), 0.0)
+        )
+
+        contributions = np.empty((len(X), len(FACTORS)), dtype=np.float64)
+        contributions[:, 0] = np.minimum(age / 100 * 100, 100) * self.weights['age']
+        contributions[:, 1] = hypertension * 100 * self.weights['hypertension']
+        contributions[:, 2] = heart_disease * 100 * self.weights['heart_disease']
+        contributions[:, 3] = glucose_score * self.weights['glucose']
+        contributions[:, 4] = bmi_score * self.weights['bmi']
+        contributions[:, 5] = smoking * 100 * self.weights['smoking']
+
+        # 단건 경로와 같은 순서로 합산
+        score = np.zeros(len(X), dtype=np.float64)
+        for column in contributions.T:
+            score += column
+        return np.round(score, 2), contributions
+
+
+class LogisticScoringEngine(ScoringEngine):
+    """
+    로지스틱 회귀 점수 엔진
+    점수 = 뇌졸중 예측 확률 x 100
+    표준화는 학습 시 계수에 흡수되어 원본 특성에 바로 적용
+    기여도 = 계수 x (특성값 - 평균 대체값), 평균적인 환자 대비 로그 오즈 변화
+    """
+
+    name = 'logistic'
+    contribution_unit = 'log_odds'
+
+    # 모델 파일 형식: 매직, 버전, 특성 수, 절편, 계수[n], 결측 대체값[n] (little-endian float64)
+    MAGIC = b'SPLR'
+    FORMAT_VERSION = 1
+    _HEADER = struct.Struct('<4sHH')
+
+    def __init__(self, intercept: float, coef: Iterable[float], impute: Iterable[float]):
+        self.intercept = float(intercept)
+        self.coef = np.asarray(list(coef), dtype=np.float64)
+        self.impute = np.asarray(list(impute), dtype=np.float64)
+        # 단건 점수용 파이썬 튜플 (NumPy 호출 오버헤드 회피)
+        self._coef = tuple(self.coef.tolist())
+        self._impute = tuple(self.impute.tolist())
+        self._baseline = self.intercept + float(np.dot(self.coef, self.impute))
+
+    @classmethod
+    def train(cls, X: np.ndarray, y: np.ndarray, l2: float = 1e-2,
+              max_iter: int = 50, tol: float = 1e-8) -> 'LogisticScoringEngine':
+        """
+        뉴턴-랩슨(IRLS) 방식 L2 정규화 로지스틱 회귀 학습
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        impute = np.nanmean(X, axis=0)
+        impute = np.where(np.isnan(impute), 0.0, impute)
+        X = np.where(np.isnan(X), impute, X)
+
+        mean = X.mean(axis=0)
+        std = X.std(axis=0)
+        std[std == 0] = 1.0
+        Z = np.hstack([np.ones((X.shape[0], 1)), (X - mean) / std])
+
+        penalty = np.full(Z.shape[1], l2)
+        penalty[0] = 0.0  # 절편은 정규화하지 않음
+        w = np.zeros(Z.shape[1])
+        for _ in range(max_iter):
+            p = 1.0 / (1.0 + np.exp(-(Z @ w)))
+            gradient = Z.T @ (p - y) + penalty * w
+            hessian = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(penalty)
+            step = np.linalg.solve(hessian, gradient)
+            w -= step
+            if np.max(np.abs(step)) < tol:
+                break
+
+        coef = w[1:] / std
+        intercept = w[0] - float(np.sum(coef * mean))
+        return cls(intercept, coef, impute)
+
+    def score_with_contributions(self, health_data: HealthData) -> Tuple[float, Tuple[float, ...]]:
+        # 평균 대체값 기준 로그 오즈: 절편 + sum(계수 x 대체값) + sum(기여도)
+        z = self._baseline
+        contributions = []
+        for value, weight, fill in zip(encode_health_data(health_data), self._coef, self._impute):
+            contribution = 0.0 if value != value else weight * (value - fill)  # NaN이면 0
+            contributions.append(contribution)
+            z += contribution
+        if z < -500:
+            return 0.0, tuple(contributions)
+        return round_score(100.0 / (1.0 + math.exp(-z))), tuple(contributions)
+
+    def score_batch_with_contributions(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        X = np.where(np.isnan(X), self.impute, X)
+        contributions = (X - self.impute) * self.coef
+        # 단건 경로와 같은 순서로 합산
+        z = np.full(len(X), self._baseline, dtype=np.float64)
+        for column in contributions.T:
+            z += column
+        return np.round(100.0 / (1.0 + np.exp(-z)), 2), contributions
+
+    def save(self, path: str):
+        """계수를 compact 바이너리 파일로 저장"""
+        n = len(self._coef)
+        with open(path, 'wb') as f:
+            f.write(self._HEADER.pack(self.MAGIC, self.FORMAT_VERSION, n))
+            f.write(struct.pack(f'<{1 + 2 * n}d', self.intercept, *self._coef, *self._impute))
+
+    @classmethod
+    def load(cls, path: str) -> 'LogisticScoringEngine':
+        """저장된 모델 파일 로드"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, n = cls._HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 모델 파일입니다: {path}")
+        if n != len(FACTORS):
+            raise ValueError(f"모델 특성 수가 맞지 않습니다: {n} != {len(FACTORS)}")
+        values = struct.unpack_from(f'<{1 + 2 * n}d', data, cls._HEADER.size)
+        return cls(values[0], values[1:1 + n], values[1 + n:])
+
+
+def load_engine(model_path: Optional[str] = None) -> ScoringEngine:
+    """
+    모델 경로를 지정하면 로지스틱 엔진, 지정하지 않으면 가중치 기반 엔진 반환
+    경로를 지정했는데 파일이 없거나 읽을 수 없으면 예외 (다른 점수를 조용히 내보내지 않도록)
+    """
+    if not model_path:
+        return HeuristicScoringEngine()
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"모델 파일을 찾을 수 없습니다: {model_path}")
+    return LogisticScoringEngine.load(model_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="뇌졸중 위험도 점수 모델 학습")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help="로지스틱 회귀 모델 학습")
+    train_parser.add_argument('dataset', help="라벨(stroke)이 있는 CSV 파일")
+    train_parser.add_argument('output', help="모델 파일 저장 경로")
+    train_parser.add_argument('--l2', type=float, default=1e-2, help="L2 정규화 계수")
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.dataset)
+    engine = LogisticScoringEngine.train(X, y, l2=args.l2)
+    engine.save(args.output)
+    print(f"✓ 학습 완료: {len(y)}건 (양성 {int(y.sum())}건)")
+    print(f"  - 절편: {engine.intercept:.4f}")
+    for factor, weight in zip(FACTORS, engine._coef):
+        print(f"  - {factor}: {weight:.4f}")
+    print(f"✓ 모델 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Stroke Prediction System - Full-Text Search
+메시지 / 의사 진단 메모 / 처방 메모 전문 검색
+
+문자 n-gram(토큰별 1-gram, 2-gram) 역색인이라 형태소 분석기 없이 한국어 부분 문자열 검색 가능.
+문서는 추가 순서대로 정수 ID를 받으므로 게시 목록(posting list)은 정렬된 추가 전용 배열이며,
+검색은 가장 짧은 게시 목록부터 NumPy 이진 탐색으로 교집합을 구하고 BM25로 순위를 매김.
+색인은 사용자(메시지 발신자/수신자, 메모 작성 의사)와 문서 종류별로 나뉘어 있어
+검색은 조회하는 사용자의 문서만 확인
+"""
+
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import Doctor, Message
+
+
+# 문서 종류
+DOCUMENT_KINDS = ('message', 'consultation_note', 'prescription')
+
+# Doctor 메모 목록 속성 / 항목 본문 키
+NOTE_FIELDS = {
+    'consultation_note': ('consultation_notes', 'note'),
+    'prescription': ('prescriptions', 'prescription')
+}
+
+_TOKEN = re.compile(r'\w+')
+
+# 게시 목록 항목당 최대 출현 횟수 (uint16)
+_MAX_TF = 0xFFFF
+
+
+def document_grams(text: str) -> Counter:
+    """문서 n-gram 출현 횟수 (소문자 토큰별 1-gram + 2-gram)"""
+    grams = Counter()
+    for token in _TOKEN.findall(text.lower()):
+        grams.update(token)
+        grams.update(token[i:i + 2] for i in range(len(token) - 1))
+    return grams
+
+
+def query_grams(query: str) -> List[str]:
+    """
+    검색어 n-gram (두 글자 이상 토큰은 2-gram, 한 글자 토큰은 1-gram)
+    모든 n-gram을 포함한 문서만 검색 결과에 포함
+    """
+    grams = []
+    for token in _TOKEN.findall(query.lower()):
+        if len(token) == 1:
+            grams.append(token)
+        else:
+            grams.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return list(dict.fromkeys(grams))
+
+
+class TextIndex:
+    """
+    n-gram 역색인 (BM25 순위)
+    문서는 (키, 본문, 참조 객체)로 추가하며 같은 키는 한 번만 색인
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}  # n-gram -> (문서 ID, 출현 횟수)
+        self._keys: Dict[Hashable, int] = {}
+        self._refs: List[Any] = []
+        self._lengths = array('I')
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def add(self, key: Hashable, text: str, ref: Any) -> bool:
+        """문서 색인 (이미 색인된 키면 False)"""
+        if key in self._keys:
+            return False
+        doc_id = len(self._refs)
+        self._keys[key] = doc_id
+        self._refs.append(ref)
+
+        grams = document_grams(text)
+        length = sum(grams.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for gram, count in grams.items():
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = (array('I'), array('H'))
+            posting[0].append(doc_id)
+            posting[1].append(min(count, _MAX_TF))
+        return True
+
+    def _bm25(self, docs: np.ndarray, tf: np.ndarray, df: int) -> np.ndarray:
+        n = len(self._refs)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)[docs]
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / (self._total_length / n))
+        tf = tf.astype(np.float64)
+        return idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[Any, float]]:
+        """검색어의 모든 n-gram을 포함한 문서를 점수 순으로 최대 limit개 (참조 객체, 점수)"""
+        grams = query_grams(query)
+        if not grams or not self._refs:
+            return []
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=lambda posting: len(posting[0]))
+
+        # 가장 짧은 게시 목록을 후보로 시작해 나머지 목록에서 이진 탐색으로 교집합
+        doc_ids, counts = postings[0]
+        docs = np.frombuffer(doc_ids, dtype=np.uint32)
+        scores = self._bm25(docs, np.frombuffer(counts, dtype=np.uint16), len(docs))
+        for doc_ids, counts in postings[1:]:
+            other = np.frombuffer(doc_ids, dtype=np.uint32)
+            positions = np.searchsorted(other, docs)
+            positions[positions == len(other)] = 0
+            found = other[positions] == docs
+            docs, scores, positions = docs[found], scores[found], positions[found]
+            if not len(docs):
+                return []
+            tf = np.frombuffer(counts, dtype=np.uint16)[positions]
+            scores = scores + self._bm25(docs, tf, len(other))
+
+        if len(docs) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            docs, scores = docs[top], scores[top]
+        # 점수 내림차순, 같은 점수는 최신 문서 우선
+        order = np.lexsort((-docs.astype(np.int64), -scores))
+        return [(self._refs[int(docs[i])], float(scores[i])) for i in order]
+
+
+class SearchIndex:
+    """
+    사용자별 전문 검색 인덱스
+    population: 대상 사용자 목록을 반환하는 함수 (rebuild 시 의사 메모 전체 색인)
+    messages: 전체 메시지를 반환하는 함수 (rebuild 시 전체 색인)
+    API 서버는 시작 시 작업 풀에서 rebuild (구축 전에 검색하면 첫 검색에서 구축)
+    """
+
+    def __init__(self, population: Callable[[], Iterable], messages: Callable[[], Iterable[Message]]):
+        self._population = population
+        self._messages = messages
+        self._lock = threading.Lock()
+        self._built = False
+        self._indexes: Dict[Tuple[str, str], TextIndex] = {}  # (사용자 ID, 문서 종류) -> 색인
+
+    def _index(self, user_id: str, kind: str) -> TextIndex:
+        index = self._indexes.get((user_id, kind))
+        if index is None:
+            index = self._indexes[(user_id, kind)] = TextIndex()
+        return index
+
+    def _add_message(self, message: Message):
+        text = f"{message.subject}\n{message.content}"
+        for user_id in {message.from_user_id, message.to_user_id}:
+            self._index(user_id, 'message').add(message.message_id, text, message)
+
+    def _add_note(self, doctor: Doctor, kind: str, patient_id: str, position: int):
+        attribute, field = NOTE_FIELDS[kind]
+        entry = getattr(doctor, attribute)[patient_id][position]
+        self._index(doctor.user_id, kind).add((patient_id, position), entry[field], (patient_id, entry))
+
+    def rebuild(self):
+        """전체 메시지 / 의사 메모 색인"""
+        with self._lock:
+            self._indexes = {}
+            for message in sorted(self._messages(), key=lambda m: m.timestamp):
+                self._add_message(message)
+            for user in self._population():
+                if not isinstance(user, Doctor):
+                    continue
+                for kind, (attribute, _) in NOTE_FIELDS.items():
+                    for patient_id, entries in getattr(user, attribute).items():
+                        for position in range(len(entries)):
+                            self._add_note(user, kind, patient_id, position)
+            self._built = True
+
+    def add_message(self, message: Message):
+        """새 메시지 색인 (구축 전이면 첫 검색 시 전체 색인에 포함)"""
+        if not self._built:
+            return
+        with self._lock:
+            self._add_message(message)
+
+    def add_note(self, doctor: Doctor, kind: str, patient_id: str):
+        """의사가 방금 추가한 진단/처방 메모 색인"""
+        if not self._built:
+            return
+        attribute, _ = NOTE_FIELDS[kind]
+        with self._lock:
+            self._add_note(doctor, kind, patient_id, len(getattr(doctor, attribute)[patient_id]) - 1)
+
+    def search(self, user_id: str, query: str, limit: int = 20,
+               kinds: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        사용자가 보낸/받은 메시지와 작성한 메모 검색 (점수 순)
+        kinds: 문서 종류 제한 (기본: 전체)
+        """
+        if not self._built:
+            self.rebuild()
+        with self._lock:
+            hits = []
+            for kind in (kinds or DOCUMENT_KINDS):
+                index = self._indexes.get((user_id, kind))
+                if index is not None:
+                    hits.extend((score, kind, ref) for ref, score in index.search(query, limit))
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+
+        results = []
+        for score, kind, ref in hits[:limit]:
+            if kind == 'message':
+                results.append({'type': kind, 'score': round(score, 4), 'message': ref.to_dict()})
+            else:
+                patient_id, entry = ref
+                results.append({
+                    'type': kind,
+                    'score': round(score, 4),
+                    'patient_id': patient_id,
+                    'content': entry[NOTE_FIELDS[kind][1]],
+                    'timestamp': entry['timestamp']
+                })
+        return results
+
+    def get_stats(self) -> Dict:
+        """색인 구축 여부, 분할 색인 수, 색인 항목 수 (메시지는 발신자/수신자에 각각 색인)"""
+        with self._lock:
+            return {
+                'built': self._built,
+                'documents': sum(len(index) for index in self._indexes.values()),
+                'partitions': len(self._indexes)
+            }
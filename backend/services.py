@@ -7,16 +7,224 @@ Stroke Prediction System - Service Layer
 - DataAnalyzer: 데이터 분석
 - NotificationService: 알림 서비스
 - SharingService: 데이터 공유 서비스
+- PolicyService: 위험 임계치 정책 스냅샷 및 재분류 작업
+- NotificationDigest: 수신자별 알림 요약 발송
+- SharingGraph: 환자 <-> 보호자/의사 공유 관계 양방향 인덱스
 """
 
-from typing import Dict, List, Optional
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
+
+import numpy as np
+
 from models import (
     Patient, Caregiver, Doctor, Administrator,
     HealthData, RiskAssessment, FASTTest,
     Message, Notification, Alert,
-    RiskLevel, UserRole
+    RiskLevel, UserRole, valid_risk_thresholds
 )
+from scoring import ScoringEngine, HeuristicScoringEngine, feature_matrix
+from inbox import MessageStore
+from archive import HistoryArchive
+
+
+class RiskPolicy:
+    """
+    위험 임계치 정책 스냅샷 (불변)
+    새 정책은 버전을 올린 새 스냅샷으로 교체
+    """
+
+    __slots__ = ('version', 'high', 'medium')
+
+    def __init__(self, version: int, high: float, medium: float):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'high', high)
+        object.__setattr__(self, 'medium', medium)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RiskPolicy는 변경할 수 없습니다")
+
+    def classify(self, score: float) -> RiskLevel:
+        """점수 기반 위험도 수준 결정"""
+        if score >= self.high:
+            return RiskLevel.HIGH
+        elif score >= self.medium:
+            return RiskLevel.MEDIUM
+        else:
+            return RiskLevel.LOW
+
+    def to_dict(self) -> Dict:
+        """딕셔너리로 변환"""
+        return {'version': self.version, 'high': self.high, 'medium': self.medium}
+
+
+class ReclassificationJob:
+    """
+    위험도 재분류 백그라운드 작업
+    저장된 최신 평가 점수를 청크 단위로 벡터화 비교하여 위험도 수준만 갱신 (재계산 없음)
+    """
+
+    LEVEL_CODES = (RiskLevel.LOW, RiskLevel.MEDIUM, RiskLevel.HIGH)
+
+    _id_counter = itertools.count(1)
+
+    def __init__(self, population: Callable[[], Iterable], policy: RiskPolicy,
+                 chunk_size: int = 10000,
+                 on_progress: Optional[Callable[['ReclassificationJob'], None]] = None):
+        self.job_id = f"RECLASSIFY_{next(self._id_counter)}"
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self._population = population
+        self.status = 'pending'  # pending, running, completed, superseded, failed
+        self.total = 0
+        self.processed = 0
+        self.changed = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._thread = threading.Thread(target=self._run, name=self.job_id, daemon=True)
+
+    def start(self) -> 'ReclassificationJob':
+        """백그라운드 스레드에서 작업 시작"""
+        self._thread.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None):
+        """작업 완료 대기"""
+        self._thread.join(timeout)
+
+    def _run(self):
+        self.status = 'running'
+        self.started_at = datetime.now()
+        try:
+            assessments = [
+                user.risk_assessments[-1] for user in self._population()
+                if isinstance(user, Patient) and user.risk_assessments
+            ]
+            self.total = len(assessments)
+            level_index = {level: code for code, level in enumerate(self.LEVEL_CODES)}
+            for start in range(0, self.total, self.chunk_size):
+                # 더 새로운 정책이 게시되면 해당 작업에 맡기고 중단
+                if PolicyService.current().version != self.policy.version:
+                    self.status = 'superseded'
+                    return
+                chunk = assessments[start:start + self.chunk_size]
+                scores = np.fromiter((a.score for a in chunk), dtype=np.float64, count=len(chunk))
+                old_codes = np.fromiter((level_index[a.risk_level] for a in chunk),
+                                        dtype=np.int8, count=len(chunk))
+                new_codes = ((scores >= self.policy.medium).astype(np.int8)
+                             + (scores >= self.policy.high).astype(np.int8))
+                for i in np.flatnonzero(new_codes != old_codes):
+                    assessment = chunk[i]
+                    risk_level = self.LEVEL_CODES[new_codes[i]]
+                    assessment.risk_level = risk_level
+                    assessment.set_recommendations(
+                        RiskCalculator.lookup_recommendations(risk_level, assessment.risk_factor_mask)
+                    )
+                self.changed += int(np.count_nonzero(new_codes != old_codes))
+                for assessment in chunk:
+                    assessment.policy_version = self.policy.version
+                self.processed += len(chunk)
+                if self.on_progress:
+                    self.on_progress(self)
+            self.status = 'completed'
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+        finally:
+            self.finished_at = datetime.now()
+
+    def get_progress(self) -> Dict:
+        """진행 상황 반환"""
+        return {
+            'job_id': self.job_id,
+            'policy': self.policy.to_dict(),
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'changed': self.changed,
+            'progress': round(self.processed / self.total * 100, 2) if self.total else
+                        (100.0 if self.status == 'completed' else 0.0),
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class PolicyService:
+    """
+    위험 임계치 정책 서비스
+    관리자 정책 변경을 버전 스냅샷으로 게시하고 최신 평가를 재분류
+    """
+
+    _current = RiskPolicy(1, 70, 40)
+    _lock = threading.Lock()
+    _jobs: Dict[str, ReclassificationJob] = {}
+    _latest_job: Optional[ReclassificationJob] = None
+
+    @classmethod
+    def current(cls) -> RiskPolicy:
+        """현재 정책 스냅샷 (참조 교체만 일어나므로 락 없이 읽기)"""
+        return cls._current
+
+    @classmethod
+    def publish(cls, thresholds: Dict) -> RiskPolicy:
+        """새 임계치 정책 게시 (0 <= medium < high <= 100이 아니면 ValueError)"""
+        if not valid_risk_thresholds(thresholds['high'], thresholds['medium']):
+            raise ValueError(f"잘못된 위험 임계치입니다: {thresholds}")
+        with cls._lock:
+            policy = RiskPolicy(cls._current.version + 1, thresholds['high'], thresholds['medium'])
+            cls._current = policy
+        return policy
+
+    @classmethod
+    def restore(cls, policy: Dict):
+        """
+        저장된 정책 복원 (스냅샷/이벤트 로그 재생 시, 재분류 없이 버전과 임계치만)
+        재시작 후 새 정책 버전이 이미 저장된 평가의 정책 버전과 겹치지 않도록 함
+        """
+        with cls._lock:
+            cls._current = RiskPolicy(policy['version'], policy['high'], policy['medium'])
+
+    @classmethod
+    def attach(cls, admin: Administrator, population: Callable[[], Iterable]):
+        """
+        관리자 정책 변경 연결
+        population: 재분류 대상 사용자 목록을 반환하는 함수
+        """
+        def on_policy_change(administrator: Administrator):
+            thresholds = administrator.alert_policies['risk_thresholds']
+            current = cls.current()
+            if (thresholds['high'], thresholds['medium']) == (current.high, current.medium):
+                return
+            cls.start_reclassification(population, cls.publish(thresholds))
+
+        admin.add_policy_listener(on_policy_change)
+        on_policy_change(admin)
+
+    @classmethod
+    def start_reclassification(cls, population: Callable[[], Iterable],
+                               policy: Optional[RiskPolicy] = None) -> ReclassificationJob:
+        """재분류 작업 시작"""
+        job = ReclassificationJob(population, policy or cls.current())
+        cls._jobs[job.job_id] = job
+        cls._latest_job = job
+        return job.start()
+
+    @classmethod
+    def get_job(cls, job_id: str) -> Optional[ReclassificationJob]:
+        """재분류 작업 조회"""
+        return cls._jobs.get(job_id)
+
+    @classmethod
+    def latest_job(cls) -> Optional[ReclassificationJob]:
+        """가장 최근 재분류 작업"""
+        return cls._latest_job
 
 
 class RiskCalculator:
@@ -24,129 +232,240 @@ class RiskCalculator:
     위험도 계산 서비스
     건강 데이터를 기반으로 뇌졸중 위험도 계산
     """
+
+    # 위험도별 기본 권장사항
+    BASE_RECOMMENDATIONS: Dict[RiskLevel, List[str]] = {
+        RiskLevel.HIGH: [
+            "🏥 즉시 의료 전문가 상담이 필요합니다",
+            "혈압과 혈당을 정기적으로 모니터링하세요",
+            "처방된 약을 정확히 복용하세요"
+        ],
+        RiskLevel.MEDIUM: [
+            "⚠️ 정기적인 건강 관리가 필요합니다",
+            "3개월마다 의료 전문가와 상담하세요",
+            "주 3-4회 중등도 운동을 하세요"
+        ],
+        RiskLevel.LOW: [
+            "✓ 현재 건강 상태를 유지하세요",
+            "3-6개월마다 정기적으로 재평가하세요",
+            "규칙적인 운동을 계속하세요"
+        ]
+    }
+
+    # 특정 위험 요인에 대한 맞춤 권장사항 (비트 순서 = 튜플 순서)
+    FACTOR_RECOMMENDATIONS: Tuple[Tuple[str, str], ...] = (
+        ('hypertension', "염분 섭취를 줄이세요"),
+        ('high_glucose', "당 섭취를 제한하고 혈당을 관리하세요"),
+        ('high_bmi', "체중 감량을 통해 BMI를 정상 범위로 낮추세요"),
+        ('smoker', "금연을 시작하세요")
+    )
+
+    # (RiskLevel, 위험 요인 비트마스크) -> 권장사항 튜플, 모든 인스턴스가 공유
+    _recommendation_table: Dict[tuple, tuple] = {}
+
+    # 권장사항 문구 버전 (문구 변경 시 증가, 평가 캐시 키에 포함)
+    _content_version = 0
     
-    def __init__(self):
-        # 위험 요인별 가중치
-        self.weights = {
-            'age': 0.15,
-            'hypertension': 0.20,
-            'heart_disease': 0.20,
-            'glucose': 0.15,
-            'bmi': 0.15,
-            'smoking': 0.15
-        }
+    def __init__(self, engine: Optional[ScoringEngine] = None, cache_size: int = 4096):
+        # 동일 입력 재제출용 LRU 캐시
+        # (정규화 입력, 정책 버전, 문구 버전) -> (점수, 기여도, 위험도, 비트마스크, 권장사항)
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        # 점수 엔진 (기본: 가중치 기반)
+        self.engine = engine or HeuristicScoringEngine()
+    
+    @property
+    def engine(self) -> ScoringEngine:
+        return self._engine
+    
+    @engine.setter
+    def engine(self, engine: ScoringEngine):
+        """엔진 교체 시 캐시된 점수 무효화"""
+        self._engine = engine
+        self.clear_cache()
+    
+    @property
+    def weights(self) -> Optional[Dict[str, float]]:
+        """가중치 기반 엔진의 위험 요인별 가중치"""
+        return getattr(self.engine, 'weights', None)
     
     def calculate_risk_score(self, health_data: HealthData) -> float:
         """
         위험도 점수 계산 (0-100)
         """
-        score = 0.0
-        
-        # 나이 점수 (나이가 높을수록 위험)
-        age_score = min((health_data.age / 100) * 100, 100)
-        score += age_score * self.weights['age']
-        
-        # 고혈압 점수
-        hypertension_score = 100 if health_data.hypertension == 1 else 0
-        score += hypertension_score * self.weights['hypertension']
-        
-        # 심장질환 점수
-        heart_disease_score = 100 if health_data.heart_disease == 1 else 0
-        score += heart_disease_score * self.weights['heart_disease']
-        
-        # 혈당 점수 (정상 범위: 70-100 mg/dL)
-        if health_data.avg_glucose_level:
-            if health_data.avg_glucose_level > 125:
-                glucose_score = min(((health_data.avg_glucose_level - 125) / 175) * 100, 100)
-            elif health_data.avg_glucose_level < 70:
-                glucose_score = min(((70 - health_data.avg_glucose_level) / 70) * 100, 100)
-            else:
-                glucose_score = 0
-            score += glucose_score * self.weights['glucose']
-        
-        # BMI 점수 (정상 범위: 18.5-24.9)
-        if health_data.bmi:
-            if health_data.bmi > 30:
-                bmi_score = min(((health_data.bmi - 30) / 20) * 100, 100)
-            elif health_data.bmi < 18.5:
-                bmi_score = min(((18.5 - health_data.bmi) / 18.5) * 100, 100)
-            else:
-                bmi_score = 0
-            score += bmi_score * self.weights['bmi']
-        
-        # 흡연 점수
-        smoking_scores = {
-            'never smoked': 0,
-            'formerly smoked': 50,
-            'smokes': 100
-        }
-        smoking_score = smoking_scores.get(health_data.smoking_status, 0)
-        score += smoking_score * self.weights['smoking']
-        
-        return round(score, 2)
+        return self.engine.score(health_data)
     
-    def determine_risk_level(self, score: float) -> RiskLevel:
+    def calculate_risk_score_with_contributions(self, health_data: HealthData) -> Tuple[float, Tuple[float, ...]]:
         """
-        점수 기반 위험도 수준 결정
+        위험도 점수와 요인별 기여도 (RISK_FACTORS 순서) 계산
         """
-        if score >= 70:
-            return RiskLevel.HIGH
-        elif score >= 40:
-            return RiskLevel.MEDIUM
-        else:
-            return RiskLevel.LOW
+        return self.engine.score_with_contributions(health_data)
     
-    def generate_recommendations(self, health_data: HealthData, risk_level: RiskLevel) -> List[str]:
+    def calculate_risk_scores(self, records: List[HealthData], with_contributions: bool = False):
         """
-        위험도 및 건강 데이터 기반 권장사항 생성
+        여러 건강 데이터의 위험도 점수 일괄 계산 (0-100)
+        with_contributions=True이면 (점수 배열, (n, 요인 수) 기여도 행렬) 반환
         """
-        recommendations = []
-        
-        if risk_level == RiskLevel.HIGH:
-            recommendations.append("🏥 즉시 의료 전문가 상담이 필요합니다")
-            recommendations.append("혈압과 혈당을 정기적으로 모니터링하세요")
-            recommendations.append("처방된 약을 정확히 복용하세요")
-        elif risk_level == RiskLevel.MEDIUM:
-            recommendations.append("⚠️ 정기적인 건강 관리가 필요합니다")
-            recommendations.append("3개월마다 의료 전문가와 상담하세요")
-            recommendations.append("주 3-4회 중등도 운동을 하세요")
-        else:
-            recommendations.append("✓ 현재 건강 상태를 유지하세요")
-            recommendations.append("3-6개월마다 정기적으로 재평가하세요")
-            recommendations.append("규칙적인 운동을 계속하세요")
-        
-        # 특정 위험 요인에 대한 맞춤 권장사항
+        X = feature_matrix(records)
+        if with_contributions:
+            return self.engine.score_batch_with_contributions(X)
+        return self.engine.score_batch(X)
+    
+    def determine_risk_level(self, score: float, policy: Optional[RiskPolicy] = None) -> RiskLevel:
+        """
+        점수 기반 위험도 수준 결정 (관리자 임계치 정책 스냅샷 사용)
+        """
+        return (policy or PolicyService.current()).classify(score)
+    
+    @classmethod
+    def set_recommendation_content(cls, base: Optional[Dict[RiskLevel, List[str]]] = None,
+                                   factors: Optional[Dict[str, str]] = None):
+        """
+        권장사항 문구 변경 후 조회 테이블 재생성
+        base: {RiskLevel: [문구, ...]}, factors: {'hypertension'|'high_glucose'|'high_bmi'|'smoker': 문구}
+        """
+        if base:
+            cls.BASE_RECOMMENDATIONS = {**cls.BASE_RECOMMENDATIONS, **base}
+        if factors:
+            cls.FACTOR_RECOMMENDATIONS = tuple(
+                (factor, factors.get(factor, text)) for factor, text in cls.FACTOR_RECOMMENDATIONS
+            )
+        cls._recommendation_table = cls._build_recommendation_table()
+        cls._content_version += 1
+
+    @classmethod
+    def _build_recommendation_table(cls) -> Dict[tuple, tuple]:
+        """
+        위험도 3종 x 위험 요인 조합 16종의 권장사항 튜플을 미리 생성
+        """
+        table = {}
+        for risk_level, base in cls.BASE_RECOMMENDATIONS.items():
+            for mask in range(1 << len(cls.FACTOR_RECOMMENDATIONS)):
+                factor_texts = tuple(
+                    text for bit, (_, text) in enumerate(cls.FACTOR_RECOMMENDATIONS)
+                    if mask & (1 << bit)
+                )
+                table[(risk_level, mask)] = tuple(base) + factor_texts
+        return table
+
+    @staticmethod
+    def get_risk_factor_mask(health_data: HealthData) -> int:
+        """
+        맞춤 권장사항 대상 위험 요인 비트마스크
+        (고혈압, 고혈당, 고BMI, 흡연 순서)
+        """
+        mask = 0
         if health_data.hypertension == 1:
-            recommendations.append("염분 섭취를 줄이세요")
-        
+            mask |= 1
         if health_data.avg_glucose_level and health_data.avg_glucose_level > 125:
-            recommendations.append("당 섭취를 제한하고 혈당을 관리하세요")
-        
+            mask |= 2
         if health_data.bmi and health_data.bmi > 30:
-            recommendations.append("체중 감량을 통해 BMI를 정상 범위로 낮추세요")
-        
+            mask |= 4
         if health_data.smoking_status == 'smokes':
-            recommendations.append("금연을 시작하세요")
-        
-        return recommendations
+            mask |= 8
+        return mask
+
+    @classmethod
+    def lookup_recommendations(cls, risk_level: RiskLevel, risk_factor_mask: int) -> Tuple[str, ...]:
+        """위험도와 위험 요인 비트마스크로 권장사항 튜플 조회"""
+        return cls._recommendation_table[(risk_level, risk_factor_mask)]
+
+    def generate_recommendations(self, health_data: HealthData, risk_level: RiskLevel) -> Tuple[str, ...]:
+        """
+        위험도 및 건강 데이터 기반 권장사항 생성
+        미리 생성된 테이블의 공유 튜플을 반환하므로 수정하지 말 것
+        """
+        return self.lookup_recommendations(risk_level, self.get_risk_factor_mask(health_data))
     
-    def assess_risk(self, patient: Patient, health_data: HealthData) -> RiskAssessment:
+    def _evaluate(self, health_data: HealthData, policy: RiskPolicy) -> tuple:
         """
-        종합 위험도 평가 수행
+        (점수, 기여도, 위험도, 비트마스크, 권장사항) 계산
+        같은 정책/문구 버전에서 점수 입력이 같은 제출은 LRU 캐시에서 반환
         """
-        # 위험도 점수 계산
-        score = self.calculate_risk_score(health_data)
+        if self.cache_size <= 0:
+            return self._compute(health_data, policy)
         
-        # 위험도 수준 결정
-        risk_level = self.determine_risk_level(score)
+        # 점수/권장사항에 쓰이는 입력 필드만 키로 사용 (미입력 혈당/BMI는 None)
+        key = (
+            health_data.age, health_data.hypertension, health_data.heart_disease,
+            health_data.avg_glucose_level or None, health_data.bmi or None,
+            health_data.smoking_status, policy.version, self._content_version
+        )
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self._cache_hits += 1
+                return result
+            self._cache_misses += 1
+        
+        result = self._compute(health_data, policy)
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+    
+    def _compute(self, health_data: HealthData, policy: RiskPolicy) -> tuple:
+        score, contributions = self.calculate_risk_score_with_contributions(health_data)
+        risk_level = self.determine_risk_level(score, policy)
+        mask = self.get_risk_factor_mask(health_data)
+        return score, contributions, risk_level, mask, self.lookup_recommendations(risk_level, mask)
+    
+    def evaluate(self, health_data: HealthData) -> Tuple[float, RiskLevel, Tuple[str, ...]]:
+        """
+        환자 기록 없이 점수, 위험도, 권장사항만 계산 (캐시 사용)
+        """
+        score, _, risk_level, _, recommendations = self._evaluate(health_data, PolicyService.current())
+        return score, risk_level, recommendations
+    
+    def get_cache_stats(self) -> Dict:
+        """평가 캐시 크기 및 적중률"""
+        with self._cache_lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                'size': len(self._cache),
+                'max_size': self.cache_size,
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'hit_rate': round(self._cache_hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def clear_cache(self):
+        """평가 캐시 및 통계 초기화"""
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_hits = 0
+            self._cache_misses = 0
+    
+    def build_assessment(self, patient_id: str, health_data: HealthData) -> RiskAssessment:
+        """
+        위험도 평가 객체 생성 (환자 기록은 변경하지 않으므로 작업 스레드에서 실행 가능)
+        """
+        # 점수, 요인별 기여도, 위험도, 권장사항 계산 (평가 도중 정책이 바뀌어도 하나의 스냅샷 사용)
+        policy = PolicyService.current()
+        score, contributions, risk_level, mask, recommendations = self._evaluate(health_data, policy)
         
         # 위험도 평가 객체 생성
-        assessment = RiskAssessment(patient.user_id, health_data, score, risk_level)
+        assessment = RiskAssessment(patient_id, health_data, score, risk_level)
+        assessment.policy_version = policy.version
+        assessment.set_contributions(contributions, self.engine.contribution_unit)
+        
+        # 권장사항 설정 (공유 튜플)
+        assessment.risk_factor_mask = mask
+        assessment.set_recommendations(recommendations)
         
-        # 권장사항 생성 및 추가
-        recommendations = self.generate_recommendations(health_data, risk_level)
-        for rec in recommendations:
-            assessment.add_recommendation(rec)
+        return assessment
+    
+    def assess_risk(self, patient: Patient, health_data: HealthData) -> RiskAssessment:
+        """
+        종합 위험도 평가 수행
+        """
+        assessment = self.build_assessment(patient.user_id, health_data)
         
         # 환자에게 평가 추가
         patient.add_risk_assessment(assessment)
@@ -154,12 +473,35 @@ class RiskCalculator:
         return assessment
 
 
+RiskCalculator._recommendation_table = RiskCalculator._build_recommendation_table()
+
+
 class DataAnalyzer:
     """
     데이터 분석 서비스
     건강 데이터 트렌드 분석, 이상 지표 감지
     """
     
+    # 히스토리 아카이브 (설정 시 리포트/기간 조회에 오래된 기록 포함)
+    archive: Optional[HistoryArchive] = None
+    
+    @staticmethod
+    def full_history(patient: Patient, kind: str, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> List:
+        """
+        아카이브 + 메모리의 전체 히스토리 (kind: health_records, risk_assessments, fast_tests)
+        아카이브가 없으면 메모리 기록만 기간 필터 (락 없이 게시된 읽기 스냅샷 사용)
+        """
+        if DataAnalyzer.archive is not None:
+            return DataAnalyzer.archive.history(patient, kind, start, end)
+        records = getattr(patient.history_view(), kind)
+        if start is None and end is None:
+            return records
+        return [
+            record for record in records
+            if (start is None or record.timestamp >= start) and (end is None or record.timestamp <= end)
+        ]
+    
     @staticmethod
     def analyze_trend(health_records: List[HealthData], metric: str) -> Dict:
         """
@@ -198,6 +540,113 @@ class DataAnalyzer:
             'data_points': len(values)
         }
     
+    # 시계열 조회 지표 (건강 데이터 필드 또는 위험도 점수)
+    SERIES_METRICS = ('avg_glucose_level', 'bmi', 'risk_score')
+    
+    @staticmethod
+    def _series_arrays(patient: Patient, metric: str, start: Optional[datetime],
+                       end: Optional[datetime]) -> Tuple[np.ndarray, np.ndarray]:
+        """기간 내 지표 (epoch 초, 값) 배열, 시각 순 정렬 (미입력 값 제외)"""
+        if metric == 'risk_score':
+            assessments = DataAnalyzer.full_history(patient, 'risk_assessments', start, end)
+            pairs = [(a.timestamp.timestamp(), a.score) for a in assessments]
+        else:
+            records = DataAnalyzer.full_history(patient, 'health_records', start, end)
+            pairs = [(record.timestamp.timestamp(), getattr(record, metric)) for record in records]
+            pairs = [pair for pair in pairs if pair[1] is not None]
+        if not pairs:
+            return np.empty(0), np.empty(0)
+        data = np.array(pairs, dtype=np.float64)
+        times, values = data[:, 0], data[:, 1]
+        if np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind='stable')
+            times, values = times[order], values[order]
+        return times, values
+    
+    @staticmethod
+    def lttb_indices(times: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+        """
+        Largest-Triangle-Three-Buckets 다운샘플링: 차트 모양을 보존하는 threshold개 점의 위치
+        첫/마지막 점은 항상 포함, 가운데 구간마다 다음 구간 평균점과 만드는 삼각형이 가장 큰 점 선택
+        """
+        n = len(times)
+        if threshold >= n or threshold < 3:
+            return np.arange(n)
+        every = (n - 2) / (threshold - 2)
+        selected = np.empty(threshold, dtype=np.int64)
+        selected[0] = a = 0
+        for i in range(threshold - 2):
+            next_start = int((i + 1) * every) + 1
+            next_end = min(int((i + 2) * every) + 1, n)
+            avg_time = times[next_start:next_end].mean()
+            avg_value = values[next_start:next_end].mean()
+            
+            start = int(i * every) + 1
+            stop = next_start
+            areas = np.abs(
+                (times[a] - avg_time) * (values[start:stop] - values[a])
+                - (times[a] - times[start:stop]) * (avg_value - values[a])
+            )
+            a = start + int(np.argmax(areas))
+            selected[i + 1] = a
+        selected[-1] = n - 1
+        return selected
+    
+    @staticmethod
+    def bucket_summary(times: np.ndarray, values: np.ndarray, buckets: int) -> List[Dict]:
+        """기간을 buckets개 같은 시간 구간으로 나눠 구간별 최소/최대/평균 (빈 구간 제외)"""
+        if not len(times):
+            return []
+        edges = np.linspace(times[0], times[-1], buckets + 1)
+        bounds = np.searchsorted(times, edges[1:-1], side='left')
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(times)]))
+        nonempty = ends > starts
+        starts, ends = starts[nonempty], ends[nonempty]
+        counts = ends - starts
+        minimums = np.minimum.reduceat(values, starts)
+        maximums = np.maximum.reduceat(values, starts)
+        means = np.add.reduceat(values, starts) / counts
+        bucket_starts = edges[:-1][nonempty]
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(t).isoformat(),
+                'min': round(float(lo), 4),
+                'max': round(float(hi), 4),
+                'mean': round(float(mean), 4),
+                'count': int(count)
+            }
+            for t, lo, hi, mean, count in zip(bucket_starts, minimums, maximums, means, counts)
+        ]
+    
+    @staticmethod
+    def get_series(patient: Patient, metric: str, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None, points: int = 200, method: str = 'lttb') -> Dict:
+        """
+        차트용 지표 시계열 (서버에서 points개 이하로 다운샘플링)
+        method: 'lttb' (원본 점 중 선택) 또는 'bucket' (시간 구간별 최소/최대/평균)
+        """
+        if metric not in DataAnalyzer.SERIES_METRICS:
+            raise ValueError(f"지원하지 않는 지표입니다: {metric}")
+        if method not in ('lttb', 'bucket'):
+            raise ValueError(f"지원하지 않는 다운샘플링 방식입니다: {method}")
+        
+        times, values = DataAnalyzer._series_arrays(patient, metric, start, end)
+        if method == 'bucket':
+            series = DataAnalyzer.bucket_summary(times, values, points)
+        else:
+            series = [
+                {'timestamp': datetime.fromtimestamp(times[i]).isoformat(), 'value': round(float(values[i]), 4)}
+                for i in DataAnalyzer.lttb_indices(times, values, points)
+            ]
+        return {
+            'patient_id': patient.user_id,
+            'metric': metric,
+            'method': method,
+            'total_points': len(times),
+            'points': series
+        }
+    
     @staticmethod
     def detect_abnormal_indicators(health_data: HealthData) -> List[str]:
         """
@@ -239,15 +688,18 @@ class DataAnalyzer:
         개인 리포트 생성
         최근 건강 변화, 주요 위험 요인, 개인 목표 포함
         """
-        if not patient.health_records:
+        view = patient.history_view()
+        latest_health_data = view.latest_health_data
+        if latest_health_data is None:
             return {'status': 'no_data'}
         
-        latest_health_data = patient.get_latest_health_data()
-        latest_risk = patient.get_latest_risk_level()
+        latest_assessment = view.latest_assessment
+        latest_risk = latest_assessment.risk_level if latest_assessment else None
         
-        # 트렌드 분석
-        glucose_trend = DataAnalyzer.analyze_trend(patient.health_records, 'avg_glucose_level')
-        bmi_trend = DataAnalyzer.analyze_trend(patient.health_records, 'bmi')
+        # 트렌드 분석 (아카이브된 기록 포함)
+        health_records = DataAnalyzer.full_history(patient, 'health_records')
+        glucose_trend = DataAnalyzer.analyze_trend(health_records, 'avg_glucose_level')
+        bmi_trend = DataAnalyzer.analyze_trend(health_records, 'bmi')
         
         # 이상 지표 감지
         abnormalities = DataAnalyzer.detect_abnormal_indicators(latest_health_data)
@@ -256,7 +708,7 @@ class DataAnalyzer:
             'patient_id': patient.user_id,
             'report_date': datetime.now().isoformat(),
             'current_risk_level': latest_risk.value if latest_risk else 'Unknown',
-            'total_assessments': len(patient.risk_assessments),
+            'total_assessments': len(view.risk_assessments) + patient.archived_counts.get('risk_assessments', 0),
             'trends': {
                 'glucose': glucose_trend,
                 'bmi': bmi_trend
@@ -276,6 +728,24 @@ class NotificationService:
     정기 검사 알림, 위험 알림, 일반 알림 관리
     """
     
+    # 같은 (환자, 수신자, 경고 유형) 경고를 하나로 합치는 기간 (첫 발생 기준)
+    ALERT_COALESCE_WINDOW = timedelta(minutes=15)
+    
+    # 알림 요약 발송 파이프라인 (설정 시 중요하지 않은 알림은 수신자별로 모아서 전달)
+    digest: Optional['NotificationDigest'] = None
+    
+    @classmethod
+    def notify(cls, recipient, notification: Notification, critical: bool = False) -> Optional[Notification]:
+        """
+        수신자에게 알림 전달
+        critical이거나 요약 발송이 설정되지 않았으면 즉시 전달, 아니면 요약에 추가
+        즉시 전달되었거나 요약이 발송되면 전달된 알림 반환
+        """
+        if critical or cls.digest is None:
+            recipient.receive_notification(notification)
+            return notification
+        return cls.digest.add(recipient, notification)
+    
     @staticmethod
     def send_reminder(patient: Patient, reminder_type: str, message: str) -> Notification:
         """
@@ -324,6 +794,28 @@ class NotificationService:
         )
         return alert
     
+    @classmethod
+    def deliver_alert(cls, recipient, alert: Alert,
+                      window: Optional[timedelta] = None) -> Tuple[Alert, bool]:
+        """
+        수신자에게 경고 전달 (같은 환자/유형의 확인 전 경고가 기간 내에 있으면 병합)
+        (전달된 경고, 새 경고 여부) 반환 - 병합된 경우 새 푸시를 보내지 않음
+        """
+        window = window if window is not None else cls.ALERT_COALESCE_WINDOW
+        cutoff = alert.timestamp - window
+        # 경고 목록은 발생 순서이므로 기간 밖에 도달하면 중단
+        for existing in reversed(recipient.alerts_received):
+            if existing.timestamp < cutoff:
+                break
+            if (existing.patient_id == alert.patient_id
+                    and existing.alert_type == alert.alert_type
+                    and not existing.is_acknowledged):
+                existing.record_occurrence(alert.timestamp)
+                return existing, False
+        
+        recipient.receive_alert(alert)
+        return alert, True
+    
     @staticmethod
     def check_retest_due(patient: Patient, interval_days: int = 90) -> bool:
         """
@@ -338,54 +830,305 @@ class NotificationService:
         return days_since_last >= interval_days
 
 
+class NotificationDigest:
+    """
+    알림 요약 발송
+    수신자별로 중요하지 않은 알림을 모았다가 max_items건이 쌓이거나 첫 알림 후
+    interval_seconds가 지나면 요약 알림 하나로 전달 (한 건뿐이면 원래 알림 그대로 전달)
+    on_flush: 요약 전달 후 호출되는 함수 (수신자, 전달된 알림, 묶인 알림 수)
+    """
+
+    # 요약 본문에 그대로 보여줄 알림 수
+    PREVIEW_ITEMS = 5
+
+    def __init__(self, max_items: int = 50, interval_seconds: float = 3600.0,
+                 on_flush: Optional[Callable] = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_items = max_items
+        self.interval_seconds = interval_seconds
+        self.on_flush = on_flush
+        self._clock = clock
+        self._cond = threading.Condition()
+        # 수신자 ID -> (수신자, 대기 알림, 첫 알림 시각), 첫 알림 순서
+        self._pending: Dict[str, Tuple[object, List[Notification], float]] = {}
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.digests_sent = 0
+        self.notifications_batched = 0
+
+    def add(self, recipient, notification: Notification) -> Optional[Notification]:
+        """대기열에 추가, max_items에 도달하면 즉시 요약 전달 후 반환"""
+        with self._cond:
+            entry = self._pending.get(recipient.user_id)
+            if entry is None:
+                entry = (recipient, [], self._clock())
+                self._pending[recipient.user_id] = entry
+                if len(self._pending) == 1:
+                    self._cond.notify()
+            entry[1].append(notification)
+            if len(entry[1]) < self.max_items:
+                return None
+            del self._pending[recipient.user_id]
+        return self._deliver(recipient, entry[1])
+
+    @classmethod
+    def summarize(cls, user_id: str, notifications: List[Notification]) -> Notification:
+        """여러 알림을 제목별 건수와 최근 내용 미리보기로 요약"""
+        counts: Dict[str, int] = {}
+        for notification in notifications:
+            counts[notification.title] = counts.get(notification.title, 0) + 1
+        lines = [", ".join(f"{title} {count}건" for title, count in counts.items())]
+        lines.extend(f"- {n.message}" for n in notifications[-cls.PREVIEW_ITEMS:])
+        if len(notifications) > cls.PREVIEW_ITEMS:
+            lines.append(f"외 {len(notifications) - cls.PREVIEW_ITEMS}건")
+        return Notification(
+            user_id=user_id,
+            title=f"알림 요약 ({len(notifications)}건)",
+            message="\n".join(lines),
+            notification_type="digest"
+        )
+
+    def _deliver(self, recipient, notifications: List[Notification]) -> Notification:
+        delivered = notifications[0] if len(notifications) == 1 else \
+            self.summarize(recipient.user_id, notifications)
+        recipient.receive_notification(delivered)
+        with self._cond:
+            self.digests_sent += 1
+            self.notifications_batched += len(notifications)
+        if self.on_flush:
+            self.on_flush(recipient, delivered, len(notifications))
+        return delivered
+
+    def flush_due(self) -> List[Notification]:
+        """첫 알림 후 interval_seconds가 지난 수신자의 요약 전달"""
+        with self._cond:
+            cutoff = self._clock() - self.interval_seconds
+            due = []
+            # 삽입 순서 = 첫 알림 시각 순서이므로 기한 전 항목에서 중단
+            for recipient_id, entry in self._pending.items():
+                if entry[2] > cutoff:
+                    break
+                due.append(recipient_id)
+            entries = [self._pending.pop(recipient_id) for recipient_id in due]
+        return [self._deliver(recipient, notifications) for recipient, notifications, _ in entries]
+
+    def flush_all(self) -> List[Notification]:
+        """대기 중인 모든 요약 즉시 전달"""
+        with self._cond:
+            entries = list(self._pending.values())
+            self._pending.clear()
+        return [self._deliver(recipient, notifications) for recipient, notifications, _ in entries]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._pending:
+                        first_at = next(iter(self._pending.values()))[2]
+                        timeout = first_at + self.interval_seconds - self._clock()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    break
+            self.flush_due()
+        self.flush_all()
+
+    def start(self) -> 'NotificationDigest':
+        """백그라운드 스레드에서 주기적 요약 전달 시작"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="NotificationDigest", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """중지 (대기 중인 요약은 모두 전달)"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            self.flush_all()
+
+    def get_stats(self) -> Dict:
+        """대기 수신자/알림 수, 전달한 요약 수"""
+        with self._cond:
+            return {
+                'pending_recipients': len(self._pending),
+                'pending_notifications': sum(len(entry[1]) for entry in self._pending.values()),
+                'digests_sent': self.digests_sent,
+                'notifications_batched': self.notifications_batched
+            }
+
+
+class SharingGraph:
+    """
+    공유 관계 그래프
+    환자 -> 수신자, 수신자 -> 환자 양방향 인접 집합(삽입 순서 유지 dict)에 역할(보호자/의사)을
+    간선 태그로 저장. 공유/해제/공유 여부 확인은 O(1), 이웃 조회는 O(차수)
+    """
+
+    def __init__(self):
+        self._recipients: Dict[str, Dict[str, UserRole]] = {}  # 환자 ID -> {수신자 ID: 역할}
+        self._patients: Dict[str, Dict[str, UserRole]] = {}    # 수신자 ID -> {환자 ID: 역할}
+        self._edge_count = 0
+
+    def __len__(self) -> int:
+        return self._edge_count
+
+    def share(self, patient_id: str, recipient_id: str, role: UserRole) -> bool:
+        """공유 간선 추가 (새 간선이면 True, 이미 있으면 역할만 갱신하고 False)"""
+        recipients = self._recipients.setdefault(patient_id, {})
+        is_new = recipient_id not in recipients
+        recipients[recipient_id] = role
+        self._patients.setdefault(recipient_id, {})[patient_id] = role
+        if is_new:
+            self._edge_count += 1
+        return is_new
+
+    def revoke(self, patient_id: str, recipient_id: str) -> Optional[UserRole]:
+        """공유 해제, 해제된 간선의 역할 반환 (없으면 None)"""
+        role = self._recipients.get(patient_id, {}).pop(recipient_id, None)
+        if role is None:
+            return None
+        self._patients[recipient_id].pop(patient_id, None)
+        self._edge_count -= 1
+        return role
+
+    def is_shared(self, patient_id: str, recipient_id: str) -> bool:
+        """환자가 수신자에게 공유했는지 여부"""
+        return recipient_id in self._recipients.get(patient_id, ())
+
+    def get_role(self, patient_id: str, recipient_id: str) -> Optional[UserRole]:
+        """공유 간선의 역할"""
+        return self._recipients.get(patient_id, {}).get(recipient_id)
+
+    def recipients(self, patient_id: str, role: Optional[UserRole] = None) -> List[str]:
+        """환자가 공유한 수신자 ID 목록 (공유 순서, role로 필터)"""
+        edges = self._recipients.get(patient_id, {})
+        return [rid for rid, r in edges.items() if role is None or r == role]
+
+    def patients(self, recipient_id: str, role: Optional[UserRole] = None) -> List[str]:
+        """수신자에게 공유된 환자 ID 목록 (공유 순서, role로 필터)"""
+        edges = self._patients.get(recipient_id, {})
+        return [pid for pid, r in edges.items() if role is None or r == role]
+
+    def clear(self):
+        self._recipients.clear()
+        self._patients.clear()
+        self._edge_count = 0
+
+    def load(self, users: Iterable):
+        """
+        사용자 객체의 공유 목록(Patient.shared_with)으로 그래프 재구성 (스냅샷 복원 후)
+        """
+        self.clear()
+        users = list(users)
+        roles = {user.user_id: user.role for user in users}
+        for user in users:
+            if isinstance(user, Patient):
+                for recipient_id in user.shared_with:
+                    role = roles.get(recipient_id)
+                    if role in (UserRole.CAREGIVER, UserRole.DOCTOR):
+                        self.share(user.user_id, recipient_id, role)
+
+
 class SharingService:
     """
     데이터 공유 서비스
     환자 데이터를 보호자 또는 의사와 공유
+    공유 관계의 기준은 graph이며, 사용자 객체의 공유 목록은 조회/저장용으로 함께 갱신
     """
     
-    @staticmethod
-    def share_with_caregiver(patient: Patient, caregiver: Caregiver) -> bool:
+    # 공유 관계 그래프 (모든 서비스 호출이 공유)
+    graph = SharingGraph()
+    
+    @classmethod
+    def share_with_caregiver(cls, patient: Patient, caregiver: Caregiver) -> bool:
         """
         보호자와 데이터 공유
         """
+        # 이미 공유된 경우 목록/알림 중복 없이 종료
+        if not cls.graph.share(patient.user_id, caregiver.user_id, UserRole.CAREGIVER):
+            return True
+        
         # 환자가 보호자에게 공유
-        patient.share_data_with(caregiver.user_id, UserRole.CAREGIVER)
+        patient.shared_with.append(caregiver.user_id)
         
         # 보호자가 환자를 모니터링 목록에 추가
-        caregiver.add_monitored_patient(patient.user_id)
+        caregiver.monitored_patients.append(patient.user_id)
         
-        # 알림 생성
+        # 알림 전달 (요약 발송 대상)
         notification = Notification(
             user_id=caregiver.user_id,
             title="환자 데이터 공유",
             message=f"{patient.name}님이 건강 데이터를 공유했습니다.",
             notification_type="info"
         )
+        NotificationService.notify(caregiver, notification)
         
         return True
     
-    @staticmethod
-    def share_with_doctor(patient: Patient, doctor: Doctor) -> bool:
+    @classmethod
+    def share_with_doctor(cls, patient: Patient, doctor: Doctor) -> bool:
         """
         의사와 데이터 공유
         """
+        # 이미 공유된 경우 목록/알림 중복 없이 종료
+        if not cls.graph.share(patient.user_id, doctor.user_id, UserRole.DOCTOR):
+            return True
+        
         # 환자가 의사에게 공유
-        patient.share_data_with(doctor.user_id, UserRole.DOCTOR)
+        patient.shared_with.append(doctor.user_id)
         
         # 의사가 환자를 담당 목록에 추가
-        doctor.add_patient(patient.user_id)
+        doctor.assigned_patients.append(patient.user_id)
         
-        # 알림 생성
+        # 알림 전달 (요약 발송 대상)
         notification = Notification(
             user_id=doctor.user_id,
             title="신규 환자 공유",
             message=f"{patient.name}님이 건강 데이터를 공유했습니다.",
             notification_type="info"
         )
+        NotificationService.notify(doctor, notification)
         
         return True
     
+    @classmethod
+    def revoke(cls, patient: Patient, recipient) -> bool:
+        """
+        데이터 공유 해제 (공유되어 있지 않으면 False)
+        """
+        role = cls.graph.revoke(patient.user_id, recipient.user_id)
+        if role is None:
+            return False
+        
+        patient.revoke_share(recipient.user_id)
+        if role == UserRole.CAREGIVER:
+            recipient.remove_monitored_patient(patient.user_id)
+        else:
+            recipient.remove_patient(patient.user_id)
+        return True
+    
+    @classmethod
+    def get_recipient_ids(cls, patient: Patient, role: Optional[UserRole] = None) -> List[str]:
+        """환자가 공유한 보호자/의사 ID (role로 필터)"""
+        return cls.graph.recipients(patient.user_id, role)
+    
+    @classmethod
+    def get_patient_ids(cls, recipient, role: Optional[UserRole] = None) -> List[str]:
+        """보호자/의사에게 공유된 환자 ID"""
+        return cls.graph.patients(recipient.user_id, role)
+    
+    @classmethod
+    def is_shared(cls, patient_id: str, recipient_id: str) -> bool:
+        """공유 여부"""
+        return cls.graph.is_shared(patient_id, recipient_id)
+    
     @staticmethod
     def get_shared_data(patient: Patient, recipient_role: UserRole) -> Dict:
         """
@@ -406,8 +1149,12 @@ class MessageService:
     """
     메시지 서비스
     응원 메시지 및 일반 메시지 관리
+    보낸 메시지는 모두 store(받은 편지함/대화 스레드 인덱스)에 저장
     """
     
+    # 메시지 저장소 (모든 서비스 호출이 공유)
+    store = MessageStore()
+    
     @staticmethod
     def send_encouragement(sender: Caregiver, patient: Patient, subject: str, content: str) -> Message:
         """
@@ -423,6 +1170,7 @@ class MessageService:
         
         sender.send_encouragement_message(patient.user_id, message)
         patient.messages_received.append(message)
+        MessageService.store.add(message)
         
         return message
     
@@ -439,6 +1187,7 @@ class MessageService:
             content=content,
             message_type=message_type
         )
+        MessageService.store.add(message)
         
         return message
     
@@ -0,0 +1,230 @@
+"""
+Stroke Prediction System - Similar Patient Search
+유사 환자 검색
+
+환자별 최신 건강 데이터를 고정 길이 벡터(나이, 혈당, BMI, 이진 위험 요인, 범주형 코드)로
+인코딩해 float32 행렬에 저장하고, 블록 단위 brute-force 거리 계산(NumPy)으로
+가장 가까운 K명의 환자를 찾음. 새 건강 데이터는 해당 환자 행을 제자리 갱신
+"""
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import Patient, Doctor, HealthData, UserRole
+from services import SharingService
+from scoring import SMOKING_CODES
+from analytics import age_band
+
+
+# 연속형 특성 (건강 데이터 필드 이름)
+CONTINUOUS_FIELDS = ('age', 'avg_glucose_level', 'bmi')
+
+# 범주형 특성 원-핫 어휘
+WORK_TYPES = ('Private', 'Self-employed', 'Govt_job', 'children', 'Never_worked')
+
+DIMENSION = len(CONTINUOUS_FIELDS) + 6 + len(WORK_TYPES)
+
+
+def encode_profile(health_data: HealthData, means: np.ndarray, stds: np.ndarray) -> np.ndarray:
+    """
+    건강 데이터를 검색 벡터로 인코딩
+    연속형은 인구 평균/표준편차로 표준화(미입력은 평균), 이진/범주형은 0/1
+    """
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    for i, field in enumerate(CONTINUOUS_FIELDS):
+        value = getattr(health_data, field)
+        vector[i] = (value - means[i]) / stds[i] if value else 0.0
+    offset = len(CONTINUOUS_FIELDS)
+    vector[offset] = health_data.hypertension == 1
+    vector[offset + 1] = health_data.heart_disease == 1
+    vector[offset + 2] = SMOKING_CODES.get(health_data.smoking_status, 0.0)
+    vector[offset + 3] = health_data.gender == 'Male'
+    vector[offset + 4] = health_data.ever_married == 'Yes'
+    vector[offset + 5] = health_data.residence_type == 'Urban'
+    if health_data.work_type in WORK_TYPES:
+        vector[offset + 6 + WORK_TYPES.index(health_data.work_type)] = 1.0
+    return vector
+
+
+class SimilarityIndex:
+    """
+    유사 환자 인덱스
+    population: 대상 사용자 목록을 반환하는 함수 (첫 검색 시 전체 구축)
+    """
+
+    def __init__(self, population: Callable[[], Iterable], block_size: int = 65536):
+        self._population = population
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._built = False
+        self._vectors = np.empty((0, DIMENSION), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._patients: List[Patient] = []
+        self._rows: Dict[str, int] = {}
+        self._size = 0
+        self._means = np.zeros(len(CONTINUOUS_FIELDS))
+        self._stds = np.ones(len(CONTINUOUS_FIELDS))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def rebuild(self):
+        """
+        전체 인구로 인덱스 구축 (연속형 특성 표준화 기준도 다시 계산)
+        지연 로딩 히스토리는 실체화하지 않고 저장된 최신 건강 데이터만 사용
+        """
+        patients, latest = [], []
+        for user in self._population():
+            if not isinstance(user, Patient):
+                continue
+            health_data, _ = user.latest_records()
+            if health_data is not None:
+                patients.append(user)
+                latest.append(health_data)
+
+        raw = np.array([
+            [getattr(h, field) or np.nan for field in CONTINUOUS_FIELDS] for h in latest
+        ], dtype=np.float64).reshape(len(latest), len(CONTINUOUS_FIELDS))
+        means = np.nanmean(raw, axis=0) if len(raw) else np.zeros(len(CONTINUOUS_FIELDS))
+        stds = np.nanstd(raw, axis=0) if len(raw) else np.ones(len(CONTINUOUS_FIELDS))
+        means = np.where(np.isnan(means), 0.0, means)
+        stds = np.where(np.isnan(stds) | (stds == 0), 1.0, stds)
+
+        capacity = max(1024, len(patients) * 2)
+        vectors = np.zeros((capacity, DIMENSION), dtype=np.float32)
+        for i, health_data in enumerate(latest):
+            vectors[i] = encode_profile(health_data, means, stds)
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:len(patients)] = np.einsum('ij,ij->i', vectors[:len(patients)], vectors[:len(patients)])
+
+        with self._lock:
+            self._vectors, self._norms = vectors, norms
+            self._patients = patients
+            self._rows = {patient.user_id: i for i, patient in enumerate(patients)}
+            self._size = len(patients)
+            self._means, self._stds = means, stds
+            self._built = True
+
+    def update(self, patient: Patient, health_data: HealthData):
+        """환자의 최신 건강 데이터 반영 (기존 행 제자리 갱신 또는 추가)"""
+        if not self._built:
+            return  # 첫 검색 시 전체 구축에 포함됨
+        vector = encode_profile(health_data, self._means, self._stds)
+        with self._lock:
+            row = self._rows.get(patient.user_id)
+            if row is None:
+                row = self._size
+                if row == len(self._vectors):
+                    self._grow()
+                self._rows[patient.user_id] = row
+                self._patients.append(patient)
+                self._size += 1
+            self._vectors[row] = vector
+            self._norms[row] = float(vector @ vector)
+
+    def _grow(self):
+        capacity = len(self._vectors) * 2
+        vectors = np.zeros((capacity, DIMENSION), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:self._size] = self._norms[:self._size]
+        self._vectors, self._norms = vectors, norms
+
+    def search(self, patient: Patient, k: int = 10,
+               allowed: Optional[Iterable[str]] = None) -> List[Tuple[Patient, float]]:
+        """
+        patient와 가장 유사한 환자 K명 (본인 제외), (환자, 거리) 목록
+        allowed: 검색 대상 환자 ID (예: 의사에게 공유된 환자만).
+                 해당 행만 골라 거리를 계산하므로 대상이 적어도 결과가 누락되지 않음
+        """
+        if not self._built:
+            self.rebuild()
+        health_data = patient.get_latest_health_data()
+        if health_data is None or k <= 0:
+            return []
+
+        with self._lock:
+            query = encode_profile(health_data, self._means, self._stds)
+            query_norm = float(query @ query)
+            size = self._size
+            self_row = self._rows.get(patient.user_id, -1)
+            want = k + 1
+            if allowed is None:
+                rows = None
+                count = size
+            else:
+                # 대상 행 번호 (본인 제외)를 먼저 만들고 그 행만 블록 단위로 계산
+                rows = np.unique(np.fromiter(
+                    (self._rows[pid] for pid in allowed if pid in self._rows), dtype=np.int64
+                ))
+                rows = rows[rows != self_row]
+                count = len(rows)
+
+            best_rows = np.empty(0, dtype=np.int64)
+            best_dist = np.empty(0, dtype=np.float32)
+            for start in range(0, count, self.block_size):
+                end = min(start + self.block_size, count)
+                if rows is None:
+                    block_rows = np.arange(start, end)
+                    distances = self._norms[start:end] - 2.0 * (self._vectors[start:end] @ query) + query_norm
+                    if start <= self_row < end:
+                        distances[self_row - start] = np.inf
+                else:
+                    block_rows = rows[start:end]
+                    distances = self._norms[block_rows] - 2.0 * (self._vectors[block_rows] @ query) + query_norm
+                if len(distances) > want:
+                    top = np.argpartition(distances, want)[:want]
+                else:
+                    top = np.arange(len(distances))
+                best_rows = np.concatenate([best_rows, block_rows[top]])
+                best_dist = np.concatenate([best_dist, distances[top]])
+                if len(best_rows) > want:
+                    keep = np.argpartition(best_dist, want)[:want]
+                    best_rows, best_dist = best_rows[keep], best_dist[keep]
+
+            order = np.argsort(best_dist, kind='stable')
+            results = [
+                (self._patients[row], float(np.sqrt(max(best_dist[i], 0.0))))
+                for i, row in zip(order.tolist(), best_rows[order].tolist())
+                if np.isfinite(best_dist[i])
+            ]
+        return results[:k]
+
+
+def similar_patients_for_doctor(index: SimilarityIndex, doctor: Doctor, patient: Patient,
+                                k: int = 10) -> List[Dict]:
+    """
+    의사용 유사 환자 결과
+    의사에게 공유된 환자(SharingService 기준) 중에서만 검색 (공유 권한이 없는 환자는 어떤 정보도 반환하지 않음)
+    """
+    shared = SharingService.get_patient_ids(doctor, UserRole.DOCTOR)
+
+    results = []
+    for candidate, distance in index.search(patient, k, shared):
+        view = candidate.history_view()
+        health_data = view.latest_health_data
+        assessment = view.latest_assessment
+        results.append({
+            'similarity_distance': round(distance, 4),
+            'patient_id': candidate.user_id,
+            'name': candidate.name,
+            'profile': {
+                'age': health_data.age,
+                'age_band': age_band(health_data.age),
+                'gender': health_data.gender,
+                'hypertension': health_data.hypertension,
+                'heart_disease': health_data.heart_disease,
+                'avg_glucose_level': health_data.avg_glucose_level,
+                'bmi': health_data.bmi,
+                'smoking_status': health_data.smoking_status
+            },
+            'outcome': {
+                'latest_risk_level': assessment.risk_level.value if assessment else None,
+                'latest_score': assessment.score if assessment else None,
+                'total_assessments': len(view.risk_assessments),
+                'fast_emergencies': sum(1 for test in view.fast_tests if test.is_emergency)
+            }
+        })
+    return results
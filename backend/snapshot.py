@@ -0,0 +1,624 @@
+"""
+Stroke Prediction System - State Snapshot
+메모리 상태 스냅샷 저장 및 복원
+
+사용자, 공유 관계, 건강 기록/위험도 평가/FAST 검사를 버전이 있는 바이너리 파일로 저장하고
+mmap으로 복원. 열(column) 단위로 저장된 환자 히스토리는 해당 환자의 기록에
+처음 접근할 때 실체화(lazy materialization)되므로 대규모 상태도 수 초 내에 기동
+
+파일 구조 (little-endian):
+    헤더: 매직(8) | 버전(u16) | 섹션 수(u16) | 예약(u32)
+    섹션 테이블: [이름(24) | 오프셋(u64) | 길이(u64)] x 섹션 수
+    섹션 데이터: JSON(meta, users, messages) 또는 NumPy 원시 배열 (8바이트 정렬)
+범주형 건강 데이터 필드는 자유 입력이므로 사전 코드를 uint32로 저장 (버전 1 파일은 uint8, 읽기만 지원)
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import (
+    User, Patient, Caregiver, Doctor, Administrator,
+    HealthData, RiskAssessment, FASTTest,
+    Message, Notification, Alert, HistoryView,
+    RiskLevel, UserRole, RISK_FACTORS
+)
+from services import RiskCalculator, PolicyService
+
+
+MAGIC = b'SPSNAP\x00\x00'
+FORMAT_VERSION = 2
+# 버전별 범주 코드 형식
+CATEGORY_CODE_DTYPES = {1: np.uint8, 2: np.uint32}
+_HEADER = struct.Struct('<8sHHI')
+_SECTION = struct.Struct('<24sQQ')
+
+# 범주형 건강 데이터 필드 (코드 0은 None)
+CATEGORICAL_FIELDS = ('gender', 'ever_married', 'work_type', 'residence_type', 'smoking_status')
+
+# 공유 관계 종류
+SHARE_KINDS = ('shared_with', 'monitored_patients', 'assigned_patients')
+
+LEVEL_CODES = (RiskLevel.LOW, RiskLevel.MEDIUM, RiskLevel.HIGH)
+CONTRIBUTION_UNITS = (None, 'points', 'log_odds')
+
+# 같은 경로에 동시에 저장하지 않도록 파일 기록 직렬화
+_WRITE_LOCK = threading.Lock()
+
+
+class SnapshotError(Exception):
+    """스냅샷 파일 형식 오류"""
+    pass
+
+
+# ===== 저장 =====
+
+class _StringColumn:
+    """문자열 열: UTF-8 blob + 오프셋 배열"""
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array('q', [0])
+
+    def append(self, value: str):
+        self.blob += value.encode('utf-8')
+        self.offsets.append(len(self.blob))
+
+
+class _Categories:
+    """범주형 값 사전 인코딩 (0 = None)"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.index: Dict[Optional[str], int] = {None: 0}
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _user_to_record(user: User) -> Dict:
+    record = {
+        'user_id': user.user_id,
+        'email': user.email,
+        'name': user.name,
+        'password': user.password,
+        'role': user.role.value,
+        'created_at': user.created_at.isoformat(),
+        'last_login': user.last_login.isoformat() if user.last_login else None
+    }
+    if isinstance(user, Patient):
+        record['messages_received'] = [m.to_dict() for m in user.messages_received]
+        record['notifications'] = [n.to_dict() for n in user.notifications]
+    elif isinstance(user, Caregiver):
+        record['alerts_received'] = [a.to_dict() for a in user.alerts_received]
+        record['messages_sent'] = [m.to_dict() for m in user.messages_sent]
+        record['notifications'] = [n.to_dict() for n in user.notifications]
+    elif isinstance(user, Doctor):
+        record['specialty'] = user.specialty
+        record['consultation_notes'] = user.consultation_notes
+        record['prescriptions'] = user.prescriptions
+        record['notifications'] = [n.to_dict() for n in user.notifications]
+    elif isinstance(user, Administrator):
+        record['managed_content'] = user.managed_content
+        record['alert_policies'] = user.alert_policies
+    return record
+
+
+class _HistorySource:
+    """스냅샷에 저장된 환자 히스토리 지연 로더 (실체화 전에 다시 저장하면 열을 그대로 복사)"""
+
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot: 'Snapshot', index: int):
+        self.snapshot = snapshot
+        self.index = index
+
+    def __call__(self, patient: Patient):
+        self.snapshot._load_history(self.index, patient)
+
+    def latest_health_timestamp(self) -> Optional[datetime]:
+        """저장된 최신 건강 데이터 시각 (히스토리를 실체화하지 않음)"""
+        return self.snapshot._latest_health_timestamp(self.index)
+
+    def latest_records(self, patient: Patient):
+        """저장된 최신 (건강 데이터, 위험도 평가) (히스토리를 실체화하지 않음)"""
+        return self.snapshot._latest_records(self.index, patient.user_id)
+
+
+class _HistoryColumns:
+    """환자 히스토리 열 버퍼 (사용자 순서대로 추가)"""
+
+    def __init__(self):
+        self.categories = {field: _Categories() for field in CATEGORICAL_FIELDS}
+
+        self.health_offsets, self.assess_offsets, self.fast_offsets = array('q', [0]), array('q', [0]), array('q', [0])
+        self.h_ts, self.h_age, self.h_glucose, self.h_bmi = array('d'), array('d'), array('d'), array('d')
+        self.h_hypertension, self.h_heart = array('b'), array('b')
+        self.h_categorical = {field: array('I') for field in CATEGORICAL_FIELDS}
+        self.h_id = _StringColumn()
+
+        self.a_ts, self.a_score, self.a_contrib = array('d'), array('d'), array('f')
+        self.a_level, self.a_mask, self.a_unit = array('b'), array('B'), array('B')
+        self.a_policy = array('I')
+        self.a_id, self.a_health_id = _StringColumn(), _StringColumn()
+
+        self.f_ts, self.f_flags = array('d'), array('B')
+        self.f_id = _StringColumn()
+
+    def add_view(self, view: HistoryView):
+        """게시된 읽기 스냅샷의 기록 추가"""
+        empty_contributions = array('f', [0.0] * len(RISK_FACTORS))
+
+        for record in view.health_records:
+            self.h_ts.append(record.timestamp.timestamp())
+            self.h_age.append(float(record.age) if record.age is not None else np.nan)
+            self.h_hypertension.append(int(record.hypertension or 0))
+            self.h_heart.append(int(record.heart_disease or 0))
+            self.h_glucose.append(float(record.avg_glucose_level) if record.avg_glucose_level is not None else np.nan)
+            self.h_bmi.append(float(record.bmi) if record.bmi is not None else np.nan)
+            for field in CATEGORICAL_FIELDS:
+                self.h_categorical[field].append(self.categories[field].encode(getattr(record, field)))
+            self.h_id.append(record.health_data_id)
+
+        for assessment in view.risk_assessments:
+            self.a_ts.append(assessment.timestamp.timestamp())
+            self.a_score.append(assessment.score)
+            self.a_level.append(LEVEL_CODES.index(assessment.risk_level))
+            self.a_mask.append(assessment.risk_factor_mask)
+            self.a_policy.append(assessment.policy_version)
+            if assessment.contributions:
+                self.a_contrib.frombytes(assessment.contributions)
+                self.a_unit.append(CONTRIBUTION_UNITS.index(assessment.contribution_unit))
+            else:
+                self.a_contrib.extend(empty_contributions)
+                self.a_unit.append(0)
+            self.a_id.append(assessment.assessment_id)
+            self.a_health_id.append(assessment.health_data_id)
+
+        for test in view.fast_tests:
+            self.f_ts.append(test.timestamp.timestamp())
+            self.f_flags.append(test.face_asymmetry | test.arm_weakness << 1
+                                | test.speech_difficulty << 2 | test.is_emergency << 3)
+            self.f_id.append(test.test_id)
+
+    def add_stored(self, source: _HistorySource):
+        """기존 스냅샷에 저장된 (아직 실체화하지 않은) 기록을 열 단위로 복사"""
+        snapshot, index = source.snapshot, source.index
+
+        def copy(target: array, name: str, dtype, start: int, end: int, width: int = 1):
+            target.frombytes(snapshot._column(name, dtype)[start * width:end * width].tobytes())
+
+        start, end = snapshot._column('health.offsets', np.int64)[index:index + 2].tolist()
+        copy(self.h_ts, 'health.ts', np.float64, start, end)
+        copy(self.h_age, 'health.age', np.float64, start, end)
+        copy(self.h_hypertension, 'health.hypertension', np.int8, start, end)
+        copy(self.h_heart, 'health.heart_disease', np.int8, start, end)
+        copy(self.h_glucose, 'health.glucose', np.float64, start, end)
+        copy(self.h_bmi, 'health.bmi', np.float64, start, end)
+        for field in CATEGORICAL_FIELDS:
+            # 기존 파일의 범주 코드를 새 파일의 범주 코드로 변환
+            table = np.array([self.categories[field].encode(value) for value in snapshot.categories[field]],
+                             dtype=np.uint32)
+            codes = snapshot._column(f'health.{field}', snapshot.category_dtype)[start:end]
+            self.h_categorical[field].frombytes(table[codes].tobytes())
+        snapshot._copy_strings('health.id', start, end, self.h_id)
+
+        start, end = snapshot._column('assess.offsets', np.int64)[index:index + 2].tolist()
+        copy(self.a_ts, 'assess.ts', np.float64, start, end)
+        copy(self.a_score, 'assess.score', np.float64, start, end)
+        copy(self.a_level, 'assess.level', np.int8, start, end)
+        copy(self.a_mask, 'assess.mask', np.uint8, start, end)
+        copy(self.a_policy, 'assess.policy', np.uint32, start, end)
+        copy(self.a_unit, 'assess.unit', np.uint8, start, end)
+        copy(self.a_contrib, 'assess.contrib', np.float32, start, end, len(RISK_FACTORS))
+        snapshot._copy_strings('assess.id', start, end, self.a_id)
+        snapshot._copy_strings('assess.health_id', start, end, self.a_health_id)
+
+        start, end = snapshot._column('fast.offsets', np.int64)[index:index + 2].tolist()
+        copy(self.f_ts, 'fast.ts', np.float64, start, end)
+        copy(self.f_flags, 'fast.flags', np.uint8, start, end)
+        snapshot._copy_strings('fast.id', start, end, self.f_id)
+
+    def end_user(self):
+        """사용자 하나의 기록 끝 (사용자별 오프셋)"""
+        self.health_offsets.append(len(self.h_ts))
+        self.assess_offsets.append(len(self.a_ts))
+        self.fast_offsets.append(len(self.f_ts))
+
+    def sections(self) -> List[Tuple[str, bytes]]:
+        return [
+            ('health.offsets', self.health_offsets.tobytes()),
+            ('health.ts', self.h_ts.tobytes()),
+            ('health.age', self.h_age.tobytes()),
+            ('health.hypertension', self.h_hypertension.tobytes()),
+            ('health.heart_disease', self.h_heart.tobytes()),
+            ('health.glucose', self.h_glucose.tobytes()),
+            ('health.bmi', self.h_bmi.tobytes()),
+            *((f'health.{field}', self.h_categorical[field].tobytes()) for field in CATEGORICAL_FIELDS),
+            ('health.id', bytes(self.h_id.blob)),
+            ('health.id.offsets', self.h_id.offsets.tobytes()),
+            ('assess.offsets', self.assess_offsets.tobytes()),
+            ('assess.ts', self.a_ts.tobytes()),
+            ('assess.score', self.a_score.tobytes()),
+            ('assess.level', self.a_level.tobytes()),
+            ('assess.mask', self.a_mask.tobytes()),
+            ('assess.policy', self.a_policy.tobytes()),
+            ('assess.unit', self.a_unit.tobytes()),
+            ('assess.contrib', self.a_contrib.tobytes()),
+            ('assess.id', bytes(self.a_id.blob)),
+            ('assess.id.offsets', self.a_id.offsets.tobytes()),
+            ('assess.health_id', bytes(self.a_health_id.blob)),
+            ('assess.health_id.offsets', self.a_health_id.offsets.tobytes()),
+            ('fast.offsets', self.fast_offsets.tobytes()),
+            ('fast.ts', self.f_ts.tobytes()),
+            ('fast.flags', self.f_flags.tobytes()),
+            ('fast.id', bytes(self.f_id.blob)),
+            ('fast.id.offsets', self.f_id.offsets.tobytes()),
+        ]
+
+
+class SnapshotState:
+    """
+    저장할 상태 캡처
+    사용자/메시지는 레코드 사본, 공유 관계는 ID 목록 사본, 환자 히스토리는 게시된 읽기 스냅샷
+    (또는 아직 실체화하지 않은 기존 스냅샷 열) 참조만 보관하므로 캡처는 히스토리 크기와 무관.
+    이벤트 루프에서 캡처하면 log_seq와 일치하는 상태가 되고, 파일 기록은 다른 스레드에서 해도 됨
+    """
+
+    def __init__(self, users: Iterable[User], log_seq: int = 0, messages: Iterable[Message] = ()):
+        users = list(users)
+        self.log_seq = log_seq
+        self.policy = PolicyService.current().to_dict()
+        self.user_ids = [user.user_id for user in users]
+        self.records = [_user_to_record(user) for user in users]
+        self.shares = [
+            [list(getattr(user, attr, ())) for attr in SHARE_KINDS]
+            for user in users
+        ]
+        self.histories = [user.history_source() if isinstance(user, Patient) else None for user in users]
+        self.messages = [message.to_dict() for message in messages]
+
+
+def capture_state(users: Iterable[User], log_seq: int = 0, messages: Iterable[Message] = ()) -> SnapshotState:
+    """저장할 상태 캡처 (이벤트 루프에서 호출)"""
+    return SnapshotState(users, log_seq, messages)
+
+
+def write_snapshot(state: SnapshotState, path: str) -> Dict:
+    """
+    캡처한 상태를 스냅샷 파일로 저장 (작업 스레드에서 호출 가능)
+    임시 파일에 쓴 뒤 교체하므로 저장 중 실패해도 기존 스냅샷은 유지됨
+    """
+    user_index = {user_id: i for i, user_id in enumerate(state.user_ids)}
+    share_src, share_dst, share_kind = array('i'), array('i'), array('b')
+    columns = _HistoryColumns()
+
+    for i, (shares, history) in enumerate(zip(state.shares, state.histories)):
+        for kind, target_ids in enumerate(shares):
+            for target_id in target_ids:
+                if target_id in user_index:
+                    share_src.append(i)
+                    share_dst.append(user_index[target_id])
+                    share_kind.append(kind)
+
+        if isinstance(history, _HistorySource):
+            columns.add_stored(history)
+        elif isinstance(history, HistoryView):
+            columns.add_view(history)
+        columns.end_user()
+
+    meta = {
+        'created_at': datetime.now().isoformat(),
+        'log_seq': state.log_seq,
+        'policy': state.policy,
+        'users': len(state.user_ids),
+        'health_records': len(columns.h_ts),
+        'risk_assessments': len(columns.a_ts),
+        'fast_tests': len(columns.f_ts),
+        'shares': len(share_src),
+        'messages': len(state.messages),
+        'categories': {field: columns.categories[field].values for field in CATEGORICAL_FIELDS}
+    }
+
+    sections: List[Tuple[str, bytes]] = [
+        ('meta', json.dumps(meta, ensure_ascii=False).encode('utf-8')),
+        ('users', json.dumps(state.records, ensure_ascii=False).encode('utf-8')),
+        ('messages', json.dumps(state.messages, ensure_ascii=False).encode('utf-8')),
+        ('share.src', share_src.tobytes()),
+        ('share.dst', share_dst.tobytes()),
+        ('share.kind', share_kind.tobytes()),
+        *columns.sections()
+    ]
+
+    tmp_path = f"{path}.tmp"
+    with _WRITE_LOCK, open(tmp_path, 'wb') as f:
+        offset = _HEADER.size + _SECTION.size * len(sections)
+        table = []
+        for name, data in sections:
+            offset += -offset % 8
+            table.append(_SECTION.pack(name.encode('ascii'), offset, len(data)))
+            offset += len(data)
+
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), 0))
+        f.write(b''.join(table))
+        for name, data in sections:
+            f.write(b'\x00' * (-f.tell() % 8))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    return meta
+
+
+def save_snapshot(users: Iterable[User], path: str, log_seq: int = 0,
+                  messages: Iterable[Message] = ()) -> Dict:
+    """
+    사용자 상태를 스냅샷 파일로 저장 (캡처와 기록을 한 번에)
+    log_seq: 스냅샷에 반영된 마지막 이벤트 로그 순번 (복원 후 이후 이벤트만 재생)
+    messages: 메시지 저장소의 전체 메시지
+    """
+    return write_snapshot(capture_state(users, log_seq, messages), path)
+
+
+# ===== 복원 =====
+
+class Snapshot:
+    """
+    mmap 기반 스냅샷 리더
+    사용자/공유 관계는 즉시 복원, 환자 히스토리는 첫 접근 시 실체화
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._lock = threading.Lock()
+
+        magic, version, section_count, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"스냅샷 파일이 아닙니다: {path}")
+        if version not in CATEGORY_CODE_DTYPES:
+            raise SnapshotError(f"지원하지 않는 스냅샷 버전입니다: {version}")
+        self.category_dtype = CATEGORY_CODE_DTYPES[version]
+
+        self._sections: Dict[str, Tuple[int, int]] = {}
+        for i in range(section_count):
+            name, offset, length = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            self._sections[name.rstrip(b'\x00').decode('ascii')] = (offset, length)
+
+        self.meta = json.loads(self._bytes('meta'))
+        self.log_seq = self.meta.get('log_seq', 0)
+        self.policy: Optional[Dict] = self.meta.get('policy')  # 저장 시점 위험 임계치 정책 (버전 포함)
+        self.categories = self.meta['categories']
+        self.users: List[User] = self._restore_users()
+
+    @property
+    def messages(self) -> List[Message]:
+        """
+        메시지 저장소 메시지 (사용자 메시지 목록에 같은 ID가 있으면 그 객체를 공유)
+        """
+        if 'messages' not in self._sections:
+            return []
+        known = {}
+        for user in self.users:
+            if isinstance(user, Caregiver):
+                known.update((m.message_id, m) for m in user.messages_sent)
+        # 읽음 상태는 수신자 목록 기준이므로 환자 목록 객체 우선
+        for user in self.users:
+            if isinstance(user, Patient):
+                known.update((m.message_id, m) for m in user.messages_received)
+        return [
+            known.get(data['message_id']) or Message.from_dict(data)
+            for data in json.loads(self._bytes('messages'))
+        ]
+
+    def _bytes(self, name: str) -> bytes:
+        offset, length = self._sections[name]
+        return self._mm[offset:offset + length]
+
+    def _column(self, name: str, dtype) -> np.ndarray:
+        """mmap 위의 0-copy 배열"""
+        offset, length = self._sections[name]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._mm, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def _strings(self, name: str):
+        offsets = self._column(f'{name}.offsets', np.int64)
+        base = self._sections[name][0]
+        mm = self._mm
+
+        def get(i: int) -> str:
+            return mm[base + offsets[i]:base + offsets[i + 1]].decode('utf-8')
+        return get
+
+    def _copy_strings(self, name: str, start: int, end: int, target: _StringColumn):
+        """문자열 열의 [start, end) 구간을 다른 문자열 열 뒤에 복사"""
+        offsets = self._column(f'{name}.offsets', np.int64)[start:end + 1]
+        base = self._sections[name][0]
+        shift = len(target.blob) - int(offsets[0])
+        target.blob += self._mm[base + int(offsets[0]):base + int(offsets[-1])]
+        target.offsets.frombytes((offsets[1:] + shift).tobytes())
+
+    def _restore_users(self) -> List[User]:
+        users: List[User] = []
+        for record in json.loads(self._bytes('users')):
+            role = UserRole(record['role'])
+            args = (record['user_id'], record['email'], record['name'], record['password'])
+            if role == UserRole.PATIENT:
+                user = Patient(*args)
+                user.messages_received = [Message.from_dict(m) for m in record['messages_received']]
+                user.notifications = [Notification.from_dict(n) for n in record['notifications']]
+            elif role == UserRole.CAREGIVER:
+                user = Caregiver(*args)
+                user.alerts_received = [Alert.from_dict(a) for a in record['alerts_received']]
+                user.messages_sent = [Message.from_dict(m) for m in record['messages_sent']]
+                user.notifications = [Notification.from_dict(n) for n in record.get('notifications', [])]
+            elif role == UserRole.DOCTOR:
+                user = Doctor(*args, record['specialty'])
+                user.consultation_notes = record['consultation_notes']
+                user.prescriptions = record['prescriptions']
+                user.notifications = [Notification.from_dict(n) for n in record.get('notifications', [])]
+            else:
+                user = Administrator(*args)
+                user.managed_content = record['managed_content']
+                user.alert_policies = record['alert_policies']
+            user.created_at = datetime.fromisoformat(record['created_at'])
+            user.last_login = datetime.fromisoformat(record['last_login']) if record['last_login'] else None
+            users.append(user)
+
+        src = self._column('share.src', np.int32)
+        dst = self._column('share.dst', np.int32)
+        kind = self._column('share.kind', np.int8)
+        for s, d, k in zip(src.tolist(), dst.tolist(), kind.tolist()):
+            getattr(users[s], SHARE_KINDS[k]).append(users[d].user_id)
+
+        # 히스토리가 있는 사용자만 지연 로더 연결
+        has_history = (
+            (np.diff(self._column('health.offsets', np.int64)) > 0)
+            | (np.diff(self._column('assess.offsets', np.int64)) > 0)
+            | (np.diff(self._column('fast.offsets', np.int64)) > 0)
+        )
+        for i in np.flatnonzero(has_history).tolist():
+            users[i].set_history_loader(_HistorySource(self, i))
+        return users
+
+    def _latest_health_timestamp(self, index: int) -> Optional[datetime]:
+        start, end = self._column('health.offsets', np.int64)[index:index + 2].tolist()
+        if start == end:
+            return None
+        return datetime.fromtimestamp(float(self._column('health.ts', np.float64)[end - 1]))
+
+    def _load_history(self, index: int, patient: Patient):
+        with self._lock:
+            self._materialize(index, patient)
+
+    def _materialize(self, index: int, patient: Patient):
+        patient_id = patient.user_id
+        start, end = self._column('health.offsets', np.int64)[index:index + 2].tolist()
+        records = self._health_records(patient_id, start, end)
+        by_id = {record.health_data_id: record for record in records}
+        start, end = self._column('assess.offsets', np.int64)[index:index + 2].tolist()
+        assessments = self._assessments(patient_id, start, end, by_id)
+        start, end = self._column('fast.offsets', np.int64)[index:index + 2].tolist()
+        tests = self._fast_tests(patient_id, start, end)
+
+        # 복원 전에 추가된 기록이 있으면 뒤에 이어 붙임 (실체화 중 추가는 환자 락에서 대기)
+        patient._health_records = records + patient._health_records
+        patient._risk_assessments = assessments + patient._risk_assessments
+        patient._fast_tests = tests + patient._fast_tests
+
+    def _latest_records(self, index: int, patient_id: str):
+        """저장된 마지막 건강 데이터와 위험도 평가만 복원 (히스토리를 실체화하지 않음)"""
+        with self._lock:
+            start, end = self._column('health.offsets', np.int64)[index:index + 2].tolist()
+            records = self._health_records(patient_id, max(start, end - 1), end)
+            start, end = self._column('assess.offsets', np.int64)[index:index + 2].tolist()
+            assessments = self._assessments(patient_id, max(start, end - 1), end,
+                                            {record.health_data_id: record for record in records})
+        return (records[-1] if records else None), (assessments[-1] if assessments else None)
+
+    def _health_records(self, patient_id: str, start: int, end: int) -> List[HealthData]:
+        ts = self._column('health.ts', np.float64)[start:end].tolist()
+        age = self._column('health.age', np.float64)[start:end].tolist()
+        hypertension = self._column('health.hypertension', np.int8)[start:end].tolist()
+        heart = self._column('health.heart_disease', np.int8)[start:end].tolist()
+        glucose = self._column('health.glucose', np.float64)[start:end].tolist()
+        bmi = self._column('health.bmi', np.float64)[start:end].tolist()
+        codes = {field: self._column(f'health.{field}', self.category_dtype)[start:end].tolist()
+                 for field in CATEGORICAL_FIELDS}
+        health_id = self._strings('health.id')
+
+        records = []
+        for j in range(end - start):
+            values = {field: self.categories[field][codes[field][j]] for field in CATEGORICAL_FIELDS}
+            record = HealthData(patient_id, {
+                'age': _restore_number(age[j]),
+                'gender': values['gender'],
+                'hypertension': hypertension[j],
+                'heart_disease': heart[j],
+                'ever_married': values['ever_married'],
+                'work_type': values['work_type'],
+                'Residence_type': values['residence_type'],
+                'avg_glucose_level': _restore_number(glucose[j]),
+                'bmi': _restore_number(bmi[j]),
+                'smoking_status': values['smoking_status']
+            })
+            record.health_data_id = health_id(start + j)
+            record.timestamp = datetime.fromtimestamp(ts[j])
+            records.append(record)
+        return records
+
+    def _assessments(self, patient_id: str, start: int, end: int,
+                     by_id: Dict[str, HealthData]) -> List[RiskAssessment]:
+        ts = self._column('assess.ts', np.float64)[start:end].tolist()
+        score = self._column('assess.score', np.float64)[start:end].tolist()
+        level = self._column('assess.level', np.int8)[start:end].tolist()
+        mask = self._column('assess.mask', np.uint8)[start:end].tolist()
+        policy = self._column('assess.policy', np.uint32)[start:end].tolist()
+        unit = self._column('assess.unit', np.uint8)[start:end].tolist()
+        contrib = self._column('assess.contrib', np.float32)
+        n_factors = len(RISK_FACTORS)
+        assessment_id = self._strings('assess.id')
+        assessment_health_id = self._strings('assess.health_id')
+
+        assessments = []
+        for j in range(end - start):
+            health_data_id = assessment_health_id(start + j)
+            health_data = by_id.get(health_data_id) or SimpleNamespace(health_data_id=health_data_id)
+            risk_level = LEVEL_CODES[level[j]]
+            assessment = RiskAssessment(patient_id, health_data, score[j], risk_level)
+            assessment.assessment_id = assessment_id(start + j)
+            assessment.timestamp = datetime.fromtimestamp(ts[j])
+            assessment.risk_factor_mask = mask[j]
+            assessment.policy_version = policy[j]
+            assessment.set_recommendations(RiskCalculator.lookup_recommendations(risk_level, mask[j]))
+            if unit[j]:
+                row = (start + j) * n_factors
+                assessment.contributions = contrib[row:row + n_factors].tobytes()
+                assessment.contribution_unit = CONTRIBUTION_UNITS[unit[j]]
+            assessments.append(assessment)
+        return assessments
+
+    def _fast_tests(self, patient_id: str, start: int, end: int) -> List[FASTTest]:
+        ts = self._column('fast.ts', np.float64)[start:end].tolist()
+        flags = self._column('fast.flags', np.uint8)[start:end].tolist()
+        test_id = self._strings('fast.id')
+
+        tests = []
+        for j in range(end - start):
+            test = FASTTest(patient_id)
+            test.perform_test(bool(flags[j] & 1), bool(flags[j] & 2), bool(flags[j] & 4))
+            test.test_id = test_id(start + j)
+            test.timestamp = datetime.fromtimestamp(ts[j])
+            tests.append(test)
+        return tests
+
+    def materialize_all(self):
+        """모든 환자 히스토리 실체화"""
+        for user in self.users:
+            if isinstance(user, Patient):
+                user._load_history()
+
+
+def _restore_number(value: float):
+    """NaN은 None, 정수 값은 int로 복원"""
+    if value != value:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """스냅샷 파일을 mmap으로 열고 사용자 복원"""
+    return Snapshot(path)
@@ -0,0 +1,156 @@
+"""
+Stroke Prediction System - Worker Pools
+CPU 작업 실행 계층 (이벤트 루프 밖에서 점수 계산/리포트/코호트 집계)
+
+- 스레드 풀: 위험도 점수 계산, 개인 리포트, 시계열 다운샘플링, 코호트/백분위/유사 환자 집계.
+  메모리의 환자 객체를 그대로 사용하고, 이벤트 루프는 결과를 기다리는 동안 다른 요청을 처리
+  (작업이 메모리의 환자 객체를 순회하므로 프로세스 풀은 쓰지 않음)
+대기(실행 중 + 대기 중) 작업 수 한도가 있어 포화되면 즉시 PoolSaturatedError
+(API는 503 + Retry-After로 응답)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class PoolSaturatedError(Exception):
+    """작업 풀 대기 한도 초과"""
+
+    def __init__(self, pool: str, retry_after: int = 1):
+        super().__init__(f"{pool} worker pool is saturated")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+def _timed(fn: Callable, args: tuple, kwargs: dict):
+    """작업 실행 (시작 시각, 결과, 실행 시간)"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, result, time.time() - started
+
+
+class _Pool:
+    """실행기 하나와 대기 한도/통계"""
+
+    def __init__(self, name: str, factory: Callable[[], object], workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """작업 제출, 결과 Future 반환 (대기 한도 초과 시 PoolSaturatedError)"""
+        with self._lock:
+            if self.in_flight >= self.max_queue:
+                self.rejected += 1
+                raise PoolSaturatedError(self.name)
+            if self._executor is None:
+                self._executor = self._factory()
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            self.submitted += 1
+        queued = time.time()
+        try:
+            inner = self._executor.submit(_timed, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+
+        result: Future = Future()
+
+        def done(future: Future):
+            with self._lock:
+                self.in_flight -= 1
+                if future.cancelled() or future.exception() is not None:
+                    self.failed += 1
+                else:
+                    started, _, elapsed = future.result()
+                    self.completed += 1
+                    self._wait_total += max(started - queued, 0.0)
+                    self._run_total += elapsed
+            try:
+                if future.cancelled():
+                    result.cancel()
+                elif future.exception() is not None:
+                    result.set_exception(future.exception())
+                else:
+                    result.set_result(future.result()[1])
+            except InvalidStateError:
+                pass  # 기다리던 쪽에서 이미 취소
+
+        inner.add_done_callback(done)
+        # 기다리던 요청이 취소되면 아직 시작하지 않은 작업도 취소
+        result.add_done_callback(lambda future: future.cancelled() and inner.cancel())
+        return result
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'started': self._executor is not None,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'queue_depth': max(self.in_flight - self.workers, 0),
+                'peak_in_flight': self.peak,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self._wait_total / self.completed * 1000, 3) if self.completed else 0.0,
+                'avg_run_ms': round(self._run_total / self.completed * 1000, 3) if self.completed else 0.0
+            }
+
+
+class WorkerPool:
+    """
+    스레드 풀
+    threads: 스레드 풀 크기 (기본: min(32, CPU 수 + 4))
+    max_queue: 대기 작업 한도 (실행 중 포함)
+    실행기는 첫 작업 제출 시 생성
+    """
+
+    def __init__(self, threads: Optional[int] = None, max_queue: int = 256):
+        cpus = os.cpu_count() or 1
+        threads = threads or min(32, cpus + 4)
+        if max_queue < 1:
+            raise ValueError("max_queue는 1 이상이어야 합니다")
+        self.threads = _Pool(
+            'thread',
+            lambda: ThreadPoolExecutor(max_workers=threads, thread_name_prefix='StrokeWorker'),
+            threads, max_queue
+        )
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """스레드 풀에서 실행하고 결과 대기"""
+        return await asyncio.wrap_future(self.threads.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        """실행기 종료"""
+        self.threads.shutdown(wait)
+
+    def get_stats(self) -> Dict:
+        """풀 크기, 대기 작업 수, 처리/거절 통계"""
+        return {
+            'thread': self.threads.get_stats()
+        }